@@ -0,0 +1,51 @@
+"""stat_info 增加 (type, source_id, target_id) 唯一索引
+
+合并已有的重复统计行后建立唯一索引, 供答题统计的 INSERT ... ON CONFLICT DO UPDATE 使用
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 重复行的 total 合并到 id 最小的一行
+    op.execute("""
+        WITH merged AS (
+            SELECT type, source_id, coalesce(target_id, 0) AS target_key, min(id) AS keep_id, sum(total) AS total
+            FROM stat_info
+            WHERE source_id IS NOT NULL
+            GROUP BY type, source_id, coalesce(target_id, 0)
+            HAVING count(*) > 1
+        )
+        UPDATE stat_info SET total = merged.total
+        FROM merged
+        WHERE stat_info.id = merged.keep_id
+    """)
+    op.execute("""
+        DELETE FROM stat_info dup
+        USING stat_info keep
+        WHERE dup.type = keep.type
+          AND dup.source_id = keep.source_id
+          AND coalesce(dup.target_id, 0) = coalesce(keep.target_id, 0)
+          AND dup.id > keep.id
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_stat_info_type_source_target
+        ON stat_info (type, source_id, coalesce(target_id, 0))
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS uq_stat_info_type_source_target")
@@ -0,0 +1,39 @@
+"""stat_info_record 增加 applied 字段
+
+写后缓冲先写入 applied = false 的统计记录, 刷写到 stat_info 后再置为 true;
+已有记录都已累加过, 默认为 true
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "stat_info_record",
+        sa.Column("applied", sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+    op.create_index(
+        "ix_stat_info_record_pending",
+        "stat_info_record",
+        ["id"],
+        postgresql_where=sa.text("NOT applied"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_stat_info_record_pending", table_name="stat_info_record")
+    op.drop_column("stat_info_record", "applied")
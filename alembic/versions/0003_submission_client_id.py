@@ -0,0 +1,39 @@
+"""user_question_submission_record 增加 client_submission_id 字段
+
+批量提交答案时由客户端生成提交ID, (user_id, client_submission_id) 唯一, 重试不会重复计入
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user_question_submission_record",
+        sa.Column("client_submission_id", sa.String(64), nullable=True),
+    )
+    op.create_index(
+        "uq_user_question_submission_record_client_id",
+        "user_question_submission_record",
+        ["user_id", "client_submission_id"],
+        unique=True,
+        postgresql_where=sa.text("client_submission_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_user_question_submission_record_client_id", table_name="user_question_submission_record")
+    op.drop_column("user_question_submission_record", "client_submission_id")
@@ -0,0 +1,90 @@
+"""新增 stat_info_daily 按天汇总的用户统计
+
+答题统计累加到 stat_info 的同时按天累加到 stat_info_daily, 按日/周/月统计的排行榜只需汇总几个分桶;
+过期分桶由后台任务定期清理.
+
+升级时用已累加的 stat_info_record 按记录时间(stats.timezone 的自然日)回填保留期内的分桶;
+stat_info 中没有对应记录的部分无法确定日期, 计入该统计最后更新的那一天, 使分桶之和与总值一致
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stat_info_daily",
+        sa.Column("id", sa.Integer(), sa.Identity(), primary_key=True),
+        sa.Column("type", sa.String(64), nullable=False),
+        sa.Column("source_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("meta", sa.JSON(), nullable=False, server_default="{}"),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("deleted", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index(
+        "uq_stat_info_daily_type_source_day",
+        "stat_info_daily",
+        ["type", "source_id", "day"],
+        unique=True,
+    )
+    op.create_index("ix_stat_info_daily_type_day", "stat_info_daily", ["type", "day"])
+
+    op.execute(
+        sa.text(
+            """
+            WITH records AS (
+                SELECT type, source_id, (created_at AT TIME ZONE :tz)::date AS day, value
+                FROM stat_info_record
+                WHERE applied
+                    AND source_id IS NOT NULL
+                    AND target_id IS NULL
+                    AND type IN ('duration', 'practice', 'correct')
+            ),
+            undated AS (
+                SELECT s.type, s.source_id, (s.updated_at AT TIME ZONE :tz)::date AS day,
+                    s.total - COALESCE(
+                        (SELECT sum(r.value) FROM records r WHERE r.type = s.type AND r.source_id = s.source_id),
+                        0
+                    ) AS value
+                FROM stat_info s
+                WHERE s.source_id IS NOT NULL
+                    AND s.target_id IS NULL
+                    AND s.type IN ('duration', 'practice', 'correct')
+            )
+            INSERT INTO stat_info_daily (type, source_id, day, total)
+            SELECT type, source_id, day, sum(value)
+            FROM (
+                SELECT type, source_id, day, value FROM records
+                UNION ALL
+                SELECT type, source_id, day, value FROM undated WHERE value > 0
+            ) AS buckets
+            WHERE day >= (now() AT TIME ZONE :tz)::date - :retention_days
+            GROUP BY type, source_id, day
+            HAVING sum(value) <> 0
+            """
+        ).bindparams(tz=settings.stats.timezone, retention_days=settings.stats.daily_retention_days)
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_stat_info_daily_type_day", table_name="stat_info_daily")
+    op.drop_index("uq_stat_info_daily_type_source_day", table_name="stat_info_daily")
+    op.drop_table("stat_info_daily")
@@ -0,0 +1,94 @@
+"""question / user_question_submission_record 的常用字段从 meta 提升为独立列
+
+题目类型、描述、选项、标准答案以及答题记录的是否正确、用时、提交时间改为独立列,
+可以在 SQL 中过滤、聚合和建索引; 升级时从 meta 回填已有数据, 降级时写回 meta
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("question", sa.Column("question_type", sa.String(32), nullable=False, server_default=""))
+    op.add_column("question", sa.Column("description", sa.Text(), nullable=False, server_default=""))
+    op.add_column("question", sa.Column("options_json", sa.JSON(), nullable=False, server_default=sa.text("'[]'")))
+    op.add_column("question", sa.Column("correct_answer_json", sa.JSON(), nullable=False, server_default=sa.text("'{}'")))
+    op.execute(
+        """
+        UPDATE question SET
+            question_type = COALESCE(meta->>'type', ''),
+            description = COALESCE(meta->>'description', ''),
+            options_json = COALESCE(meta->'options', '[]'::json),
+            correct_answer_json = COALESCE(meta->'correct_answer', '{}'::json),
+            meta = (meta::jsonb - 'type' - 'description' - 'options' - 'correct_answer')::json
+        """
+    )
+    op.create_index("ix_question_question_type", "question", ["question_type"])
+
+    op.add_column(
+        "user_question_submission_record",
+        sa.Column("is_correct", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+    )
+    op.add_column(
+        "user_question_submission_record",
+        sa.Column("duration", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "user_question_submission_record",
+        sa.Column("submitted_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE user_question_submission_record SET
+            is_correct = COALESCE((meta->>'is_correct')::boolean, false),
+            duration = COALESCE((meta->>'duration')::numeric::integer, 0),
+            submitted_at = NULLIF(meta->>'submitted_at', '')::timestamptz,
+            meta = (meta::jsonb - 'is_correct' - 'duration' - 'submitted_at')::json
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        UPDATE user_question_submission_record SET
+            meta = (meta::jsonb || jsonb_strip_nulls(jsonb_build_object(
+                'is_correct', is_correct,
+                'duration', duration,
+                'submitted_at', to_char(submitted_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"')
+            )))::json
+        """
+    )
+    op.drop_column("user_question_submission_record", "submitted_at")
+    op.drop_column("user_question_submission_record", "duration")
+    op.drop_column("user_question_submission_record", "is_correct")
+
+    op.drop_index("ix_question_question_type", table_name="question")
+    op.execute(
+        """
+        UPDATE question SET
+            meta = (meta::jsonb || jsonb_build_object(
+                'type', question_type,
+                'description', description,
+                'options', options_json::jsonb,
+                'correct_answer', correct_answer_json::jsonb
+            ))::json
+        """
+    )
+    op.drop_column("question", "correct_answer_json")
+    op.drop_column("question", "options_json")
+    op.drop_column("question", "description")
+    op.drop_column("question", "question_type")
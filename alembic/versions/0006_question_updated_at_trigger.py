@@ -0,0 +1,46 @@
+"""question 更新时由数据库刷新 updated_at
+
+判分引擎按 updated_at 识别其他进程或直接执行 SQL 修改过的题目, 因此即使更新语句没有带上 updated_at,
+也由触发器刷新为当前时间; 显式设置了 updated_at 的更新保持原值
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE FUNCTION touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+                NEW.updated_at = now();
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER question_touch_updated_at BEFORE UPDATE ON question
+            FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER question_touch_updated_at ON question")
+    op.execute("DROP FUNCTION touch_updated_at()")
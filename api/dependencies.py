@@ -4,9 +4,8 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from core.database import get_session
 from core.exceptions import AuthenticationError, NotFoundError
-from core.models.user import User
 from services.auth import AuthService
-from services.user import UserService
+from services.user import CurrentUser, UserService
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="v1/auth/token")
 
@@ -15,9 +14,9 @@ async def get_current_user(
     db: AsyncSession = Depends(get_session),
     auth_service: AuthService = Depends(),
     user_service: UserService = Depends()
-) -> User:
+) -> CurrentUser:
     """
-    获取当前用户
+    获取当前用户, 只包含接口需要的字段, 短期缓存
     :raises: AuthenticationError 如果认证失败
     :raises: NotFoundError 如果用户不存在
     """
@@ -26,7 +25,7 @@ async def get_current_user(
         employee_id = await auth_service.verify_token(token)
         
         # 获取用户
-        user = await user_service.get_by_employee_id(db, employee_id)
+        user = await user_service.get_current_user(db, employee_id)
         if not user:
             raise NotFoundError("User not found")
         return user
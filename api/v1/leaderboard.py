@@ -1,34 +1,126 @@
-from fastapi import APIRouter, Depends, Path
+import asyncio
+from collections.abc import AsyncIterator
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Response, status
+from fastapi.responses import StreamingResponse
 
-from schemas.v1.user import UserInfo
-from schemas.v1.leaderboard import GroupType, BoardType, LeaderboardResponse
+from services.user import CurrentUser
+from schemas.v1.leaderboard import (
+    GroupType, BoardType, LeaderboardResponse, TimeWindow,
+    AggregateMetric, GroupLeaderboardResponse,
+)
+from core.config import settings
 from services.leaderboard import LeaderboardService
-from core.dependencies import get_current_user
-from core.database import get_session
+from services.leaderboard_hub import leaderboard_hub
+from services.ranking import etag_matches, leaderboard_index
+from core.dependencies import get_current_user, get_read_session
 from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import Query
 router = APIRouter(prefix="/leaderboards", tags=["排行榜"])
 
-@router.get("/{group}/{board_type}", response_model=LeaderboardResponse)
+@router.get(
+    "/{group}/{board_type}",
+    response_model=LeaderboardResponse,
+    responses={304: {"description": "排行榜未变化"}}
+)
 async def get_leaderboard(
     group: GroupType = Path(..., title="分组类型"),
     board_type: BoardType = Path(..., title="榜单类型"),
     count: int = Query(20, ge=1, le=1000),
-    current_user: UserInfo = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session),
+    window: TimeWindow = Query(TimeWindow.ALL, title="统计时间窗口"),
+    if_none_match: str | None = Header(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session),
     leaderboard_service: LeaderboardService = Depends()
-) -> LeaderboardResponse:
+) -> Response:
     """
     获取排行榜
-    
-    - group: 分组类型(class/department/company)
+
+    - group: 分组类型(class/department/company/corporation)
+    - board_type: 榜单类型(duration/practice/correct)
+    - window: 统计时间窗口(all/day/week/month)
+
+    响应带有 ETag, 请求头 If-None-Match 与之匹配时返回 304
+    """
+    etag, body = await leaderboard_service.get_leaderboard_body(
+        db=db,
+        group=group,
+        board_type=board_type,
+        user_id=current_user.id,
+        count=count,
+        window=window
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/groups/{group}/{board_type}", response_model=GroupLeaderboardResponse)
+async def get_group_leaderboard(
+    group: GroupType = Path(..., title="参与排名的分组类型"),
+    board_type: BoardType = Path(..., title="榜单类型"),
+    metric: AggregateMetric = Query(AggregateMetric.TOTAL, title="聚合方式"),
+    count: int = Query(20, ge=1, le=1000),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session),
+    leaderboard_service: LeaderboardService = Depends()
+) -> GroupLeaderboardResponse:
+    """
+    获取分组聚合榜, 当前用户所在集团内的分组按总分或人均分排名
+
+    - group: 参与排名的分组类型(class/department/company)
     - board_type: 榜单类型(duration/practice/correct)
+    - metric: 聚合方式(total/average)
     """
-    result = await leaderboard_service.get_leaderboard(
+    return await leaderboard_service.get_group_leaderboard(
         db=db,
         group=group,
         board_type=board_type,
+        metric=metric,
         user_id=current_user.id,
         count=count
     )
-    return result
+
+@router.get("/{group}/{board_type}/stream", responses={200: {"content": {"text/event-stream": {}}}})
+async def stream_leaderboard(
+    group: GroupType = Path(..., title="分组类型"),
+    board_type: BoardType = Path(..., title="榜单类型"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session)
+) -> StreamingResponse:
+    """
+    订阅当前用户所在分组的排行榜实时推送(Server-Sent Events)
+
+    - 首个 snapshot 事件为完整的前 N 名
+    - 之后每次名次变化推送一个 delta 事件, 只包含变化的名次
+    - 推送断开后客户端应重新订阅
+    """
+    if not leaderboard_hub.running:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="排行榜实时推送未开启")
+    member = await leaderboard_index.member(db, current_user.id)
+    if member is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    group_id = member.group_id(group)
+    queue, current = await leaderboard_hub.subscribe(db, group, group_id, board_type)
+    # 订阅期间不再占用数据库连接
+    await db.close()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield f"event: snapshot\ndata: {current.model_dump_json()}\n\n"
+            while True:
+                try:
+                    delta = await asyncio.wait_for(queue.get(), timeout=settings.leaderboard.push_heartbeat)
+                except TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if delta is None:
+                    return
+                yield f"event: delta\ndata: {delta.model_dump_json()}\n\n"
+        finally:
+            leaderboard_hub.unsubscribe(group, group_id, board_type, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, Path
+from fastapi import APIRouter, Depends, Path, Query
 from datetime import datetime, timezone
 
-from schemas.v1.question import QuestionResponse, AnswerSubmission, AnswerHistory
-from services.study import QuestionService, UserQuestionSubmissionService
+from schemas.v1.question import (
+    QuestionResponse, QuestionBatchResponse, AnswerSubmission, AnswerHistory,
+    BulkAnswerRequest, BulkAnswerResult
+)
+from services.study import QuestionService, UserQuestionSubmissionService, as_utc
 from core.dependencies import get_current_user
 from core.database import get_session
 from sqlmodel.ext.asyncio.session import AsyncSession
 from core.exceptions import ValidationError
-from core.models.user import User
+from services.user import CurrentUser
 
 router = APIRouter(prefix="/questions", tags=["题目"])
 
@@ -17,40 +20,92 @@ router = APIRouter(prefix="/questions", tags=["题目"])
 async def select_questions(
     db: AsyncSession = Depends(get_session),
     knowledge_id: str | None = None,
-    current_user: User = Depends(get_current_user),
+    difficulty: float | None = Query(None, ge=0, le=1, description="目标难度"),
+    current_user: CurrentUser = Depends(get_current_user),
     question_service: QuestionService = Depends()
 ) -> QuestionResponse:
     """
     选取题目
     
+    从未做过的题目中随机抽取
     如果提供knowledge_id，则从指定知识点抽取题目
+    如果提供difficulty，则优先抽取难度接近的题目
     """
     if not current_user.id:
         raise ValidationError(message="User not found")
     question = await question_service.select_questions(
         db=db,
         user_id=current_user.id,
-        knowledge_id=knowledge_id
+        knowledge_id=knowledge_id,
+        difficulty=difficulty
     )
     return QuestionResponse(
             question=question,
             time=datetime.now(timezone.utc)
         )
 
+@router.get("/select/batch", response_model=QuestionBatchResponse)
+async def select_questions_batch(
+    db: AsyncSession = Depends(get_session),
+    count: int = Query(20, ge=1, le=100, description="题目数量"),
+    knowledge_id: str | None = None,
+    difficulty: float | None = Query(None, ge=0, le=1, description="目标难度"),
+    current_user: CurrentUser = Depends(get_current_user),
+    question_service: QuestionService = Depends()
+) -> QuestionBatchResponse:
+    """
+    批量选取题目
+    
+    一次返回count道不重复的未做题目，供客户端预取一整套练习
+    """
+    if not current_user.id:
+        raise ValidationError(message="User not found")
+    questions = await question_service.select_questions_batch(
+        db=db,
+        user_id=current_user.id,
+        count=count,
+        knowledge_id=knowledge_id,
+        difficulty=difficulty
+    )
+    return QuestionBatchResponse(
+            questions=questions,
+            time=datetime.now(timezone.utc)
+        )
+
+@router.post("/answers", response_model=list[BulkAnswerResult])
+async def submit_answers(
+    request: BulkAnswerRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session)
+) -> list[BulkAnswerResult]:
+    """
+    批量提交答案
+
+    用于离线作答后同步或考试模式整卷提交, 每个答案带客户端生成的submission_id,
+    重试时已处理过的答案不会重复计入统计
+    """
+    if not current_user.id:
+        raise ValidationError(message="User not found")
+    return await UserQuestionSubmissionService.submit_answers(
+        db=db,
+        user_id=current_user.id,
+        submissions=request.submissions
+    )
+
 @router.post("/{id}/answer", response_model=AnswerHistory)
 async def submit_answer(
     submission: AnswerSubmission,
     id: str = Path(..., title="题目ID"),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     user_question_submission_service: UserQuestionSubmissionService = Depends(),
     db: AsyncSession = Depends(get_session)
 ) -> AnswerHistory:
     """提交答案"""
     if not current_user.id:
         raise ValidationError(message="User not found")
-    
-    start_answer_time = submission.time.replace(tzinfo=timezone.utc)
-    
+
+    start_answer_time = as_utc(submission.time)
+
     result = await user_question_submission_service.submit_answer(
         db=db,
         question_id=int(id),
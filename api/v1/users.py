@@ -2,23 +2,22 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from core.database import get_session
-from core.dependencies import get_current_user
-from core.models.user import User
+from core.dependencies import get_current_user, get_read_session
 from schemas.user import UserInfo
-from services.user import UserService
+from services.user import CurrentUser, UserService
 from services.study import (
     UserQuestionSubmissionService,
 )
+from services.grading import grading_engine
 from services.leaderboard import LeaderboardService
-from schemas.leaderboard import GroupType, BoardType
+from schemas.v1.leaderboard import GroupType, BoardType
 from schemas.study import QuestionSubmissionRecordResponse
 router = APIRouter(prefix="/users", tags=["用户"])
 
 @router.get("/me", response_model=UserInfo)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session),
     user_study_service: UserQuestionSubmissionService = Depends(),
     leaderboard_service: LeaderboardService = Depends()
 ) -> UserInfo:
@@ -33,20 +32,17 @@ async def get_current_user_info(
         db,
         user_id=current_user.id,
     )
-    # 获取部门排名
-    department_index = await leaderboard_service.get_user_index(
+    # 一次获取部门排名和公司排名
+    ranks = await leaderboard_service.get_user_ranks(
         db,
         user_id=current_user.id,
-        group=GroupType.DEPARTMENT,
-        board_type=BoardType.DURATION
-    )
-    # 获取公司排名
-    company_index = await leaderboard_service.get_user_index(
-        db,
-        user_id=current_user.id,
-        group=GroupType.COMPANY,
-        board_type=BoardType.DURATION
+        boards=[
+            (GroupType.DEPARTMENT, BoardType.DURATION),
+            (GroupType.COMPANY, BoardType.DURATION),
+        ]
     )
+    department_index = ranks[(GroupType.DEPARTMENT, BoardType.DURATION)]
+    company_index = ranks[(GroupType.COMPANY, BoardType.DURATION)]
     
     return UserInfo(
         name=current_user.name,
@@ -64,8 +60,8 @@ async def get_current_user_info(
 async def get_qa_history(
     skip: int = 0,
     limit: int = 30,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session),
     submission_service: UserQuestionSubmissionService = Depends()
 ) -> List[QuestionSubmissionRecordResponse]:
     """获取当前用户的答题历史"""
@@ -87,7 +83,7 @@ async def get_qa_history(
             result.append(QuestionSubmissionRecordResponse(
                 id=str(record.id),
                 question=record.question, # type: ignore
-                answer=record.question.correct_answer, # type: ignore
+                answer=grading_engine.correct_answer(record.question),
                 user_answer=user_answer,
                 is_correct=record.is_correct
             ))
@@ -102,7 +98,7 @@ async def get_users(
     department: str = Query(None, description="部门名称"),
     page: int = Query(1, ge=1),
     page_size: int = Query(30, ge=1, le=100),
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     user_service: UserService = Depends(),
     submission_service: UserQuestionSubmissionService = Depends(),
 ) -> List[UserInfo]:
@@ -118,21 +114,20 @@ async def get_users(
         limit=page_size
     )
     
-    # 获取每个用户的详细信息
+    # 一次查询获取本页所有用户的学习统计
+    study_stats = await submission_service.get_study_stats_many(
+        db,
+        [user.id for user in users if user.id],
+    )
+    
     result: List[UserInfo] = []
     for user in users:
         if not user.id:
             continue
-        # 获取学习统计信息
-        study_stats = await submission_service.get_study_stats(
-            db,
-            user_id=user.id,
-        )
-        
         result.append(UserInfo(
             name=user.name,
             avatar=user.avatar,
-            study_status=study_stats,
+            study_status=study_stats[user.id],
             employee_id=user.employee_id,
             class_=user.class_name, # type: ignore
             department=user.department_name,
@@ -9,6 +9,57 @@ class PostgresSettings(BaseModel):
     db: str = "zhaojin"
     user: str = "postgres"
     password: str = "postgres"
+    pool_size: int = 20  # 连接池常驻连接数
+    max_overflow: int = 10  # 连接池满时最多额外创建的连接数
+    pool_timeout: float = 10.0  # 获取连接的最长等待时间(秒), 超时报错
+    pool_recycle: int = 1800  # 连接最长使用时间(秒), 超过后重建, 避免被数据库或中间件断开
+    pool_pre_ping: bool = True  # 取出连接前先检测连接是否可用
+    prepared_statement_cache_size: int = 500  # 每个连接缓存的 asyncpg 预编译语句数
+    query_cache_size: int = 1200  # SQLAlchemy 编译后 SQL 的缓存条数
+    read_your_writes: float = 5.0  # 配置只读副本时, 用户写入后该时间(秒)内的读取仍走主库
+
+    @property
+    def url(self) -> str:
+        """构建数据库 URL"""
+        return f"postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.db}"
+
+class CacheSettings(BaseModel):
+    question_catalog_ttl: int = 300  # 题库目录缓存时间(秒)
+    question_pool_ttl: int = 600  # 用户未做题池缓存时间(秒)
+    question_pool_max_users: int = 5000  # 最多缓存多少个用户的未做题池
+    current_user_ttl: float = 60.0  # 当前登录用户缓存时间(秒)
+    current_user_max_entries: int = 10000  # 最多缓存多少个登录用户
+    verified_token_max_entries: int = 10000  # 最多缓存多少个已验证令牌
+    grading_key_ttl: float = 300.0  # 题目标准答案缓存时间(秒)
+    grading_max_keys: int = 20000  # 最多缓存多少道题的标准答案
+
+class StatsSettings(BaseModel):
+    write_behind: bool = True  # 答题统计是否走写后缓冲
+    flush_interval: float = 1.0  # 缓冲刷写间隔(秒)
+    flush_max_pending: int = 1000  # 缓冲记录数达到该值时立即刷写
+    recover_after: float = 60.0  # 超过该时间仍未刷写的记录视为遗留记录(如进程崩溃), 由任意进程补写
+    timezone: str = "Asia/Shanghai"  # 按天汇总统计使用的时区
+    daily_retention_days: int = 62  # 按天汇总的统计保留天数
+    daily_prune_interval: float = 3600.0  # 过期分桶清理间隔(秒)
+
+class LeaderboardSettings(BaseModel):
+    memory_index: bool = True  # 排行榜是否走内存有序索引
+    index_ttl: int = 300  # 榜单索引重建间隔(秒), 用于同步其他 worker 写入的统计
+    index_max_boards: int = 1000  # 最多缓存多少个榜单索引
+    index_max_members: int = 10000  # 最多缓存多少个不在已加载榜单中的成员信息
+    rank_cache_ttl: float = 10.0  # 用户排名缓存时间(秒)
+    rank_cache_max_entries: int = 20000  # 最多缓存多少条用户排名
+    snapshot: bool = False  # 是否由定时生成的快照提供排行榜(优先于内存索引)
+    snapshot_interval: float = 30.0  # 快照生成间隔(秒)
+    response_cache: bool = True  # 是否缓存排行榜响应
+    response_cache_ttl: float = 10.0  # 排行榜响应最长缓存时间(秒), 用于同步其他 worker 写入的统计
+    response_cache_max_entries: int = 2000  # 最多缓存多少个榜单的响应
+    push: bool = False  # 是否开启排行榜实时推送(SSE)
+    push_broker: str = "local"  # 多 worker 间转发统计的方式: local(进程内) / postgres(LISTEN/NOTIFY)
+    push_interval: float = 0.5  # 推送合并间隔(秒)
+    push_top: int = 50  # 推送前多少名
+    push_queue_size: int = 100  # 每个订阅者最多积压的事件数, 超出后断开
+    push_heartbeat: float = 15.0  # 推送心跳间隔(秒)
 
 class Settings(BaseModel):
     DEBUG_MODE: bool = False
@@ -24,6 +75,10 @@ class Settings(BaseModel):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60*24*30  # 30天
     postgres: PostgresSettings = PostgresSettings()
+    postgres_replica: PostgresSettings | None = None  # 只读副本, 不配置时所有读取走主库
+    cache: CacheSettings = CacheSettings()
+    stats: StatsSettings = StatsSettings()
+    leaderboard: LeaderboardSettings = LeaderboardSettings()
     logger: LoggerConfig = LoggerConfig(
         level=LogLevel.INFO,
         name="zhaojin",
@@ -36,7 +91,7 @@ class Settings(BaseModel):
     @property
     def DATABASE_URL(self) -> str:
         """构建数据库 URL"""
-        return f"postgresql+asyncpg://{self.postgres.user}:{self.postgres.password}@{self.postgres.host}:{self.postgres.port}/{self.postgres.db}"
+        return self.postgres.url
 
 def load_config(config_path: str = "config.yaml") -> Settings:
     """从YAML文件加载配置"""
@@ -1,16 +1,243 @@
-from typing import AsyncGenerator
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any
+from collections.abc import AsyncGenerator, AsyncIterator
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import PostgresSettings, settings
+
+logger = logging.getLogger(__name__)
+
+# 会话用量在 Session.info 中的键
+_SESSION_USAGE_KEY = "usage"
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池, 用于根据实际负载调整连接池大小"""
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+def make_engine(postgres: PostgresSettings) -> AsyncEngine:
+    """按配置创建异步引擎"""
+    return create_async_engine(
+        f"{postgres.url}?prepared_statement_cache_size={postgres.prepared_statement_cache_size}",
+        echo=settings.DEBUG_MODE,
+        future=True,
+        query_cache_size=postgres.query_cache_size,
+        poolclass=MeteredQueuePool,
+        pool_size=postgres.pool_size,
+        max_overflow=postgres.max_overflow,
+        pool_timeout=postgres.pool_timeout,
+        pool_recycle=postgres.pool_recycle,
+        pool_pre_ping=postgres.pool_pre_ping
+    )
 
-from .config import settings
 
 # 创建异步引擎
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG_MODE,
-    future=True
-)
+engine = make_engine(settings.postgres)
+# 只读副本引擎, 未配置时为None
+replica_engine: AsyncEngine | None = make_engine(settings.postgres_replica) if settings.postgres_replica else None
+
+
+class RecentWriters:
+    """最近写入过数据的用户
+
+    副本同步有延迟, 用户写入后 window 秒内的读取仍走主库, 保证用户能读到自己刚写入的数据;
+    只记录本进程处理的写入, 其他 worker 的写入由客户端带回的 cookie 识别(见 core.dependencies)
+    """
+    def __init__(self, window: float, max_entries: int = 100000):
+        self._window = window
+        self._max_entries = max_entries
+        self._entries: OrderedDict[int, float] = OrderedDict()
+
+    def mark(self, user_id: int) -> None:
+        """记录用户写入"""
+        self._entries[user_id] = time.monotonic() + self._window
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def apply(self, deltas: dict[tuple[str, int | None, int | None], int]) -> None:
+        """统计提交后记录对应用户的写入"""
+        for _, user_id, _ in deltas:
+            if user_id is not None:
+                self.mark(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        expires_at = self._entries.get(user_id)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            return False
+        return True
+
+
+recent_writers = RecentWriters(window=settings.postgres.read_your_writes)
+
+
+class SessionUsage:
+    """单个会话的数据库用量: 执行的语句数, 以及从取得连接到归还连接的累计占用时间"""
+    __slots__ = ("statements", "connections", "held", "_connected_at")
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.connections = 0
+        self.held = 0.0
+        self._connected_at: float | None = None
+
+    def connected(self) -> None:
+        self.connections += 1
+        self._connected_at = time.perf_counter()
+
+    def released(self) -> None:
+        if self._connected_at is None:
+            return
+        self.held += time.perf_counter() - self._connected_at
+        self._connected_at = None
+
+
+class SessionMetrics:
+    """按请求会话汇总的数据库用量, 用于观察有多少请求无需访问数据库以及连接占用时长"""
+    def __init__(self) -> None:
+        self.sessions = 0
+        self.sessions_without_connection = 0
+        self.statements = 0
+        self.held_total = 0.0
+        self.held_max = 0.0
+
+    def add(self, usage: SessionUsage) -> None:
+        """记录一个已关闭的会话"""
+        self.sessions += 1
+        if not usage.connections:
+            self.sessions_without_connection += 1
+        self.statements += usage.statements
+        self.held_total += usage.held
+        self.held_max = max(self.held_max, usage.held)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "sessions_without_connection": self.sessions_without_connection,
+            "statements": self.statements,
+            "held_total_ms": round(self.held_total * 1000, 3),
+            "held_avg_ms": round(self.held_total * 1000 / self.sessions, 3) if self.sessions else 0.0,
+            "held_max_ms": round(self.held_max * 1000, 3),
+        }
+
+
+session_metrics = SessionMetrics()
+
+
+def _usage(session: Session) -> SessionUsage | None:
+    return session.info.get(_SESSION_USAGE_KEY)
+
+
+@event.listens_for(Session, "after_begin")
+def _on_connection_acquired(session: Session, transaction: SessionTransaction, _connection: Connection) -> None:
+    """会话首次执行语句时才开启事务并取得连接"""
+    usage = _usage(session)
+    if usage is not None and transaction.parent is None:
+        usage.connected()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _on_connection_released(session: Session, transaction: SessionTransaction) -> None:
+    """根事务结束(提交/回滚/关闭)时连接归还连接池"""
+    usage = _usage(session)
+    if usage is not None and transaction.parent is None:
+        usage.released()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_execute(state: ORMExecuteState) -> None:
+    usage = _usage(state.session)
+    if usage is not None:
+        usage.statements += 1
+
+
+async def open_session(target: AsyncEngine) -> AsyncGenerator[AsyncSession, None]:
+    """创建请求会话并记录用量
+
+    会话在第一次执行语句时才从连接池取得连接, 完全由缓存应答的请求不会占用连接
+    """
+    usage = SessionUsage()
+    async with AsyncSession(target, expire_on_commit=False, info={_SESSION_USAGE_KEY: usage}) as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+            usage.released()
+            session_metrics.add(usage)
+            if usage.connections:
+                logger.debug(
+                    "Session ran %d statements, held %d connection(s) for %.3f ms",
+                    usage.statements, usage.connections, usage.held * 1000
+                )
+
+
+def _metrics(target: AsyncEngine, postgres: PostgresSettings) -> dict[str, Any]:
+    pool = target.sync_engine.pool
+    assert isinstance(pool, MeteredQueuePool)
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": postgres.max_overflow,
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_total_ms": round(pool.wait_total * 1000, 3),
+        "wait_avg_ms": round(pool.wait_total * 1000 / pool.checkouts, 3) if pool.checkouts else 0.0,
+        "wait_max_ms": round(pool.wait_max * 1000, 3),
+    }
+
+
+def pool_metrics() -> dict[str, Any]:
+    """连接池指标: 当前占用/溢出连接数以及获取连接的累计等待时间"""
+    metrics = _metrics(engine, settings.postgres)
+    metrics["sessions"] = session_metrics.to_dict()
+    if replica_engine is not None and settings.postgres_replica is not None:
+        metrics["replica"] = _metrics(replica_engine, settings.postgres_replica)
+    return metrics
+
+
+async def ping() -> bool:
+    """数据库是否可用: 从连接池取一个连接执行 SELECT 1"""
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        logger.warning("Database ping failed", exc_info=True)
+        return False
+    return True
 
 async def init_db() -> None:
     """初始化数据库"""
@@ -19,9 +246,29 @@ async def init_db() -> None:
         await conn.run_sync(SQLModel.metadata.create_all)
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    """获取数据库会话"""
+    """获取数据库会话, 首次执行语句时才取得连接"""
+    async for session in open_session(engine):
+        yield session
+
+async def get_replica_session() -> AsyncGenerator[AsyncSession, None]:
+    """获取只读会话, 配置了只读副本时连接副本, 否则连接主库; 只能用于不写入数据的接口"""
+    async for session in open_session(replica_engine or engine):
+        yield session
+
+
+def is_replica(db: AsyncSession) -> bool:
+    """会话是否连接只读副本"""
+    return replica_engine is not None and db.bind is replica_engine
+
+
+@asynccontextmanager
+async def primary_session(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """加载进程内共享缓存用的会话
+
+    db 连接只读副本时另开一个主库会话, 避免把副本上延迟的数据缓存下来, 在缓存有效期内提供给所有请求
+    """
+    if not is_replica(db):
+        yield db
+        return
     async with AsyncSession(engine, expire_on_commit=False) as session:
-        try:
-            yield session
-        finally:
-            await session.close() 
\ No newline at end of file
+        yield session
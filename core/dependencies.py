@@ -1,22 +1,48 @@
-from fastapi import Depends, HTTPException, status
+import math
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .database import get_session
-from core.models.user import User
+from .config import settings
+from .database import engine, get_session, open_session, recent_writers, replica_engine
 from services.auth import AuthService
-from services.user import UserService
+from services.stats import on_stat_committed
+from services.user import CurrentUser, UserService
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="v1/auth/token")
 
+# 用户提交的统计写入主库后, 一段时间内该用户的读取仍走主库
+on_stat_committed(recent_writers.apply)
+
+# 写请求成功后设置的 cookie, 有效期内该客户端的读取走主库
+READ_PRIMARY_COOKIE = "read_primary"
+
+async def mark_recent_write(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    """中间件: 写请求成功后设置 cookie
+
+    recent_writers 只记录本进程处理的写入, 多 worker 部署时后续读请求可能落到其他 worker,
+    由客户端带回的 cookie 保证该用户仍能读到自己刚写入的数据
+    """
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            "1",
+            max_age=math.ceil(settings.postgres.read_your_writes),
+            httponly=True,
+            samesite="lax"
+        )
+    return response
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_session),
     auth_service: AuthService = Depends(),
     user_service: UserService = Depends()
-) -> User:
+) -> CurrentUser:
     """
-    获取当前用户
+    获取当前用户, 只包含接口需要的字段, 短期缓存
     :raises: HTTPException 如果认证失败
     """
     try:
@@ -24,7 +50,10 @@ async def get_current_user(
         employee_id = await auth_service.verify_token(token)
         
         # 获取用户
-        user = await user_service.get_by_employee_id(db, employee_id)
+        user = await user_service.get_current_user(db, employee_id)
+        if db.in_transaction():
+            # 认证查询结束后立即归还连接, 只读副本上的接口不会再使用该会话
+            await db.commit()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -36,4 +65,18 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        )
+
+async def get_read_session(
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user)
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    获取当前用户的只读会话
+    配置了只读副本时连接副本; 用户刚写入过数据(本进程记录或请求带有 read_primary cookie)时仍连接主库,
+    保证读到自己的写入
+    """
+    recently_wrote = current_user.id in recent_writers or READ_PRIMARY_COOKIE in request.cookies
+    target = engine if replica_engine is None or recently_wrote else replica_engine
+    async for session in open_session(target):
+        yield session
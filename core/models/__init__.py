@@ -3,7 +3,7 @@ from .auth import *
 from .organization import *
 from .user import *
 from .study import *
-from .stats import *
+from .stats import StatInfo, StatInfoDaily, StatInfoRecord
 
 __all__ = [
     # Base
@@ -32,4 +32,5 @@ __all__ = [
     # Stats
     "StatInfo",
     "StatInfoRecord",
+    "StatInfoDaily",
 ] 
\ No newline at end of file
@@ -37,4 +37,4 @@ class BaseModel(Base, TimestampMixin):
         default=dict
     )
     created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
-    updated_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now) 
\ No newline at end of file
+    updated_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now, onupdate=datetime.now) 
\ No newline at end of file
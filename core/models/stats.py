@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Index
+from sqlalchemy import String, Index, text
+from datetime import date
 from typing import Optional
 from enum import Enum
 
@@ -41,6 +42,12 @@ class StatInfo(BaseModel):
         Index("ix_stat_info_source_id", "source_id"),
         Index("ix_stat_info_target_id", "target_id"),
         Index("ix_stat_info_total", "total"),
+        # 每个 (类型, 源, 目标) 只有一条统计, 用户级统计的 target_id 为空, 按 0 参与唯一约束
+        Index(
+            "uq_stat_info_type_source_target",
+            "type", "source_id", text("coalesce(target_id, 0)"),
+            unique=True
+        ),
     )
 
 class StatInfoRecord(BaseModel):
@@ -51,6 +58,8 @@ class StatInfoRecord(BaseModel):
     source_id: Mapped[Optional[int]]
     target_id: Mapped[Optional[int]]
     value: Mapped[int] = mapped_column(nullable=False, default=0)
+    # 是否已累加到 stat_info.total, 写后缓冲写入的记录先为 False, 刷写后置为 True
+    applied: Mapped[bool] = mapped_column(nullable=False, default=True)
 
     # 索引
     __table_args__ = (
@@ -58,4 +67,20 @@ class StatInfoRecord(BaseModel):
         Index("ix_stat_info_record_source_id", "source_id"),
         Index("ix_stat_info_record_target_id", "target_id"),
         Index("ix_stat_info_record_created_at", "created_at"),
-    ) 
\ No newline at end of file
+        Index("ix_stat_info_record_pending", "id", postgresql_where=text("NOT applied")),
+    )
+
+class StatInfoDaily(BaseModel):
+    """按天汇总的用户统计, 供按日/周/月统计的排行榜使用"""
+    __tablename__ = "stat_info_daily"
+
+    type: Mapped[StatType] = mapped_column(String(64), nullable=False)
+    source_id: Mapped[int] = mapped_column(nullable=False)
+    day: Mapped[date] = mapped_column(nullable=False)
+    total: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    # 索引
+    __table_args__ = (
+        Index("uq_stat_info_daily_type_source_day", "type", "source_id", "day", unique=True),
+        Index("ix_stat_info_daily_type_day", "type", "day"),
+    )
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Any
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey, Numeric, JSON, Index
+from sqlalchemy import DateTime, String, ForeignKey, Numeric, JSON, Index, Text, text
 from schemas.v1.question import Answer, Option, JudgeAnswer, SingleSelectionAnswer, MultiSelectionAnswer, BlankFillAnswer, QAAnswer
 from .base import BaseModel
 from .user import User
@@ -12,8 +12,8 @@ class Knowledge(BaseModel):
     name: Mapped[str] = mapped_column(String(255), nullable=False)
 
     # 关系
-    questions: Mapped[List["Question"]] = relationship(back_populates="knowledge")
-    user_eases: Mapped[List["UserKnowledgeEase"]] = relationship(back_populates="knowledge")
+    questions: Mapped[list["Question"]] = relationship(back_populates="knowledge")
+    user_eases: Mapped[list["UserKnowledgeEase"]] = relationship(back_populates="knowledge")
 
 class Question(BaseModel):
     """题目"""
@@ -24,59 +24,57 @@ class Question(BaseModel):
         nullable=False
     )
     knowledge_id: Mapped[int] = mapped_column(ForeignKey("knowledge.id"), nullable=False)
+    question_type: Mapped[str] = mapped_column(String(32), nullable=False, default="", server_default="")  # 题目类型
+    description: Mapped[str] = mapped_column(Text, nullable=False, default="", server_default="")  # 题目描述
+    options_json: Mapped[list[dict[str, Any]]] = mapped_column(
+        JSON,
+        nullable=False,
+        default=list,
+        server_default=text("'[]'")
+    )
+    correct_answer_json: Mapped[dict[str, Any]] = mapped_column(
+        JSON,
+        nullable=False,
+        default=dict,
+        server_default=text("'{}'")
+    )
 
     # 关系
-    knowledge: Mapped[Optional[Knowledge]] = relationship(back_populates="questions")
-    study_cards: Mapped[List["UserQuestionStudyCard"]] = relationship(back_populates="question")
-    submission_records: Mapped[List["UserQuestionSubmissionRecord"]] = relationship(back_populates="question")
+    knowledge: Mapped[Knowledge | None] = relationship(back_populates="questions")
+    study_cards: Mapped[list["UserQuestionStudyCard"]] = relationship(back_populates="question")
+    submission_records: Mapped[list["UserQuestionSubmissionRecord"]] = relationship(back_populates="question")
 
-    # 从meta中提取的属性
     @property
-    def question_type(self) -> str:
-        """题目类型"""
-        return self.meta.get("type", "")
-    
-    @question_type.setter
-    def question_type(self, value: str):
-        self.meta["type"] = value
-    
-    @property
-    def options(self) -> List[Option]:
-        return self.meta.get("options", [])
+    def options(self) -> list[Option]:
+        return self.options_json # type: ignore
     
     @options.setter
-    def options(self, value: List[Option]):
-        self.meta["options"] = [opt.model_dump() for opt in value]
+    def options(self, value: list[Option]):
+        self.options_json = [opt.model_dump() for opt in value]
     
     @property
     def correct_answer(self) -> Answer:
         """正确答案"""
+        data = self.correct_answer_json or None
         if self.question_type == "judge":
-            return JudgeAnswer(**self.meta.get("correct_answer", {'analysis': '', 'result': ''}))
+            return JudgeAnswer(**(data or {'analysis': '', 'result': ''}))
         elif self.question_type == "single":
-            return SingleSelectionAnswer(**self.meta.get("correct_answer", {'analysis': '', 'result': Option(index=0, content='', option_name='')}))
+            empty = Option(index=0, content='', option_name='')
+            return SingleSelectionAnswer(**(data or {'analysis': '', 'result': empty}))
         elif self.question_type == "multi":
-            return MultiSelectionAnswer(**self.meta.get("correct_answer", {'analysis': '', 'result': []}))
+            return MultiSelectionAnswer(**(data or {'analysis': '', 'result': []}))
         elif self.question_type in ["blank"]:
-            return BlankFillAnswer(**self.meta.get("correct_answer", {'analysis': '', 'result': []}))
-        return QAAnswer(**self.meta.get("correct_answer", {'analysis': '', 'result': ''}))
+            return BlankFillAnswer(**(data or {'analysis': '', 'result': []}))
+        return QAAnswer(**(data or {'analysis': '', 'result': ''}))
     
     @correct_answer.setter
     def correct_answer(self, value: Answer):
-        self.meta["correct_answer"] = value.model_dump()
-
-    @property
-    def description(self) -> str:
-        """题目描述"""
-        return self.meta.get("description", "")
-    
-    @description.setter
-    def description(self, value: str):
-        self.meta["description"] = value
+        self.correct_answer_json = value.model_dump()
 
     # 索引
     __table_args__ = (
         Index("ix_question_knowledge_id", "knowledge_id"),
+        Index("ix_question_question_type", "question_type"),
     )
 
 class UserQuestionSubmissionRecord(BaseModel):
@@ -85,37 +83,20 @@ class UserQuestionSubmissionRecord(BaseModel):
 
     question_id: Mapped[int] = mapped_column(ForeignKey("question.id"), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
+    client_submission_id: Mapped[str | None] = mapped_column(String(64))  # 客户端提交ID, 用于批量提交幂等
+    is_correct: Mapped[bool] = mapped_column(nullable=False, default=False, server_default=text("false"))  # 是否正确
+    duration: Mapped[int] = mapped_column(nullable=False, default=0, server_default=text("0"))  # 答题用时(秒)
+    submitted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))  # 提交时间
 
     # 关系
-    question: Mapped[Optional[Question]] = relationship(back_populates="submission_records")
-    user: Mapped[Optional[User]] = relationship()
-# 索引
-    __table_args__ = (
-        Index("ix_user_question_submission_record_question_id", "question_id"),
-        Index("ix_user_question_submission_record_user_id", "user_id"),
-        Index("ix_user_question_submission_record_created_at", "created_at"),
-    )
+    question: Mapped[Question | None] = relationship(back_populates="submission_records")
+    user: Mapped[User | None] = relationship()
     # 从meta中提取的属性
-    @property
-    def is_correct(self) -> bool:
-        """是否正确"""
-        return self.meta.get("is_correct", False)
-    
     @property
     def answer(self) -> Answer:
         """用户答案"""
         from services.study import AnswerService
         return AnswerService.make_answer(self.meta.get("answer", {}), self.question.question_type) # type: ignore
-    
-    @property
-    def duration(self) -> int:
-        """答题用时(秒)"""
-        return self.meta.get("duration", 0)
-    
-    @property
-    def submitted_at(self) -> datetime:
-        """提交时间"""
-        return datetime.fromisoformat(self.meta.get("submitted_at", ""))
 
     @property
     def knowledge_id(self) -> int:
@@ -123,7 +104,7 @@ class UserQuestionSubmissionRecord(BaseModel):
         return self.question.knowledge_id if self.question else 0
 
     @property
-    def knowledge(self) -> Optional[Knowledge]:
+    def knowledge(self) -> Knowledge | None:
         """获取知识点"""
         return self.question.knowledge if self.question else None
 
@@ -132,6 +113,13 @@ class UserQuestionSubmissionRecord(BaseModel):
         Index("ix_user_question_submission_record_question_id", "question_id"),
         Index("ix_user_question_submission_record_user_id", "user_id"),
         Index("ix_user_question_submission_record_created_at", "created_at"),
+        Index(
+            "uq_user_question_submission_record_client_id",
+            "user_id",
+            "client_submission_id",
+            unique=True,
+            postgresql_where=text("client_submission_id IS NOT NULL"),
+        ),
     )
 
 class UserQuestionStudyCard(BaseModel):
@@ -140,12 +128,12 @@ class UserQuestionStudyCard(BaseModel):
 
     question_id: Mapped[int] = mapped_column(ForeignKey("question.id"), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
-    card_json: Mapped[Dict[str, Any]] = mapped_column(
+    card_json: Mapped[dict[str, Any]] = mapped_column(
         JSON,
         nullable=False
     )
     due: Mapped[datetime] = mapped_column(nullable=False)
-    last_study_time: Mapped[Optional[datetime]]
+    last_study_time: Mapped[datetime | None]
     study_count: Mapped[int] = mapped_column(nullable=False, default=0)
     correct_count: Mapped[int] = mapped_column(nullable=False, default=0)
     adaptivity_easy_factor: Mapped[float] = mapped_column(
@@ -158,8 +146,8 @@ class UserQuestionStudyCard(BaseModel):
     )
 
     # 关系
-    question: Mapped[Optional[Question]] = relationship(back_populates="study_cards")
-    user: Mapped[Optional[User]] = relationship()
+    question: Mapped[Question | None] = relationship(back_populates="study_cards")
+    user: Mapped[User | None] = relationship()
 
     # 索引
     __table_args__ = (
@@ -180,8 +168,8 @@ class UserKnowledgeEase(BaseModel):
     )
 
     # 关系
-    knowledge: Mapped[Optional[Knowledge]] = relationship(back_populates="user_eases")
-    user: Mapped[Optional[User]] = relationship()
+    knowledge: Mapped[Knowledge | None] = relationship(back_populates="user_eases")
+    user: Mapped[User | None] = relationship()
 
     # 索引
     __table_args__ = (
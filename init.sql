@@ -11,6 +11,10 @@ CREATE TABLE "question" (
   "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
   "difficulty" decimal(8,6) NOT NULL,
   "knowledge_id" int NOT NULL,
+  "question_type" varchar(32) NOT NULL DEFAULT '',
+  "description" text NOT NULL DEFAULT '',
+  "options_json" JSON NOT NULL DEFAULT '[]',
+  "correct_answer_json" JSON NOT NULL DEFAULT '{}',
   "meta" JSON NOT NULL DEFAULT '{}',
   "created_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
   "updated_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
@@ -21,6 +25,10 @@ CREATE TABLE "user_question_submission_record" (
   "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
   "question_id" int NOT NULL,
   "user_id" int NOT NULL,
+  "client_submission_id" varchar(64),
+  "is_correct" bool NOT NULL DEFAULT false,
+  "duration" int NOT NULL DEFAULT 0,
+  "submitted_at" TIMESTAMPTZ,
   "meta" JSON NOT NULL DEFAULT '{}',
   "created_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
   "updated_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
@@ -147,6 +155,19 @@ CREATE TABLE "stat_info_record" (
   "source_id" int,
   "target_id" int,
   "value" int NOT NULL DEFAULT 0,
+  "applied" bool NOT NULL DEFAULT true,
+  "meta" JSON NOT NULL DEFAULT '{}',
+  "created_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
+  "updated_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
+  "deleted" bool NOT NULL DEFAULT false
+);
+
+CREATE TABLE "stat_info_daily" (
+  "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  "type" varchar(64) NOT NULL,
+  "source_id" int NOT NULL,
+  "day" date NOT NULL,
+  "total" int NOT NULL DEFAULT 0,
   "meta" JSON NOT NULL DEFAULT '{}',
   "created_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
   "updated_at" TIMESTAMPTZ NOT NULL DEFAULT 'now()',
@@ -165,12 +186,16 @@ CREATE TABLE "jwt_auth" (
 
 CREATE INDEX ON "question" ("knowledge_id");
 
+CREATE INDEX "ix_question_question_type" ON "question" ("question_type");
+
 CREATE INDEX ON "user_question_submission_record" ("question_id");
 
 CREATE INDEX ON "user_question_submission_record" ("user_id");
 
 CREATE INDEX ON "user_question_submission_record" ("created_at");
 
+CREATE UNIQUE INDEX "uq_user_question_submission_record_client_id" ON "user_question_submission_record" ("user_id", "client_submission_id") WHERE "client_submission_id" IS NOT NULL;
+
 CREATE INDEX ON "user_question_study_card" ("question_id");
 
 CREATE INDEX ON "user_question_study_card" ("user_id");
@@ -201,12 +226,20 @@ CREATE INDEX ON "stat_info" ("target_id");
 
 CREATE INDEX ON "stat_info" ("total");
 
+CREATE UNIQUE INDEX "uq_stat_info_type_source_target" ON "stat_info" ("type", "source_id", (coalesce("target_id", 0)));
+
 CREATE INDEX ON "stat_info_record" ("source_id");
 
 CREATE INDEX ON "stat_info_record" ("target_id");
 
 CREATE INDEX ON "stat_info_record" ("created_at");
 
+CREATE INDEX "ix_stat_info_record_pending" ON "stat_info_record" ("id") WHERE NOT "applied";
+
+CREATE UNIQUE INDEX "uq_stat_info_daily_type_source_day" ON "stat_info_daily" ("type", "source_id", "day");
+
+CREATE INDEX "ix_stat_info_daily_type_day" ON "stat_info_daily" ("type", "day");
+
 CREATE INDEX ON "jwt_auth" ("user_id");
 
 COMMENT ON COLUMN "knowledge"."name" IS '名字';
@@ -221,6 +254,14 @@ COMMENT ON COLUMN "question"."difficulty" IS '难度系数';
 
 COMMENT ON COLUMN "question"."knowledge_id" IS '知识点ID';
 
+COMMENT ON COLUMN "question"."question_type" IS '题目类型';
+
+COMMENT ON COLUMN "question"."description" IS '题目描述';
+
+COMMENT ON COLUMN "question"."options_json" IS '选项';
+
+COMMENT ON COLUMN "question"."correct_answer_json" IS '标准答案';
+
 COMMENT ON COLUMN "question"."created_at" IS '创建时间';
 
 COMMENT ON COLUMN "question"."updated_at" IS '更新时间';
@@ -231,6 +272,14 @@ COMMENT ON COLUMN "user_question_submission_record"."question_id" IS '问题ID';
 
 COMMENT ON COLUMN "user_question_submission_record"."user_id" IS '用户ID';
 
+COMMENT ON COLUMN "user_question_submission_record"."client_submission_id" IS '客户端提交ID(批量提交幂等)';
+
+COMMENT ON COLUMN "user_question_submission_record"."is_correct" IS '是否正确';
+
+COMMENT ON COLUMN "user_question_submission_record"."duration" IS '答题用时(秒)';
+
+COMMENT ON COLUMN "user_question_submission_record"."submitted_at" IS '提交时间';
+
 COMMENT ON COLUMN "user_question_submission_record"."created_at" IS '创建时间';
 
 COMMENT ON COLUMN "user_question_submission_record"."updated_at" IS '更新时间';
@@ -361,6 +410,8 @@ COMMENT ON COLUMN "stat_info_record"."target_id" IS '目标ID,如某道题/某
 
 COMMENT ON COLUMN "stat_info_record"."value" IS '值';
 
+COMMENT ON COLUMN "stat_info_record"."applied" IS '是否已累加到统计总值';
+
 COMMENT ON COLUMN "stat_info_record"."created_at" IS '创建时间';
 
 COMMENT ON COLUMN "stat_info_record"."updated_at" IS '更新时间';
@@ -412,3 +463,15 @@ ALTER TABLE "online_days" ADD FOREIGN KEY ("user_id") REFERENCES "user" ("id");
 ALTER TABLE "online_days_record" ADD FOREIGN KEY ("user_id") REFERENCES "user" ("id");
 
 ALTER TABLE "jwt_auth" ADD FOREIGN KEY ("user_id") REFERENCES "user" ("id");
+
+CREATE FUNCTION "touch_updated_at"() RETURNS trigger AS $$
+BEGIN
+  IF NEW."updated_at" IS NOT DISTINCT FROM OLD."updated_at" THEN
+    NEW."updated_at" = now();
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "question_touch_updated_at" BEFORE UPDATE ON "question"
+  FOR EACH ROW EXECUTE FUNCTION "touch_updated_at"();
@@ -1,10 +1,12 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, status
 
 from api.app import get_app
 from api.exception import setup_exception_handler
 from core.config import settings
+from core.database import ping, pool_metrics
+from core.dependencies import mark_recent_write
 from plugins.logger import (
     get_logger,
     mount_access_logger,
@@ -13,18 +15,49 @@ from plugins.logger import (
     setup_logger,
     update_log_context,
 )
+from services.leaderboard_hub import leaderboard_hub
+from services.ranking import leaderboard_snapshots
+from services.stats import stat_buffer, stat_daily_pruner
+
+
+async def database_health(response: Response) -> dict[str, bool]:
+    """数据库健康检查, 无需认证, 只返回数据库是否可用"""
+    available = await ping()
+    if not available:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"database": available}
 
 
 def init_app() -> FastAPI:
     @asynccontextmanager
     async def lifespan(_: FastAPI):  # type: ignore
         # FastAPI 启动之前的初始化
+        if settings.stats.write_behind:
+            await stat_buffer.start()
+        if settings.leaderboard.snapshot:
+            await leaderboard_snapshots.start()
+        await stat_daily_pruner.start()
+        if settings.leaderboard.push:
+            await leaderboard_hub.start()
         yield
         # FastAPI 结束之前的收尾工作
+        await leaderboard_hub.stop()
+        await stat_daily_pruner.stop()
+        await leaderboard_snapshots.stop()
+        await stat_buffer.stop()
 
     # 获取 FastAPI 实例
     cur_app = get_app(settings.fastapi, lifespan=lifespan)  # type: ignore
 
+    # 配置了只读副本时, 写请求后用 cookie 标记一段时间内的读取走主库
+    if settings.postgres_replica is not None:
+        cur_app.middleware("http")(mark_recent_write)
+
+    # 数据库健康检查; 连接池和会话指标没有认证保护, 只在调试模式下暴露
+    cur_app.add_api_route("/health/db", database_health, methods=["GET"], tags=["health"])
+    if settings.fastapi.debug:
+        cur_app.add_api_route("/health/db/metrics", pool_metrics, methods=["GET"], tags=["health"])  # type: ignore
+
     # 日志
     logger = setup_logger(settings.logger)
     mount_logger(cur_app, logger)
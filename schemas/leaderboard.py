@@ -6,6 +6,7 @@ class GroupType(str, Enum):
     CLASS = "class"
     DEPARTMENT = "department"
     COMPANY = "company"
+    CORPORATION = "corporation"
 
 class BoardType(str, Enum):
     DURATION = "duration"
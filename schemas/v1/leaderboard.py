@@ -1,4 +1,4 @@
-from typing import List
+from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel
 
@@ -6,12 +6,23 @@ class GroupType(str, Enum):
     CLASS = "class"
     DEPARTMENT = "department"
     COMPANY = "company"
+    CORPORATION = "corporation"
 
 class BoardType(str, Enum):
     DURATION = "duration"
     PRACTICE = "practice"
     CORRECT = "correct"
 
+class TimeWindow(str, Enum):
+    ALL = "all"  # 全部
+    DAY = "day"  # 今天
+    WEEK = "week"  # 本周(从周一开始)
+    MONTH = "month"  # 本月
+
+class AggregateMetric(str, Enum):
+    TOTAL = "total"  # 成员总分
+    AVERAGE = "average"  # 人均分
+
 class LeaderboardEntry(BaseModel):
     index: int
     name: str
@@ -22,8 +33,32 @@ class LeaderboardEntry(BaseModel):
         from_attributes = True
 
 class LeaderboardResponse(BaseModel):
-    leaderboard: List[LeaderboardEntry]
+    leaderboard: list[LeaderboardEntry]
     me: LeaderboardEntry
+    snapshot_at: datetime | None = None  # 数据来自快照时为快照生成时间
+
+    class Config:
+        from_attributes = True
+
+class LeaderboardDelta(BaseModel):
+    """排行榜推送事件, 客户端用 entries 按 index 覆盖对应名次, 再截断到 size 条"""
+    version: int
+    size: int
+    entries: list[LeaderboardEntry]
+
+class GroupLeaderboardEntry(BaseModel):
+    index: int
+    group_id: int
+    name: str
+    member_count: int
+    score: float
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class GroupLeaderboardResponse(BaseModel):
+    leaderboard: list[GroupLeaderboardEntry]
+    me: GroupLeaderboardEntry  # 当前用户所在的分组
+
+    class Config:
+        from_attributes = True
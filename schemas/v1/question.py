@@ -1,11 +1,11 @@
-from typing import List, Union, Optional
-from pydantic import BaseModel
+from typing import Union
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class Option(BaseModel):
     """选项"""
     index: int  # 序列,给选项排序
-    content: Optional[str] = None # 选项内容
+    content: str | None = None # 选项内容
     option_name: str  # 序列名,比如 A B C 这种选项名
 
     class Config:
@@ -23,11 +23,11 @@ class QuestionBase(BaseModel):
 
 class SingleSelectionQuestion(QuestionBase):
     """单选题"""
-    options: List[Option]
+    options: list[Option]
 
 class MultiSelectionQuestion(QuestionBase):
     """多选题"""
-    options: List[Option]
+    options: list[Option]
 
 class JudgeQuestion(QuestionBase):
     """判断题"""
@@ -46,10 +46,15 @@ Question = Union[SingleSelectionQuestion, MultiSelectionQuestion, JudgeQuestion,
 class QuestionResponse(BaseModel):
     question: Question
     time: datetime
-    
+
+class QuestionBatchResponse(BaseModel):
+    """批量选题响应"""
+    questions: list[Question]
+    time: datetime
+
 class AnswerBase(BaseModel):
     """答案基类"""
-    analysis: Optional[str] = None
+    analysis: str | None = None
 
     class Config:
         from_attributes = True
@@ -60,7 +65,7 @@ class SingleSelectionAnswer(AnswerBase):
 
 class MultiSelectionAnswer(AnswerBase):
     """多选题答案"""
-    result: List[Option]  # 选中的选项列表
+    result: list[Option]  # 选中的选项列表
 
 class JudgeAnswer(AnswerBase):
     """判断题答案"""
@@ -68,7 +73,7 @@ class JudgeAnswer(AnswerBase):
 
 class BlankFillAnswer(AnswerBase):
     """填空题答案"""
-    result: List[str]
+    result: list[str]
 
 class QAAnswer(AnswerBase):
     """问答题答案"""
@@ -90,4 +95,19 @@ class AnswerHistory(BaseModel):
     is_correct: bool  # 是否正确
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class BulkAnswerSubmission(AnswerSubmission):
+    """批量提交中的单个答案"""
+    submission_id: str = Field(..., min_length=1, max_length=64)  # 客户端生成的提交ID, 重试时保持不变
+    question_id: int
+    answered_at: datetime | None = None  # 作答时间(离线作答时由客户端记录), 为空时取服务器收到的时间
+
+class BulkAnswerRequest(BaseModel):
+    """批量提交答案"""
+    submissions: list[BulkAnswerSubmission] = Field(..., min_length=1, max_length=500)
+
+class BulkAnswerResult(AnswerHistory):
+    """批量提交中单个答案的结果"""
+    submission_id: str
+    duplicated: bool  # 是否为已处理过的重复提交
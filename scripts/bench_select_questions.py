@@ -0,0 +1,171 @@
+"""选题性能基准
+
+对比旧的反连接选题查询(LIMIT 1)与未做题池随机选题的单次取题延迟。
+会在独立的基准库中重建表并写入测试数据, 不会改动业务库。
+
+用法:
+    python scripts/bench_select_questions.py --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from functools import partial
+from pathlib import Path
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from core.config import settings
+from core.models import *  # noqa: F403 注册所有模型
+from core.models.base import Base
+from core.models.study import Question, UserQuestionSubmissionRecord
+from services.question_pool import QuestionCatalog, UnansweredQuestionPool, UserQuestionPool
+
+BENCH_USER_ID = 1
+
+
+def make_url(db: str) -> str:
+    pg = settings.postgres
+    return f"postgresql+asyncpg://{pg.user}:{pg.password}@{pg.host}:{pg.port}/{db}"
+
+
+async def create_database(db: str) -> None:
+    """创建基准库(如不存在)"""
+    admin = create_async_engine(make_url("postgres"), isolation_level="AUTOCOMMIT")
+    async with admin.connect() as conn:
+        exists = await conn.scalar(text("SELECT 1 FROM pg_database WHERE datname = :db"), {"db": db})
+        if not exists:
+            await conn.execute(text(f'CREATE DATABASE "{db}"'))
+    await admin.dispose()
+
+
+async def seed(engine: AsyncEngine, questions: int, users: int, answered_ratio: float) -> int:
+    """重建表并写入组织、用户、题库以及基准用户的答题记录
+
+    Returns:
+        int: 基准用户已有的答题记录数
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("INSERT INTO corporation (id, name) VALUES (1, 'bench')"))
+        await conn.execute(text("INSERT INTO company (id, name, corp_id) VALUES (1, 'bench', 1)"))
+        await conn.execute(text("INSERT INTO department (id, name, company_id) VALUES (1, 'bench', 1)"))
+        await conn.execute(text("INSERT INTO class (id, name, department_id) VALUES (1, 'bench', 1)"))
+        await conn.execute(text(
+            "INSERT INTO \"user\" (name, class_id, department_id, company_id, meta, deleted, created_at, updated_at) "
+            "SELECT 'u' || i, 1, 1, 1, '{}', false, now(), now() FROM generate_series(1, :n) i"
+        ), {"n": users})
+        await conn.execute(text(
+            "INSERT INTO knowledge (name, meta, deleted, created_at, updated_at) "
+            "SELECT 'k' || i, '{}', false, now(), now() FROM generate_series(1, 10) i"
+        ))
+        await conn.execute(text(
+            "INSERT INTO question (difficulty, knowledge_id, question_type, description, options_json, "
+            "correct_answer_json, meta, deleted, created_at, updated_at) "
+            "SELECT round(random()::numeric, 6), i % 10 + 1, 'judge', 'q', '[]', '{\"result\": true}', '{}', "
+            "false, now(), now() FROM generate_series(1, :n) i"
+        ), {"n": questions})
+        # 基准用户已做完大部分题目, 旧查询无法提前结束
+        answered = int(questions * answered_ratio)
+        await conn.execute(text(
+            "INSERT INTO user_question_submission_record (question_id, user_id, is_correct, duration, submitted_at, "
+            "meta, deleted, created_at, updated_at) "
+            "SELECT i, :user_id, true, 10, now(), '{}', false, now(), now() FROM generate_series(1, :n) i"
+        ), {"n": answered, "user_id": BENCH_USER_ID})
+    return answered
+
+
+async def grow_submissions(engine: AsyncEngine, count: int, questions: int, users: int) -> None:
+    """为其他用户追加答题记录"""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO user_question_submission_record (question_id, user_id, is_correct, duration, submitted_at, "
+            "meta, deleted, created_at, updated_at) "
+            "SELECT (random() * (:q - 1))::int + 1, (random() * (:u - 2))::int + 2, random() < 0.5, 10, now(), "
+            "'{}', false, now(), now() FROM generate_series(1, :n)"
+        ), {"n": count, "q": questions, "u": users})
+        await conn.execute(text("ANALYZE"))
+
+
+async def measure(fn: Callable[[], Awaitable[None]], iterations: int) -> list[float]:
+    """重复执行并返回每次耗时(毫秒)"""
+    timings: list[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summary(timings: list[float]) -> str:
+    p95 = sorted(timings)[int(len(timings) * 0.95) - 1]
+    return f"median {statistics.median(timings):8.3f} ms  p95 {p95:8.3f} ms"
+
+
+async def legacy_pick(db: AsyncSession) -> None:
+    """旧实现, 对用户答题记录做反连接, 取第一道未做题"""
+    stmt = (
+        select(Question)
+        .outerjoin(
+            UserQuestionSubmissionRecord,
+            (UserQuestionSubmissionRecord.question_id == Question.id) &
+            (UserQuestionSubmissionRecord.user_id == BENCH_USER_ID)
+        )
+        .where(UserQuestionSubmissionRecord.id.is_(None))
+        .limit(1)
+    )
+    (await db.execute(stmt)).scalar_one_or_none()
+    db.expunge_all()
+
+
+async def pooled_pick(db: AsyncSession, user_pool: UserQuestionPool, difficulty: bool) -> None:
+    """新实现, 从未做题池随机取题并按主键加载"""
+    question_id = user_pool.peek(difficulty=random.random() if difficulty else None)
+    assert question_id is not None
+    await db.get(Question, question_id)
+    db.expunge_all()
+
+
+async def main(args: argparse.Namespace) -> None:
+    await create_database(args.db)
+    engine = create_async_engine(make_url(args.db))
+    answered = await seed(engine, args.questions, args.users, args.answered_ratio)
+    total = answered
+
+    for size in sorted(args.sizes):
+        if size > total:
+            await grow_submissions(engine, size - total, args.questions, args.users)
+            total = size
+
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            pool = UnansweredQuestionPool(QuestionCatalog(ttl=3600), ttl=3600, max_users=10)
+            build_start = time.perf_counter()
+            user_pool = await pool.get(db, BENCH_USER_ID)
+            build_ms = (time.perf_counter() - build_start) * 1000
+
+            legacy_timings = await measure(partial(legacy_pick, db), args.iterations)
+            pooled_timings = await measure(partial(pooled_pick, db, user_pool, args.difficulty), args.iterations)
+
+        print(f"submissions={size:>9,}")
+        print(f"  anti-join : {summary(legacy_timings)}")
+        print(f"  pool pick : {summary(pooled_timings)}  (cold build {build_ms:.1f} ms)")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=f"{settings.postgres.db}_bench", help="基准库名, 会被重建")
+    parser.add_argument("--questions", type=int, default=10000, help="题库大小")
+    parser.add_argument("--users", type=int, default=2000, help="用户数")
+    parser.add_argument("--answered-ratio", type=float, default=0.9, help="基准用户已做题比例")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="答题记录总数")
+    parser.add_argument("--iterations", type=int, default=200, help="每组取题次数")
+    parser.add_argument("--difficulty", action="store_true", help="按随机目标难度加权取题")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,133 @@
+"""热点语句构造开销基准
+
+对比每次请求重新构造 SQLAlchemy 语句与复用只构造一次的参数化语句时, 每次请求在 Python 侧的 CPU 开销.
+每次请求都经由 Connection.execute 完整执行一遍: 构造语句(仅重新构造方式)、生成缓存键、查找编译缓存、
+绑定参数、执行并取回结果. 执行在空的内存 SQLite 库上进行, 两种方式的数据库耗时相同且可以忽略,
+差值即为语句复用节省的 Python CPU 时间. 不需要 Postgres.
+
+stat_info 的 upsert 使用 Postgres 专有语法, 无法在 SQLite 上执行; 对它只比较按 Postgres 方言编译出的
+不同 SQL 文本数, 文本不随行数变化时 asyncpg 的预编译语句才能复用. 不带 RETURNING 的 upsert 以 executemany
+执行, 始终是同一条 SQL; 写后缓冲的记录插入需要 RETURNING 取回ID, SQLAlchemy 用 insertmanyvalues 把各行合并成
+多行 VALUES 发送, 每种批次行数各是一条 SQL, 与旧的多行 VALUES 写法相同, 一并列出作对照.
+
+用法:
+    python scripts/bench_statement_cache.py --iterations 5000
+"""
+import argparse
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import create_engine, func, literal_column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from core.models.base import Base
+from core.models.stats import StatInfo, StatInfoRecord
+from schemas.v1.leaderboard import BoardType, GroupType
+from services.leaderboard import leaderboard_query, user_ranks_query
+from services.stats import increment_stmt
+from services.study import answer_state_query, study_stats_query
+from services.user import current_user_query
+
+BOARDS = ((GroupType.DEPARTMENT, BoardType.DURATION), (GroupType.COMPANY, BoardType.DURATION))
+
+# 用例名 -> (每次重新构造, 复用, 执行参数)
+CASES: dict[str, tuple[Callable[[], Any], Callable[[], Any], dict[str, Any]]] = {
+    "current user": (
+        current_user_query.__wrapped__,
+        current_user_query,
+        {"employee_id": "E001"},
+    ),
+    "answer state": (
+        answer_state_query.__wrapped__,
+        answer_state_query,
+        {"user_id": 1, "question_id": 1},
+    ),
+    "study stats": (
+        study_stats_query.__wrapped__,
+        study_stats_query,
+        {"user_ids": [1, 2, 3]},
+    ),
+    "leaderboard": (
+        lambda: leaderboard_query.__wrapped__(GroupType.DEPARTMENT, BoardType.DURATION, False),
+        lambda: leaderboard_query(GroupType.DEPARTMENT, BoardType.DURATION, False),
+        {"user_id": 1, "count": 20},
+    ),
+    "user ranks": (
+        lambda: user_ranks_query.__wrapped__(BOARDS),
+        lambda: user_ranks_query(BOARDS),
+        {"user_id": 1},
+    ),
+}
+
+
+def legacy_increment(rows: int) -> Any:
+    """旧的多行 VALUES upsert, 语句随行数变化"""
+    stmt = insert(StatInfo).values([
+        {"type": "duration", "source_id": i, "target_id": None, "total": 1} for i in range(rows)
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=[StatInfo.type, StatInfo.source_id, func.coalesce(StatInfo.target_id, literal_column("0"))],
+        set_={"total": StatInfo.total + stmt.excluded.total, "updated_at": stmt.excluded.updated_at},
+    )
+
+
+def record_insert(rows: int) -> Any:
+    """一批 rows 行的带 RETURNING 的记录插入, 与 insertmanyvalues 按批生成的语句形式相同"""
+    return insert(StatInfoRecord).values([
+        {"type": "duration", "source_id": i, "target_id": None, "value": 1, "applied": False} for i in range(rows)
+    ]).returning(StatInfoRecord.id)
+
+
+def measure(conn: Connection, build: Callable[[], Any], params: dict[str, Any], iterations: int) -> list[float]:
+    """重复执行语句, 返回每次请求的 CPU 耗时(微秒)"""
+    timings: list[float] = []
+    for _ in range(iterations):
+        start = time.process_time()
+        conn.execute(build(), params).all()
+        timings.append((time.process_time() - start) * 1_000_000)
+    return timings
+
+
+def summary(timings: list[float]) -> str:
+    return f"mean {statistics.fmean(timings):8.2f} us"
+
+
+def main(args: argparse.Namespace) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    print(f"iterations={args.iterations:,}")
+    with engine.connect() as conn:
+        for name, (rebuilt, cached, params) in CASES.items():
+            # 预热编译缓存, 两种方式都只测命中缓存后的开销
+            conn.execute(cached(), params).all()
+            rebuilt_timings = measure(conn, rebuilt, params, args.iterations)
+            cached_timings = measure(conn, cached, params, args.iterations)
+            saved = statistics.fmean(rebuilt_timings) - statistics.fmean(cached_timings)
+            print(f"{name}")
+            print(f"  rebuilt : {summary(rebuilt_timings)}")
+            print(f"  cached  : {summary(cached_timings)}  (saves {saved:.2f} us per request)")
+
+    dialect = postgresql.dialect()
+    sizes = range(1, args.max_rows + 1)
+    legacy_sql = {str(legacy_increment(rows).compile(dialect=dialect)) for rows in sizes}
+    template_sql = {str(increment_stmt().compile(dialect=dialect)) for _ in sizes}
+    record_sql = {str(record_insert(rows).compile(dialect=dialect)) for rows in sizes}
+    print(f"stat upsert, 1..{args.max_rows} rows per flush")
+    print(f"  multi-row VALUES: {len(legacy_sql)} distinct SQL texts")
+    print(f"  executemany     : {len(template_sql)} distinct SQL text(s)")
+    print(f"record insert with RETURNING, 1..{args.max_rows} rows per request")
+    print(f"  insertmanyvalues: {len(record_sql)} distinct SQL texts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000, help="每种语句的执行次数")
+    parser.add_argument("--max-rows", type=int, default=50, help="统计 upsert 比较的最大行数")
+    main(parser.parse_args())
@@ -0,0 +1,57 @@
+"""令牌验证性能基准
+
+对比每次完整验签(jose.jwt.decode)与已验证令牌缓存命中时的单次认证耗时。
+只在内存中运行, 不需要数据库。
+
+用法:
+    python scripts/bench_verify_token.py --iterations 100000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import services.auth as auth
+from services.auth import AuthService, VerifiedTokenCache
+
+
+async def measure(fn: Callable[[], Awaitable[str]], iterations: int) -> list[float]:
+    """重复执行并返回每次耗时(微秒)"""
+    timings: list[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    return timings
+
+
+def summary(timings: list[float]) -> str:
+    p95 = sorted(timings)[int(len(timings) * 0.95) - 1]
+    return f"median {statistics.median(timings):8.2f} us  p95 {p95:8.2f} us"
+
+
+async def main(args: argparse.Namespace) -> None:
+    token = AuthService.create_access_token("bench")
+
+    # 旧实现, 缓存容量为0, 每次都完整验签
+    auth.verified_tokens = VerifiedTokenCache(max_entries=0)
+    decode_timings = await measure(lambda: AuthService.verify_token(token), args.iterations)
+
+    # 新实现, 首次验签后命中缓存
+    auth.verified_tokens = VerifiedTokenCache(max_entries=args.iterations)
+    await AuthService.verify_token(token)
+    cached_timings = await measure(lambda: AuthService.verify_token(token), args.iterations)
+
+    print(f"iterations={args.iterations:,}")
+    print(f"  jwt.decode : {summary(decode_timings)}")
+    print(f"  cached     : {summary(cached_timings)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000, help="验证次数")
+    asyncio.run(main(parser.parse_args()))
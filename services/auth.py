@@ -1,15 +1,59 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+import hashlib
+import time
 from jose import jwt, JWTError
 import logging
 from core.config import settings
+
+
+class VerifiedTokenCache:
+    """已验证令牌缓存
+
+    以令牌摘要为键缓存 (工号, 过期时间), 客户端在有效期内反复使用同一令牌时不再重复验签;
+    只缓存验证通过的令牌, 过期时间到达后自动失效
+    """
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        """令牌摘要, 不在内存中保存令牌原文"""
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> str | None:
+        """获取已验证令牌的工号, 未缓存或已过期时返回None"""
+        key = self.digest(token)
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        employee_id, expires_at = item
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return employee_id
+
+    def put(self, token: str, employee_id: str, expires_at: float) -> None:
+        """缓存验证通过的令牌"""
+        key = self.digest(token)
+        self._entries[key] = (employee_id, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache(max_entries=settings.cache.verified_token_max_entries)
+
+
 class AuthService:
     """认证服务"""
     
     @staticmethod
     def create_access_token(
         employee_id: str,
-        expires_delta: Optional[timedelta] = None
+        expires_delta: timedelta | None = None
     ) -> str:
         """
         创建访问令牌
@@ -43,6 +87,9 @@ class AuthService:
         :return: 工号
         :raises: ValueError 如果令牌无效或过期
         """
+        employee_id = verified_tokens.get(token)
+        if employee_id is not None:
+            return employee_id
         try:
             payload = jwt.decode(
                 token,
@@ -52,6 +99,9 @@ class AuthService:
             employee_id = payload.get("sub")
             if not isinstance(employee_id, str):
                 raise ValueError("Could not validate credentials")
+            expires_at = payload.get("exp")
+            if isinstance(expires_at, int | float):
+                verified_tokens.put(token, employee_id, expires_at)
             return employee_id
         except JWTError as e:
             from api.app import AppContext
@@ -0,0 +1,146 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from sqlalchemy import event
+
+from core.config import settings
+from core.exceptions import ValidationError
+from core.models.study import Question
+from schemas.v1.question import Answer
+
+
+class AnswerKey(NamedTuple):
+    """预编译的标准答案
+
+    expected 为判分用的紧凑不可变值: 判断题为 bool, 单选题为选项序号, 多选题为选项序号的 frozenset,
+    填空题为规范化后的字符串元组, 问答题为规范化后的字符串
+    """
+    question_type: str
+    expected: Hashable
+    answer: Answer  # 解析后的标准答案, 用于返回给客户端
+    stamp: datetime | None  # 编译时题目的 updated_at
+
+
+def normalize_text(value: str) -> str:
+    """规范化文本答案(去除首尾空白)"""
+    return value.strip()
+
+
+def _compile_expected(question_type: str, answer: Answer) -> Hashable:
+    result: Any = answer.result
+    if question_type == "judge":
+        return result
+    if question_type == "single":
+        return result.index
+    if question_type == "multi":
+        return frozenset(option.index for option in result)
+    if question_type == "blank":
+        return tuple(normalize_text(item) for item in result)
+    if question_type == "qa":
+        return normalize_text(result)
+    return None
+
+
+# 各题型的判分函数: (用户答案的 result, 预编译的 expected) -> 是否正确
+_GRADERS: dict[str, Callable[[Any, Any], bool]] = {
+    "judge": lambda result, expected: result == expected,
+    "single": lambda result, expected: result.index == expected,
+    "multi": lambda result, expected: frozenset(option.index for option in result) == expected,
+    "blank": lambda result, expected: tuple(normalize_text(item) for item in result) == expected,
+    "qa": lambda result, expected: normalize_text(result) == expected,
+}
+
+
+class GradingEngine:
+    """判分引擎
+
+    每道题只解析一次标准答案, 编译成不可变的 AnswerKey 并按题目ID缓存, 按 LRU 淘汰;
+    题目在本进程内更新或删除时通过 ORM 事件失效, 其他进程的修改通过 updated_at 变化识别
+    (ORM 更新与数据库触发器都会刷新 updated_at), 超过 ttl 的答案也会重新编译以兜底
+    """
+    def __init__(self, ttl: float = 300.0, max_keys: int = 20000):
+        self._ttl = ttl
+        self._max_keys = max_keys
+        self._keys: OrderedDict[int, tuple[AnswerKey, float]] = OrderedDict()
+
+    @classmethod
+    def compile(cls, question: Question) -> AnswerKey:
+        """把题目编译成标准答案"""
+        answer = question.correct_answer
+        return AnswerKey(
+            question_type=question.question_type,
+            expected=_compile_expected(question.question_type, answer),
+            answer=answer,
+            stamp=question.updated_at,
+        )
+
+    def key(self, question: Question) -> AnswerKey:
+        """获取题目的标准答案, 缓存未命中、题目已修改或缓存过期时重新编译"""
+        now = time.monotonic()
+        entry = self._keys.get(question.id)
+        if entry is not None:
+            key, compiled_at = entry
+            if key.stamp == question.updated_at and now - compiled_at < self._ttl:
+                self._keys.move_to_end(question.id)
+                return key
+        key = self.compile(question)
+        self._keys[question.id] = (key, now)
+        self._keys.move_to_end(question.id)
+        while len(self._keys) > self._max_keys:
+            self._keys.popitem(last=False)
+        return key
+
+    def correct_answer(self, question: Question) -> Answer:
+        """题目的标准答案"""
+        return self.key(question).answer
+
+    def grade(self, question: Question, answer: Answer) -> bool:
+        """判断答案是否正确, 答案格式需事先校验
+
+        Raises:
+            ValidationError: 不支持的题目类型
+        """
+        key = self.key(question)
+        grader = _GRADERS.get(key.question_type)
+        if grader is None:
+            raise ValidationError(message=f"Question type {key.question_type} is not supported")
+        return grader(answer.result, key.expected)
+
+    def grade_many(self, items: Iterable[tuple[Question, Answer]]) -> list[bool]:
+        """批量判分(考试批量提交、重新判分等场景)
+
+        Args:
+            items: (题目, 用户答案) 列表
+
+        Returns:
+            List[bool]: 与输入顺序一致的判分结果
+        """
+        return [self.grade(question, answer) for question, answer in items]
+
+    def invalidate(self, question_id: int | None = None) -> None:
+        """使指定题目(为空时为所有题目)的标准答案失效"""
+        if question_id is None:
+            self._keys.clear()
+        else:
+            self._keys.pop(question_id, None)
+
+    @property
+    def size(self) -> int:
+        """已缓存的标准答案数"""
+        return len(self._keys)
+
+
+grading_engine = GradingEngine(
+    ttl=settings.cache.grading_key_ttl,
+    max_keys=settings.cache.grading_max_keys,
+)
+
+
+@event.listens_for(Question, "after_update")
+@event.listens_for(Question, "after_delete")
+def _invalidate_answer_key(_mapper: Any, _connection: Any, target: Question) -> None:
+    """题目更新或删除后使其标准答案失效"""
+    grading_engine.invalidate(target.id)
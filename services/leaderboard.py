@@ -1,11 +1,26 @@
-from typing import List, Optional
-from sqlalchemy import select, String, func, case
+from datetime import datetime
+from functools import cache, lru_cache
+from typing import Any
+from collections.abc import Mapping, Sequence
+from sqlalchemy import Select, bindparam, select, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from core.config import settings
+from core.database import is_replica
 from core.models.user import User
-from core.models.stats import StatInfo, StatType
-from core.models.organization import Class, Department, Company
-from schemas.v1.leaderboard import LeaderboardResponse, LeaderboardEntry, GroupType, BoardType
+from core.models.stats import StatInfo, StatInfoDaily
+from core.exceptions import ValidationError
+from schemas.v1.leaderboard import (
+    LeaderboardResponse, LeaderboardEntry, GroupType, BoardType, TimeWindow,
+    AggregateMetric, GroupLeaderboardEntry, GroupLeaderboardResponse,
+)
+from .ranking import (
+    AGGREGATE_GROUPS, BOARD_STAT_TYPES, LeaderboardMember, LeaderboardSnapshot, RankedList,
+    group_aggregates, group_column, leaderboard_index, leaderboard_responses, leaderboard_snapshots,
+    make_etag, rank_cache, window_start,
+)
+from .stats import stat_day
 
 class LeaderboardService:
     """排行榜服务"""
@@ -22,76 +37,97 @@ class LeaderboardService:
         Args:
             db: 数据库会话
             user_id: 用户ID
-            group: 分组类型(class/department/company)
+            group: 分组类型(class/department/company/corporation)
             board_type: 榜单类型(duration/practice/correct)
             
         Returns:
             int: 用户排名，如果未找到用户则返回0
         """
-        # 将 board_type 转换为对应的 StatType
-        stat_type = {
-            "duration": StatType.DURATION,
-            "practice": StatType.PRACTICE,
-            "correct": StatType.CORRECT
-        }[board_type]
-        
         try:
-            # 获取用户的组织ID和分数
-            user_query = (
-                select(
-                    User.class_id,
-                    User.department_id,
-                    User.company_id,
-                    func.coalesce(StatInfo.total, 0).label("user_score")
-                )
-                .outerjoin(
-                    StatInfo,
-                    (StatInfo.source_id == User.id) & 
-                    (StatInfo.type == stat_type)
-                )
-                .where(User.id == user_id)
-            )
-            user_result = await db.execute(user_query)
-            user_info = user_result.first()
-            if not user_info:
-                return 0
-
-            # 构建计算排名的查询
-            rank_query = (
-                select(func.count() + 1)
-                .select_from(User)
-                .outerjoin(
-                    StatInfo,
-                    (StatInfo.source_id == User.id) & 
-                    (StatInfo.type == stat_type)
-                )
-            )
+            key = (GroupType(group), BoardType(board_type))
+        except ValueError:
+            return 0
+        ranks = await self.get_user_ranks(db, user_id, [key])
+        return ranks[key]
+
+    async def get_user_ranks(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        boards: Sequence[tuple[GroupType, BoardType]]
+    ) -> dict[tuple[GroupType, BoardType], int]:
+        """一次获取用户在多个榜单中的排名(同分同名次)
+
+        开启快照时直接从最新快照读取; 否则先查排名缓存, 未命中的榜单走内存有序索引,
+        或在一条查询中用多个标量子查询一起计算. 只读副本上算出的排名可能滞后, 不写入共享的排名缓存
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            boards: (分组类型, 榜单类型) 列表
 
-            # 添加分组过滤条件和分数比较
-            if group == "class" and user_info.class_id:
-                rank_query = rank_query.where(
-                    User.class_id == user_info.class_id,
-                    func.coalesce(StatInfo.total, 0) > user_info.user_score
-                )
-            elif group == "department" and user_info.department_id:
-                rank_query = rank_query.where(
-                    User.department_id == user_info.department_id,
-                    func.coalesce(StatInfo.total, 0) > user_info.user_score
-                )
-            elif group == "company" and user_info.company_id:
-                rank_query = rank_query.where(
-                    User.company_id == user_info.company_id,
-                    func.coalesce(StatInfo.total, 0) > user_info.user_score
-                )
+        Returns:
+            Dict[Tuple[GroupType, BoardType], int]: (分组类型, 榜单类型) -> 排名, 未找到用户时为0
+        """
+        snapshot = leaderboard_snapshots.current if settings.leaderboard.snapshot else None
+        if snapshot is not None:
+            member = snapshot.members.get(user_id)
+            return {
+                (group, board_type): snapshot.board(group, member.group_id(group), board_type).rank(user_id)
+                if member else 0
+                for group, board_type in boards
+            }
+
+        ranks: dict[tuple[GroupType, BoardType], int] = {}
+        missing: list[tuple[GroupType, BoardType]] = []
+        for group, board_type in dict.fromkeys(boards):
+            rank = rank_cache.get(user_id, group, board_type)
+            if rank is None:
+                missing.append((group, board_type))
             else:
-                return 0
+                ranks[(group, board_type)] = rank
+        if not missing:
+            return ranks
 
-            result = await db.execute(rank_query)
-            return result.scalar_one() or 1  # 如果没有人比当前用户分数高，返回1
+        if settings.leaderboard.memory_index:
+            computed = await self.get_user_ranks_from_index(db, user_id, missing)
+        else:
+            computed = await self.get_user_ranks_from_db(db, user_id, missing)
+        if settings.leaderboard.memory_index or not is_replica(db):
+            for (group, board_type), rank in computed.items():
+                rank_cache.put(user_id, group, board_type, rank)
+        ranks.update(computed)
+        return ranks
 
-        except Exception as e:
-            print(f"获取用户排名失败: {str(e)}")
-            return 0
+    @classmethod
+    async def get_user_ranks_from_db(
+        cls,
+        db: AsyncSession,
+        user_id: int,
+        boards: Sequence[tuple[GroupType, BoardType]]
+    ) -> dict[tuple[GroupType, BoardType], int]:
+        """用一条查询计算用户在多个榜单中的排名, 每个榜单是一个统计同组更高分人数的关联子查询"""
+        row = (await db.execute(user_ranks_query(tuple(boards)), {"user_id": user_id})).first()
+        if not row:
+            return dict.fromkeys(boards, 0)
+        return dict(zip(boards, row, strict=True))
+
+    @classmethod
+    async def get_user_ranks_from_index(
+        cls,
+        db: AsyncSession,
+        user_id: int,
+        boards: Sequence[tuple[GroupType, BoardType]]
+    ) -> dict[tuple[GroupType, BoardType], int]:
+        """从内存有序索引获取用户在多个榜单中的排名"""
+        member = await leaderboard_index.member(db, user_id)
+        if member is None:
+            return dict.fromkeys(boards, 0)
+        ranks: dict[tuple[GroupType, BoardType], int] = {}
+        for group, board_type in boards:
+            board = await leaderboard_index.board(db, group, member.group_id(group), board_type)
+            ranks[(group, board_type)] = board.rank(user_id)
+        return ranks
 
     async def get_leaderboard(
         self,
@@ -99,80 +135,321 @@ class LeaderboardService:
         group: GroupType,
         board_type: BoardType,
         user_id: int,
-        count: int
+        count: int,
+        window: TimeWindow = TimeWindow.ALL
     ) -> LeaderboardResponse:
         """获取排行榜数据
         
         Args:
-            group: 分组类型(class/department/company)
+            group: 分组类型(class/department/company/corporation)
             board_type: 榜单类型(duration/practice/correct)
             user_id: 当前用户ID
             count: 排行榜数量
+            window: 统计时间窗口(all/day/week/month), 非全部时间的榜单由按天汇总的统计计算
         """
-        # 将 board_type 转换为对应的 StatType
-        stat_type = {
-            "duration": StatType.DURATION,
-            "practice": StatType.PRACTICE,
-            "correct": StatType.CORRECT
-        }[board_type]
-        
-        # 构建基础查询
-        base_query = select(
-            User.id,
-            User.name,
-            func.coalesce(func.cast(User.meta["avatar"], String), "").label("avatar"),
-            func.coalesce(StatInfo.total, 0).label("score")  # 不需要max，因为每个用户最多只有一条记录
-        ).outerjoin(  # 使用outerjoin确保所有用户都会出现
-            StatInfo,
-            (StatInfo.source_id == User.id) & 
-            (StatInfo.type == stat_type)
-        )
+        if window != TimeWindow.ALL:
+            return await self.get_leaderboard_from_db(db, group, board_type, user_id, count, window)
+        snapshot = leaderboard_snapshots.current if settings.leaderboard.snapshot else None
+        if snapshot is not None:
+            return self.get_leaderboard_from_snapshot(snapshot, group, board_type, user_id, count)
+        if settings.leaderboard.memory_index:
+            return await self.get_leaderboard_from_index(db, group, board_type, user_id, count)
+        return await self.get_leaderboard_from_db(db, group, board_type, user_id, count, window)
 
-        # 根据分组类型添加关联
-        if group == "class":
-            base_query = base_query.add_columns(
-                Class.id.label("group_id"),
-                Class.name.label("group_name")
-            ).join(Class)  # 这里保持inner join因为用户必须属于一个班级
-        elif group == "department":
-            base_query = base_query.add_columns(
-                Department.id.label("group_id"),
-                Department.name.label("group_name")
-            ).join(Department)  # 这里保持inner join因为用户必须属于一个部门
-        else:  # company
-            base_query = base_query.add_columns(
-                Company.id.label("group_id"),
-                Company.name.label("group_name")
-            ).join(Company)  # 这里保持inner join因为用户必须属于一个公司
-
-        # 构建最终查询
-        query = (
-            base_query
-            .order_by(func.coalesce(StatInfo.total, 0).desc())  # 按分数降序排序
-        )
+    async def get_leaderboard_body(
+        self,
+        db: AsyncSession,
+        group: GroupType,
+        board_type: BoardType,
+        user_id: int,
+        count: int,
+        window: TimeWindow = TimeWindow.ALL
+    ) -> tuple[str, bytes]:
+        """获取序列化后的排行榜响应及其 ETag
 
-        # 执行查询
-        result = await db.execute(query)
-        rows = result.all()
+        榜单版本未变化时前 N 名直接取缓存, 不再查询和序列化; 当前用户的 me 能从内存榜单得到时只渲染 me,
+        否则走完整查询. 在只读副本上查询得到的响应可能滞后, 不写入共享的响应缓存. 参数同 get_leaderboard
+
+        Returns:
+            Tuple[str, bytes]: (ETag, JSON 响应体)
+        """
+        if not settings.leaderboard.response_cache:
+            response = await self.get_leaderboard(db, group, board_type, user_id, count, window)
+            body = response.model_dump_json().encode()
+            return make_etag(body), body
+
+        snapshot = leaderboard_snapshots.current if settings.leaderboard.snapshot else None
+        if snapshot is not None and window == TimeWindow.ALL:
+            member = snapshot.members.get(user_id)
+        else:
+            snapshot = None
+            member = await leaderboard_index.member(db, user_id)
+        if member is None:
+            response = await self.get_leaderboard(db, group, board_type, user_id, count, window)
+            body = response.model_dump_json().encode()
+            return make_etag(body), body
+
+        group_id = member.group_id(group)
+        key = (group, group_id, board_type, window, window_start(window, stat_day()), count)
+        # 先取版本号再生成响应, 生成期间有新的统计提交时缓存会被视为过期
+        if snapshot is not None:
+            version: tuple[int, ...] = (snapshot.version,)
+        else:
+            version = leaderboard_responses.version(group, group_id, board_type)
+        entry = leaderboard_responses.get(key, version)
+        if entry is not None:
+            cached = entry.get(user_id)
+            if cached is not None:
+                return cached
+            if snapshot is not None:
+                board = snapshot.board(group, group_id, board_type)
+                return entry.render(user_id, self.make_entry(board, snapshot.members, user_id))
+            if window == TimeWindow.ALL and settings.leaderboard.memory_index:
+                board = await leaderboard_index.board(db, group, group_id, board_type)
+                return entry.render(user_id, self.make_entry(board, leaderboard_index.members, user_id))
+        response = await self.get_leaderboard(db, group, board_type, user_id, count, window)
+        from_memory = snapshot is not None or (window == TimeWindow.ALL and settings.leaderboard.memory_index)
+        if not from_memory and is_replica(db):
+            body = response.model_dump_json().encode()
+            return make_etag(body), body
+        return leaderboard_responses.put(key, version, user_id, response)
+
+    @classmethod
+    async def get_leaderboard_from_db(
+        cls,
+        db: AsyncSession,
+        group: GroupType,
+        board_type: BoardType,
+        user_id: int,
+        count: int,
+        window: TimeWindow
+    ) -> LeaderboardResponse:
+        """在数据库中计算当前用户所在分组的排行榜
+
+        只在当前用户所在分组内排名, 由 Postgres 用窗口函数算出名次, 只返回前 count 名和当前用户这几行;
+        时间窗口榜单的分数是窗口内几个按天分桶之和
+        """
+        start = window_start(window, stat_day())
+        params: dict[str, Any] = {"user_id": user_id, "count": count}
+        if start is not None:
+            params["start"] = start
+        rows = (await db.execute(leaderboard_query(group, board_type, start is not None), params)).all()
 
         # 构建排行榜数据
-        leaderboard_entries: List[LeaderboardEntry] = []
-        my_entry: Optional[LeaderboardEntry] = None
-        
-        for index, row in enumerate(rows, 1):
+        leaderboard_entries: list[LeaderboardEntry] = []
+        my_entry: LeaderboardEntry | None = None
+        for row in rows:
             entry = LeaderboardEntry(
-                index=index,
+                index=row.position,
                 name=row.name,
-                avatar=row.avatar or "",
+                avatar=row.avatar,
                 score=row.score
             )
-            leaderboard_entries.append(entry)
-            
+            if row.position <= count:
+                leaderboard_entries.append(entry)
             # 如果是当前用户，保存其位置信息
             if row.id == user_id:
                 my_entry = entry
 
         return LeaderboardResponse(
-            leaderboard=leaderboard_entries[:count],
+            leaderboard=leaderboard_entries,
             me=my_entry or LeaderboardEntry(index=0, name="", avatar="", score=0)
         )
+
+    async def get_group_leaderboard(
+        self,
+        db: AsyncSession,
+        group: GroupType,
+        board_type: BoardType,
+        metric: AggregateMetric,
+        user_id: int,
+        count: int
+    ) -> GroupLeaderboardResponse:
+        """获取分组聚合榜: 当前用户所在集团内的班级/部门/公司按总分或人均分排名
+
+        Args:
+            group: 参与排名的分组类型(class/department/company)
+            board_type: 榜单类型(duration/practice/correct)
+            metric: 聚合方式(total/average)
+            user_id: 当前用户ID
+            count: 排行榜数量
+
+        Raises:
+            ValidationError: 分组类型不支持聚合排名
+        """
+        if group not in AGGREGATE_GROUPS:
+            raise ValidationError(message=f"分组类型 {group.value} 不支持聚合排名")
+        empty = GroupLeaderboardEntry(index=0, group_id=0, name="", member_count=0, score=0)
+        member = await leaderboard_index.member(db, user_id)
+        if member is None:
+            return GroupLeaderboardResponse(leaderboard=[], me=empty)
+        await group_aggregates.load(db)
+
+        my_group_id = member.group_id(group)
+        leaderboard_entries: list[GroupLeaderboardEntry] = []
+        my_entry = empty
+        ranking = group_aggregates.ranking(group, member.corporation_id, board_type, metric)
+        for index, (group_id, aggregate, score) in enumerate(ranking, 1):
+            if index > count and group_id != my_group_id:
+                continue
+            entry = GroupLeaderboardEntry(
+                index=index,
+                group_id=group_id,
+                name=aggregate.name,
+                member_count=aggregate.members,
+                score=score
+            )
+            if index <= count:
+                leaderboard_entries.append(entry)
+            if group_id == my_group_id:
+                my_entry = entry
+        return GroupLeaderboardResponse(leaderboard=leaderboard_entries, me=my_entry)
+
+    @classmethod
+    async def get_leaderboard_from_index(
+        cls,
+        db: AsyncSession,
+        group: GroupType,
+        board_type: BoardType,
+        user_id: int,
+        count: int
+    ) -> LeaderboardResponse:
+        """从内存有序索引获取当前用户所在分组的排行榜, 只构造前 count 名和当前用户的条目"""
+        member = await leaderboard_index.member(db, user_id)
+        if member is None:
+            return cls.make_leaderboard(RankedList({}), {}, user_id, count)
+        board = await leaderboard_index.board(db, group, member.group_id(group), board_type)
+        return cls.make_leaderboard(board, leaderboard_index.members, user_id, count)
+
+    @classmethod
+    def get_leaderboard_from_snapshot(
+        cls,
+        snapshot: LeaderboardSnapshot,
+        group: GroupType,
+        board_type: BoardType,
+        user_id: int,
+        count: int
+    ) -> LeaderboardResponse:
+        """从最新快照获取当前用户所在分组的排行榜, 响应中带上快照时间"""
+        member = snapshot.members.get(user_id)
+        board = snapshot.board(group, member.group_id(group), board_type) if member else RankedList({})
+        return cls.make_leaderboard(board, snapshot.members, user_id, count, snapshot_at=snapshot.taken_at)
+
+    @classmethod
+    def make_leaderboard(
+        cls,
+        board: RankedList,
+        members: Mapping[int, LeaderboardMember],
+        user_id: int,
+        count: int,
+        snapshot_at: datetime | None = None
+    ) -> LeaderboardResponse:
+        """由榜单索引构造排行榜响应, 只构造前 count 名和当前用户的条目"""
+        empty = LeaderboardMember("", "", 0, 0, 0, 0)
+        leaderboard_entries: list[LeaderboardEntry] = []
+        for index, (entry_user_id, score) in enumerate(board.top(count), 1):
+            entry_member = members.get(entry_user_id, empty)
+            leaderboard_entries.append(LeaderboardEntry(
+                index=index,
+                name=entry_member.name,
+                avatar=entry_member.avatar,
+                score=score
+            ))
+
+        my_entry = cls.make_entry(board, members, user_id)
+        return LeaderboardResponse(leaderboard=leaderboard_entries, me=my_entry, snapshot_at=snapshot_at)
+
+    @classmethod
+    def make_entry(cls, board: RankedList, members: Mapping[int, LeaderboardMember], user_id: int) -> LeaderboardEntry:
+        """用户在榜单中的条目, 不在榜单中时 index 为0"""
+        position = board.position(user_id)
+        member = members.get(user_id) if position else None
+        return LeaderboardEntry(
+            index=position,
+            name=member.name if member else "",
+            avatar=member.avatar if member else "",
+            score=board.score(user_id) or 0
+        )
+
+
+@lru_cache(maxsize=64)
+def user_ranks_query(boards: tuple[tuple[GroupType, BoardType], ...]) -> Select[Any]:
+    """计算用户在多个榜单中排名的语句, 每种榜单组合只构造一次, 参数为 user_id"""
+    columns = []
+    for group, board_type in boards:
+        stat_type = BOARD_STAT_TYPES[board_type]
+        my_score = func.coalesce(
+            select(StatInfo.total)
+            .where(StatInfo.source_id == User.id, StatInfo.type == stat_type)
+            .correlate(User)
+            .scalar_subquery(),
+            0
+        )
+        other = aliased(User)
+        other_stat = aliased(StatInfo)
+        columns.append(
+            select(func.count() + 1)
+            .select_from(other)
+            .outerjoin(
+                other_stat,
+                (other_stat.source_id == other.id) &
+                (other_stat.type == stat_type)
+            )
+            .where(
+                group_column(group, other) == group_column(group),
+                func.coalesce(other_stat.total, 0) > my_score
+            )
+            .scalar_subquery()
+        )
+    return select(*columns).where(User.id == bindparam("user_id"))
+
+
+@cache
+def leaderboard_query(group: GroupType, board_type: BoardType, windowed: bool) -> Select[Any]:
+    """分组排行榜的语句, 每种 (分组类型, 榜单类型, 是否时间窗口) 只构造一次
+
+    参数为 user_id, count, 时间窗口榜单另有 start(窗口起始日)
+    """
+    user_id = bindparam("user_id")
+    stat_type = BOARD_STAT_TYPES[board_type]
+    column = group_column(group)
+    caller = aliased(User)
+    ranked = select(
+        User.id,
+        User.name,
+        func.coalesce(User.meta["avatar"].as_string(), "").label("avatar"),
+    )
+    if not windowed:
+        score = func.coalesce(StatInfo.total, 0)  # 不需要max，因为每个用户最多只有一条记录
+        ranked = ranked.outerjoin(  # 使用outerjoin确保分组内所有用户都会出现
+            StatInfo,
+            (StatInfo.source_id == User.id) &
+            (StatInfo.type == stat_type)
+        )
+    else:
+        score = func.coalesce(
+            select(func.sum(StatInfoDaily.total))
+            .where(
+                StatInfoDaily.source_id == User.id,
+                StatInfoDaily.type == stat_type,
+                StatInfoDaily.day >= bindparam("start")
+            )
+            .scalar_subquery(),
+            0
+        )
+    ranked = (
+        ranked.add_columns(
+            score.label("score"),
+            func.row_number().over(
+                partition_by=column,
+                order_by=(score.desc(), User.id)
+            ).label("position")
+        )
+        .where(column == select(group_column(group, caller)).where(caller.id == user_id).scalar_subquery())
+        .subquery()
+    )
+    return (
+        select(ranked)
+        .where((ranked.c.position <= bindparam("count")) | (ranked.c.id == user_id))
+        .order_by(ranked.c.position)
+    )
@@ -0,0 +1,435 @@
+import asyncio
+import contextlib
+import json
+import logging
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import engine
+from schemas.v1.leaderboard import BoardType, GroupType, LeaderboardDelta, LeaderboardEntry
+
+from .ranking import (
+    STAT_BOARD_TYPES,
+    BoardKey,
+    GroupAggregates,
+    LeaderboardIndex,
+    LeaderboardResponseCache,
+    RankCache,
+    RankedList,
+    group_aggregates,
+    leaderboard_index,
+    leaderboard_responses,
+    rank_cache,
+)
+from .stats import StatKey, on_stat_committed
+
+logger = logging.getLogger(__name__)
+
+# 广播消息处理函数: (来源 worker, 统计增量, 提交时间 time.time())
+MessageHandler = Callable[[str, dict[StatKey, int], float], None]
+
+
+class LocalBroker:
+    """进程内广播, 单 worker 部署时使用, 不需要外部组件"""
+    async def start(self, handler: MessageHandler, on_reset: Callable[[], None]) -> None:
+        """开始接收其他 worker 的消息(进程内没有其他 worker)"""
+
+    async def stop(self) -> None:
+        """停止接收消息"""
+
+    def publish(self, origin: str, deltas: dict[StatKey, int], committed_at: float) -> None:
+        """广播统计增量给其他 worker(进程内没有其他 worker)"""
+
+
+class PostgresBroker:
+    """基于 Postgres LISTEN/NOTIFY 的广播, 多 worker 部署时把各 worker 提交的统计增量转发给其他 worker
+
+    提交的增量先在内存中排队, 每隔 interval 秒在专用的监听连接上合并成一条 NOTIFY 发出(超过载荷上限时拆成几条),
+    不为每次提交占用连接池中的连接; 监听连接断开后自动重连, 断开期间可能漏收消息, 重连后调用 on_reset 重新同步
+    """
+    # NOTIFY 载荷上限为 8000 字节, 留出余量
+    MAX_PAYLOAD = 7000
+    # 连接断开期间最多排队的提交数, 超出后丢弃最早的(其他 worker 在 on_reset 或榜单过期后重新同步)
+    MAX_PENDING = 10000
+
+    def __init__(self, channel: str, interval: float):
+        self._channel = channel
+        self._interval = interval
+        self._connection: Any = None
+        self._driver: Any = None
+        self._origin = ""
+        self._pending: list[tuple[float, dict[StatKey, int]]] = []
+        self._handler: MessageHandler | None = None
+        self._on_reset: Callable[[], None] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @classmethod
+    def encode(
+        cls,
+        origin: str,
+        batches: list[tuple[float, dict[StatKey, int]]]
+    ) -> list[tuple[str, list[tuple[float, dict[StatKey, int]]]]]:
+        """把多次提交的增量编码为若干条不超过载荷上限的消息, 返回 [(消息, 其中包含的提交)]"""
+        messages: list[tuple[str, list[tuple[float, dict[StatKey, int]]]]] = []
+        prefix = json.dumps({"origin": origin, "batches": []})[:-2]
+        items: list[str] = []
+        chunk: list[tuple[float, dict[StatKey, int]]] = []
+        size = len(prefix) + 2
+        for batch in batches:
+            committed_at, deltas = batch
+            item = json.dumps([committed_at, [[*key, value] for key, value in deltas.items()]])
+            if items and size + len(item) + 2 > cls.MAX_PAYLOAD:
+                messages.append((prefix + ", ".join(items) + "]}", chunk))
+                items, chunk, size = [], [], len(prefix) + 2
+            items.append(item)
+            chunk.append(batch)
+            size += len(item) + 2
+        if items:
+            messages.append((prefix + ", ".join(items) + "]}", chunk))
+        return messages
+
+    @staticmethod
+    def decode(payload: str) -> tuple[str, list[tuple[float, dict[StatKey, int]]]]:
+        """解码消息, 返回 (来源 worker, [(提交时间, 统计增量)])"""
+        message = json.loads(payload)
+        batches = [
+            (committed_at, {(type_, source_id, target_id): value for type_, source_id, target_id, value in items})
+            for committed_at, items in message["batches"]
+        ]
+        return message["origin"], batches
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        if self._handler is None:
+            return
+        origin, batches = self.decode(payload)
+        for committed_at, deltas in batches:
+            self._handler(origin, deltas, committed_at)
+
+    async def _connect(self) -> None:
+        self._connection = await engine.connect()
+        raw = await self._connection.get_raw_connection()
+        self._driver = raw.driver_connection
+        await self._driver.add_listener(self._channel, self._on_notify)
+
+    async def _disconnect(self) -> None:
+        connection, self._connection, self._driver = self._connection, None, None
+        if connection is None:
+            return
+        try:
+            await connection.invalidate()
+            await connection.close()
+        except Exception:
+            logger.exception("Failed to close leaderboard broker connection")
+
+    async def start(self, handler: MessageHandler, on_reset: Callable[[], None]) -> None:
+        """建立监听连接并启动定时发送任务"""
+        if self._task is not None:
+            return
+        self._handler = handler
+        self._on_reset = on_reset
+        await self._connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """发出剩余的增量并关闭监听连接"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to publish leaderboard message")
+        await self._disconnect()
+
+    def publish(self, origin: str, deltas: dict[StatKey, int], committed_at: float) -> None:
+        """把统计增量加入发送队列, 不阻塞提交流程"""
+        self._origin = origin
+        self._pending.append((committed_at, deltas))
+        if len(self._pending) > self.MAX_PENDING:
+            del self._pending[:len(self._pending) - self.MAX_PENDING]
+
+    async def flush(self) -> None:
+        """在监听连接上发出排队的增量, 发送失败的部分留在队列中下次重试"""
+        if not self._pending or self._driver is None:
+            return
+        pending, self._pending = self._pending, []
+        messages = self.encode(self._origin, pending)
+        for sent, (payload, _) in enumerate(messages):
+            try:
+                await self._driver.execute("SELECT pg_notify($1, $2)", self._channel, payload)
+            except Exception:
+                self._pending[:0] = [batch for _, batches in messages[sent:] for batch in batches]
+                raise
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                if self._driver is None or self._driver.is_closed():
+                    await self._disconnect()
+                    await self._connect()
+                    logger.warning("Leaderboard broker reconnected")
+                    if self._on_reset is not None:
+                        self._on_reset()
+                await self.flush()
+            except Exception:
+                logger.exception("Leaderboard broker connection failed, retrying")
+                await self._disconnect()
+
+
+class LeaderboardHub:
+    """排行榜实时推送中心
+
+    订阅者按 (分组类型, 分组ID, 榜单类型) 登记; 统计提交后只把受影响的榜单标记为待推送,
+    后台任务每隔 interval 秒对每个待推送榜单计算一次前 N 名并与上次推送的结果比较,
+    把变化的名次作为同一个增量事件放入所有订阅者的队列, 计算量与订阅人数无关.
+    其他 worker 提交的统计通过 broker 转发, 同时应用到本进程的榜单索引、排名缓存、响应缓存和分组聚合
+    """
+    def __init__(
+        self,
+        index: LeaderboardIndex,
+        broker: Any,
+        interval: float,
+        top: int,
+        queue_size: int,
+        ranks: RankCache | None = None,
+        responses: LeaderboardResponseCache | None = None,
+        aggregates: GroupAggregates | None = None
+    ):
+        self._index = index
+        self._ranks = ranks
+        self._responses = responses
+        self._aggregates = aggregates
+        self._broker = broker
+        self._interval = interval
+        self._top = top
+        self._queue_size = queue_size
+        self._origin = uuid.uuid4().hex
+        self._subscribers: dict[BoardKey, set[asyncio.Queue[LeaderboardDelta | None]]] = {}
+        self._last: dict[BoardKey, list[LeaderboardEntry]] = {}
+        self._versions: dict[BoardKey, int] = {}
+        self._dirty: set[BoardKey] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def running(self) -> bool:
+        """推送任务是否在运行"""
+        return self._task is not None
+
+    @property
+    def origin(self) -> str:
+        """本进程的 worker 标识, 用于忽略自己广播出去的消息"""
+        return self._origin
+
+    def _entries(self, board: RankedList) -> list[LeaderboardEntry]:
+        """计算榜单前 N 名"""
+        members = self._index.members
+        entries: list[LeaderboardEntry] = []
+        for index, (user_id, score) in enumerate(board.top(self._top), 1):
+            member = members.get(user_id)
+            entries.append(LeaderboardEntry(
+                index=index,
+                name=member.name if member else "",
+                avatar=member.avatar if member else "",
+                score=score
+            ))
+        return entries
+
+    async def subscribe(
+        self,
+        db: AsyncSession,
+        group: GroupType,
+        group_id: int,
+        board_type: BoardType
+    ) -> tuple["asyncio.Queue[LeaderboardDelta | None]", LeaderboardDelta]:
+        """订阅榜单, 返回 (增量事件队列, 当前完整榜单); 队列中的None表示推送已断开"""
+        key = (group, group_id, board_type)
+        board = await self._index.board(db, group, group_id, board_type)
+        if key not in self._last:
+            self._last[key] = self._entries(board)
+        queue: asyncio.Queue[LeaderboardDelta | None] = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.setdefault(key, set()).add(queue)
+        current = LeaderboardDelta(
+            version=self._versions.get(key, 0),
+            size=len(self._last[key]),
+            entries=self._last[key]
+        )
+        return queue, current
+
+    def unsubscribe(
+        self,
+        group: GroupType,
+        group_id: int,
+        board_type: BoardType,
+        queue: "asyncio.Queue[LeaderboardDelta | None]"
+    ) -> None:
+        """取消订阅, 榜单没有订阅者后不再计算"""
+        key = (group, group_id, board_type)
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[key]
+            self._last.pop(key, None)
+            self._dirty.discard(key)
+
+    def _mark(self, deltas: dict[StatKey, int]) -> None:
+        """标记受统计增量影响且有订阅者的榜单"""
+        for type_, user_id, target_id in deltas:
+            board_type = STAT_BOARD_TYPES.get(type_)
+            if board_type is None or target_id is not None or user_id is None:
+                continue
+            member = self._index.members.get(user_id)
+            if member is None:
+                continue
+            for group in GroupType:
+                key = (group, member.group_id(group), board_type)
+                if key in self._subscribers:
+                    self._dirty.add(key)
+        if self._dirty and self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_committed(self, deltas: dict[StatKey, int]) -> None:
+        """本进程提交的统计增量: 标记待推送的榜单并转发给其他 worker"""
+        if self._task is None:
+            return
+        board_deltas = {
+            key: value for key, value in deltas.items()
+            if key[0] in STAT_BOARD_TYPES and key[1] is not None and key[2] is None
+        }
+        if not board_deltas:
+            return
+        self._mark(board_deltas)
+        self._broker.publish(self._origin, board_deltas, time.time())
+
+    def on_message(self, origin: str, deltas: dict[StatKey, int], committed_at: float) -> None:
+        """其他 worker 转发的统计增量: 更新本进程的榜单索引和分组聚合, 使排名和响应缓存失效, 并标记待推送的榜单
+
+        提交早于榜单或聚合读取时间的增量已包含在分数中, 由榜单索引和分组聚合跳过
+        """
+        if origin == self._origin:
+            return
+        self._index.apply(deltas, committed_at)
+        if self._ranks is not None:
+            self._ranks.apply(deltas)
+        if self._responses is not None:
+            self._responses.apply(deltas)
+        if self._aggregates is not None:
+            self._aggregates.apply(deltas, committed_at)
+        self._mark(deltas)
+
+    def on_reset(self) -> None:
+        """广播连接重连后可能漏收了消息: 使榜单索引和各级缓存失效, 所有订阅的榜单重新加载后推送"""
+        self._index.invalidate()
+        if self._ranks is not None:
+            self._ranks.invalidate()
+        if self._responses is not None:
+            self._responses.invalidate()
+        if self._aggregates is not None:
+            self._aggregates.invalidate()
+        self._dirty.update(self._subscribers)
+        if self._dirty and self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def _close(queue: "asyncio.Queue[LeaderboardDelta | None]") -> None:
+        """清空队列并放入断开标记"""
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def push(self) -> int:
+        """对每个待推送的榜单计算一次增量并发给所有订阅者, 返回推送的事件数"""
+        dirty, self._dirty = self._dirty, set()
+        pushed = 0
+        # 榜单索引过期或被淘汰时才需要查询数据库, 会话在首次查询时才获取连接
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            boards = {
+                key: await self._index.board(db, *key)
+                for key in dirty
+                if self._subscribers.get(key)
+            }
+        for key, board in boards.items():
+            subscribers = self._subscribers.get(key)
+            if not subscribers:
+                continue
+            entries = self._entries(board)
+            last = self._last.get(key, [])
+            changed = [entry for i, entry in enumerate(entries) if i >= len(last) or last[i] != entry]
+            if not changed and len(entries) == len(last):
+                continue
+            self._last[key] = entries
+            version = self._versions[key] = self._versions.get(key, 0) + 1
+            delta = LeaderboardDelta(version=version, size=len(entries), entries=changed)
+            for queue in list(subscribers):
+                try:
+                    queue.put_nowait(delta)
+                except asyncio.QueueFull:
+                    # 消费过慢的订阅者直接断开, 由客户端重连后重新获取完整榜单
+                    self.unsubscribe(*key, queue)
+                    self._close(queue)
+                    continue
+                pushed += 1
+        return pushed
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # 合并 interval 内的多次变化, 每个榜单只计算一次
+            await asyncio.sleep(self._interval)
+            try:
+                await self.push()
+            except Exception:
+                logger.exception("Failed to push leaderboard deltas")
+
+    async def start(self) -> None:
+        """启动推送任务"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        await self._broker.start(self.on_message, self.on_reset)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止推送任务并断开所有订阅者"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self._wakeup = None
+        await self._broker.stop()
+        for subscribers in self._subscribers.values():
+            for queue in subscribers:
+                self._close(queue)
+        self._subscribers.clear()
+        self._last.clear()
+
+
+leaderboard_hub = LeaderboardHub(
+    leaderboard_index,
+    broker=(
+        PostgresBroker("leaderboard", interval=settings.leaderboard.push_interval)
+        if settings.leaderboard.push_broker == "postgres" else LocalBroker()
+    ),
+    interval=settings.leaderboard.push_interval,
+    top=settings.leaderboard.push_top,
+    queue_size=settings.leaderboard.push_queue_size,
+    ranks=rank_cache,
+    responses=leaderboard_responses,
+    aggregates=group_aggregates,
+)
+on_stat_committed(leaderboard_hub.on_committed)
@@ -0,0 +1,388 @@
+import random
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import primary_session
+from core.models.study import Knowledge, Question, UserQuestionSubmissionRecord
+
+DIFFICULTY_BUCKETS = 10  # 难度分桶数, 难度按 [0, 1] 均分
+
+# 分区键, 依次为知识点ID和难度分桶
+PartitionKey = tuple[int, int]
+
+
+def difficulty_bucket(difficulty: float) -> int:
+    """难度所在分桶"""
+    return min(max(int(float(difficulty) * DIFFICULTY_BUCKETS), 0), DIFFICULTY_BUCKETS - 1)
+
+
+def difficulty_weight(bucket: int, target: float) -> float:
+    """分桶相对目标难度的权重, 越接近目标难度权重越高"""
+    center = (bucket + 0.5) / DIFFICULTY_BUCKETS
+    return 1.0 / (1.0 + DIFFICULTY_BUCKETS * abs(center - target))
+
+
+class WeightTree:
+    """按权重抽样的树状数组(Fenwick 树)
+
+    n 个权重, 构建 O(n), 按权重抽样和修改单个权重都是 O(log n)
+    """
+    __slots__ = ("_weights", "_tree", "_alive")
+
+    def __init__(self, weights: list[float]):
+        self._weights = list(weights)
+        self._alive = sum(1 for weight in weights if weight > 0)
+        tree = [0.0, *self._weights]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __bool__(self) -> bool:
+        return self._alive > 0
+
+    @property
+    def total(self) -> float:
+        """权重之和"""
+        total = 0.0
+        i = len(self._weights)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def set(self, index: int, weight: float) -> None:
+        """修改第 index 个权重"""
+        old = self._weights[index]
+        if old > 0 >= weight:
+            self._alive -= 1
+        elif old <= 0 < weight:
+            self._alive += 1
+        self._weights[index] = weight
+        delta = weight - old
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def find(self, value: float) -> int:
+        """前缀和首次超过 value 的下标, value 取 [0, total) 时即按权重抽样"""
+        index = 0
+        step = 1 << len(self._weights).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= value:
+                index = nxt
+                value -= self._tree[nxt]
+            step >>= 1
+        # 浮点误差可能落到权重为0的位置, 改取最近的有效位置
+        if index >= len(self._weights) or self._weights[index] <= 0:
+            candidates = [i for i, weight in enumerate(self._weights) if weight > 0]
+            return min(candidates, key=lambda i: abs(i - index))
+        return index
+
+    def sample(self, rng: random.Random) -> int:
+        """按权重随机取一个下标, 所有权重为0时不可调用"""
+        return self.find(rng.random() * self.total)
+
+
+class QuestionCatalog:
+    """题库目录缓存
+
+    只保存 (知识点ID, 难度分桶) -> 题目ID列表, 所有用户共用一份, 过期或失效后按需重新加载
+    """
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+        self._partitions: dict[PartitionKey, list[int]] = {}
+        self._loaded_at: float | None = None
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """目录版本号, 每次重新加载后递增"""
+        return self._version
+
+    def is_fresh(self) -> bool:
+        """目录是否仍然有效"""
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl
+
+    def invalidate(self) -> None:
+        """使目录失效(题目导入/编辑后调用)"""
+        self._loaded_at = None
+
+    async def load(self, db: AsyncSession) -> dict[PartitionKey, list[int]]:
+        """获取题库目录, 必要时从主库加载"""
+        if self.is_fresh():
+            return self._partitions
+        async with primary_session(db) as session:
+            result = await session.execute(
+                select(Question.id, Question.knowledge_id, Question.difficulty).order_by(Question.id)
+            )
+            rows = result.all()
+        partitions: dict[PartitionKey, list[int]] = {}
+        for question_id, knowledge_id, difficulty in rows:
+            partitions.setdefault((knowledge_id, difficulty_bucket(difficulty)), []).append(question_id)
+        self._partitions = partitions
+        self._loaded_at = time.monotonic()
+        self._version += 1
+        return partitions
+
+
+class KnowledgeEntry(NamedTuple):
+    """知识点目录项"""
+    id: int
+    name: str
+    is_important: bool
+    total: int  # 题目总数
+
+
+class KnowledgeCatalog:
+    """知识点目录缓存
+
+    保存每个知识点的名称、是否重点以及题目总数, 题目总数直接由题库目录汇总, 不再每次对题目表做 GROUP BY;
+    过期、失效或题库目录重新加载后按需刷新
+    """
+    def __init__(self, questions: QuestionCatalog, ttl: float):
+        self.questions = questions
+        self._ttl = ttl
+        self._entries: list[KnowledgeEntry] = []
+        self._loaded_at: float | None = None
+        self._questions_version = 0
+
+    def is_fresh(self) -> bool:
+        """目录是否仍然有效"""
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < self._ttl
+            and self.questions.is_fresh()
+            and self._questions_version == self.questions.version
+        )
+
+    def invalidate(self) -> None:
+        """使目录失效(知识点新增/编辑后调用)"""
+        self._loaded_at = None
+
+    async def load(self, db: AsyncSession) -> list[KnowledgeEntry]:
+        """获取知识点目录, 必要时从主库加载"""
+        if self.is_fresh():
+            return self._entries
+        partitions = await self.questions.load(db)
+        totals: dict[int, int] = {}
+        for (knowledge_id, _), question_ids in partitions.items():
+            totals[knowledge_id] = totals.get(knowledge_id, 0) + len(question_ids)
+        async with primary_session(db) as session:
+            result = await session.execute(
+                select(Knowledge.id, Knowledge.name, Knowledge.meta).order_by(Knowledge.id)
+            )
+            rows = result.all()
+        self._entries = [
+            KnowledgeEntry(
+                id=knowledge_id,
+                name=name,
+                is_important=(meta or {}).get("is_important") is True,
+                total=totals.get(knowledge_id, 0),
+            )
+            for knowledge_id, name, meta in rows
+        ]
+        self._loaded_at = time.monotonic()
+        self._questions_version = self.questions.version
+        return self._entries
+
+
+class UserQuestionPool:
+    """单个用户的未做题池, 按 (知识点, 难度分桶) 分区
+
+    每个分区是一个紧凑的 int 数组, 构建时随机打乱(相当于预先计算好的随机键), 栈顶即下一道要出的题;
+    作答后的题目只记入 _answered, 在下次取题时从栈顶惰性弹出, 因此出池是均摊 O(1);
+    取 count 道题是 O(分区数 + count * log 分区数), 与用户已经做了多少题无关
+    """
+    __slots__ = ("_partitions", "_by_knowledge", "_answered", "_rng", "built_at", "catalog_version")
+
+    def __init__(
+        self,
+        partitions: dict[PartitionKey, "array[int]"],
+        catalog_version: int,
+        rng: random.Random | None = None
+    ):
+        self._partitions = partitions
+        self._by_knowledge: dict[int, list[PartitionKey]] = {}
+        for key in partitions:
+            self._by_knowledge.setdefault(key[0], []).append(key)
+        self._answered: set[int] = set()
+        self._rng = rng or random.Random()
+        self.built_at = time.monotonic()
+        self.catalog_version = catalog_version
+
+    @classmethod
+    def build(
+        cls,
+        catalog: dict[PartitionKey, list[int]],
+        answered: set[int],
+        catalog_version: int = 0,
+        rng: random.Random | None = None
+    ) -> "UserQuestionPool":
+        """根据题库目录和已做题目构建未做题池"""
+        rng = rng or random.Random()
+        partitions: dict[PartitionKey, array[int]] = {}
+        for key, question_ids in catalog.items():
+            remaining = [q for q in question_ids if q not in answered]
+            rng.shuffle(remaining)
+            partitions[key] = array("i", remaining)
+        return cls(partitions, catalog_version, rng)
+
+    def _top(self, key: PartitionKey) -> int | None:
+        """取分区栈顶, 顺便弹出已做过的题目"""
+        stack = self._partitions.get(key)
+        while stack:
+            question_id = stack[-1]
+            if question_id not in self._answered:
+                return question_id
+            stack.pop()
+            self._answered.discard(question_id)
+        return None
+
+    def _keys(self, knowledge_id: int | None) -> list[PartitionKey]:
+        if knowledge_id is None:
+            return list(self._partitions)
+        return self._by_knowledge.get(knowledge_id, [])
+
+    def peek(self, knowledge_id: int | None = None, difficulty: float | None = None) -> int | None:
+        """随机取一道未做的题目(不出池, 作答后才出池)
+
+        Args:
+            knowledge_id: 知识点ID, 为空时从任意知识点取题
+            difficulty: 目标难度(0~1), 为空时不按难度加权
+
+        Returns:
+            Optional[int]: 题目ID, 没有未做题目时返回None
+        """
+        picked = self.sample(1, knowledge_id, difficulty)
+        return picked[0] if picked else None
+
+    def sample(self, count: int, knowledge_id: int | None = None, difficulty: float | None = None) -> list[int]:
+        """随机取多道不重复的未做题目(不出池, 作答后才出池)
+
+        按分区剩余题数(指定目标难度时再乘以难度权重)加权选出分区, 再沿该分区的栈往下取;
+        分区权重保存在树状数组中, 每取一道题只需 O(log 分区数) 更新所选分区的权重.
+        未指定难度时等价于在所有未做题目中均匀随机抽样
+
+        Args:
+            count: 题目数量
+            knowledge_id: 知识点ID, 为空时从任意知识点取题
+            difficulty: 目标难度(0~1), 为空时不按难度加权
+
+        Returns:
+            List[int]: 题目ID列表, 未做题目不足时少于count道
+        """
+        keys = [key for key in self._keys(knowledge_id) if self._top(key) is not None]
+        factors = [difficulty_weight(key[1], difficulty) if difficulty is not None else 1.0 for key in keys]
+        tree = WeightTree([len(self._partitions[key]) * factor for key, factor in zip(keys, factors, strict=True)])
+        depth = [0] * len(keys)
+        picked: list[int] = []
+        while tree and len(picked) < count:
+            index = tree.sample(self._rng)
+            stack = self._partitions[keys[index]]
+            d = depth[index]
+            while d < len(stack) and stack[-1 - d] in self._answered:
+                d += 1
+            if d < len(stack):
+                picked.append(stack[-1 - d])
+                d += 1
+            depth[index] = d
+            tree.set(index, (len(stack) - d) * factors[index])
+        return picked
+
+    def discard(self, question_id: int) -> None:
+        """标记题目已做"""
+        self._answered.add(question_id)
+
+    def remaining(self, knowledge_id: int | None = None) -> int:
+        """剩余未做题数(近似值, 包含尚未惰性弹出的已做题目)"""
+        return sum(len(self._partitions[key]) for key in self._keys(knowledge_id))
+
+
+class UnansweredQuestionPool:
+    """用户未做题池缓存
+
+    首次选题时懒加载, 答题后原地更新; 按 LRU 淘汰, 超过 ttl 或题库目录变化后重建,
+    以兼顾多 worker 部署时其他进程写入的答题记录
+    """
+    def __init__(self, catalog: QuestionCatalog, ttl: float, max_users: int):
+        self.catalog = catalog
+        self._ttl = ttl
+        self._max_users = max_users
+        self._pools: OrderedDict[int, UserQuestionPool] = OrderedDict()
+
+    def _is_fresh(self, pool: UserQuestionPool) -> bool:
+        return (
+            self.catalog.is_fresh()
+            and pool.catalog_version == self.catalog.version
+            and time.monotonic() - pool.built_at < self._ttl
+        )
+
+    async def get(self, db: AsyncSession, user_id: int) -> UserQuestionPool:
+        """获取用户未做题池, 不存在或已过期时重建"""
+        pool = self._pools.get(user_id)
+        if pool is not None and self._is_fresh(pool):
+            self._pools.move_to_end(user_id)
+            return pool
+
+        catalog = await self.catalog.load(db)
+        result = await db.execute(
+            select(UserQuestionSubmissionRecord.question_id)
+            .where(UserQuestionSubmissionRecord.user_id == user_id)
+            .distinct()
+        )
+        answered = set(result.scalars().all())
+        pool = UserQuestionPool.build(catalog, answered, self.catalog.version)
+
+        self._pools[user_id] = pool
+        self._pools.move_to_end(user_id)
+        while len(self._pools) > self._max_users:
+            self._pools.popitem(last=False)
+        return pool
+
+    def mark_answered(self, user_id: int, question_id: int) -> None:
+        """答题后从用户的未做题池中移除该题"""
+        pool = self._pools.get(user_id)
+        if pool is not None:
+            pool.discard(question_id)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """使指定用户(为空时为所有用户)的未做题池失效"""
+        if user_id is None:
+            self._pools.clear()
+        else:
+            self._pools.pop(user_id, None)
+
+
+question_catalog = QuestionCatalog(ttl=settings.cache.question_catalog_ttl)
+knowledge_catalog = KnowledgeCatalog(question_catalog, ttl=settings.cache.question_catalog_ttl)
+question_pool = UnansweredQuestionPool(
+    question_catalog,
+    ttl=settings.cache.question_pool_ttl,
+    max_users=settings.cache.question_pool_max_users,
+)
+
+
+@event.listens_for(Question, "after_insert")
+@event.listens_for(Question, "after_update")
+@event.listens_for(Question, "after_delete")
+def _invalidate_question_catalog(_mapper: Any, _connection: Any, _target: Question) -> None:
+    """题目导入、编辑或删除后使题库目录失效(知识点目录随之刷新)"""
+    question_catalog.invalidate()
+
+
+@event.listens_for(Knowledge, "after_insert")
+@event.listens_for(Knowledge, "after_update")
+@event.listens_for(Knowledge, "after_delete")
+def _invalidate_knowledge_catalog(_mapper: Any, _connection: Any, _target: Knowledge) -> None:
+    """知识点新增、编辑或删除后使知识点目录失效"""
+    knowledge_catalog.invalidate()
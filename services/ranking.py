@@ -0,0 +1,784 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Iterator, Mapping
+from datetime import UTC, date, datetime, timedelta
+from typing import Any, NamedTuple
+
+from pydantic import TypeAdapter
+from sortedcontainers import SortedList
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import engine, primary_session
+from core.models.organization import Class, Company, Department
+from core.models.stats import StatInfo, StatType
+from core.models.user import User
+from schemas.v1.leaderboard import (
+    AggregateMetric,
+    BoardType,
+    GroupType,
+    LeaderboardEntry,
+    LeaderboardResponse,
+    TimeWindow,
+)
+
+from .stats import StatKey, on_stat_committed, stat_buffer
+
+logger = logging.getLogger(__name__)
+
+# 榜单类型 -> 统计类型
+BOARD_STAT_TYPES: dict[BoardType, StatType] = {
+    BoardType.DURATION: StatType.DURATION,
+    BoardType.PRACTICE: StatType.PRACTICE,
+    BoardType.CORRECT: StatType.CORRECT,
+}
+STAT_BOARD_TYPES: dict[str, BoardType] = {stat_type: board for board, stat_type in BOARD_STAT_TYPES.items()}
+
+# 加载榜单成员信息的列, 需要关联 Company 取得集团ID
+MEMBER_COLUMNS = (User.name, User.meta, User.class_id, User.department_id, User.company_id, Company.corp_id)
+
+# 榜单键, 依次为分组类型、分组ID和榜单类型
+BoardKey = tuple[GroupType, int, BoardType]
+
+
+def group_column(group: GroupType, user: Any = User) -> Any:
+    """用户所属分组ID的列表达式, 集团通过所在公司关联
+
+    Args:
+        group: 分组类型
+        user: User 或其别名
+    """
+    if group == GroupType.CORPORATION:
+        return select(Company.corp_id).where(Company.id == user.company_id).correlate(user).scalar_subquery()
+    return getattr(user, f"{group.value}_id")
+
+
+def window_start(window: TimeWindow, today: date) -> date | None:
+    """统计时间窗口的起始日期(含), 全部时间返回None"""
+    if window == TimeWindow.DAY:
+        return today
+    if window == TimeWindow.WEEK:
+        return today - timedelta(days=today.weekday())
+    if window == TimeWindow.MONTH:
+        return today.replace(day=1)
+    return None
+
+
+class LeaderboardMember(NamedTuple):
+    """榜单成员信息"""
+    name: str
+    avatar: str
+    class_id: int
+    department_id: int
+    company_id: int
+    corporation_id: int
+
+    @classmethod
+    def from_row(cls, name: str, meta: dict[str, Any] | None, *group_ids: int) -> "LeaderboardMember":
+        """由 MEMBER_COLUMNS 查询结果构造"""
+        return cls(name, (meta or {}).get("avatar", ""), *group_ids)
+
+    def group_id(self, group: GroupType) -> int:
+        """成员在指定分组类型下的分组ID"""
+        return getattr(self, f"{group.value}_id")
+
+
+class RankedList:
+    """单个榜单的有序索引
+
+    按 (-分数, 用户ID) 升序保存在 SortedList 中, 查找排名、更新分数都是 O(log n),
+    取前 N 名只需切片, 不随分组人数增长
+    """
+    __slots__ = ("_keys", "_scores", "built_at", "loaded_at")
+
+    def __init__(self, scores: dict[int, int], loaded_at: float | None = None):
+        self._scores = dict(scores)
+        self._keys: SortedList = SortedList((-score, user_id) for user_id, score in scores.items())
+        self.built_at = time.monotonic()
+        # 读取分数时的 time.time(), 早于该时间提交的统计已包含在分数中
+        self.loaded_at = time.time() if loaded_at is None else loaded_at
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._scores
+
+    def __iter__(self) -> Iterator[int]:
+        """榜单中的用户ID(无序)"""
+        return iter(self._scores)
+
+    def score(self, user_id: int) -> int | None:
+        """用户分数, 不在榜单中时返回None"""
+        return self._scores.get(user_id)
+
+    def set(self, user_id: int, score: int) -> None:
+        """设置用户分数"""
+        self.remove(user_id)
+        self._scores[user_id] = score
+        self._keys.add((-score, user_id))
+
+    def add(self, user_id: int, delta: int) -> None:
+        """累加用户分数"""
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def remove(self, user_id: int) -> None:
+        """从榜单中移除用户"""
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            self._keys.remove((-score, user_id))
+
+    def top(self, count: int) -> list[tuple[int, int]]:
+        """前 count 名的 (用户ID, 分数), 同分按用户ID排序"""
+        return [(user_id, -score) for score, user_id in self._keys.islice(0, count)]
+
+    def position(self, user_id: int) -> int:
+        """用户在 top() 顺序中的位置(从1开始), 不在榜单中时返回0"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return 0
+        return self._keys.bisect_left((-score, user_id)) + 1
+
+    def rank(self, user_id: int) -> int:
+        """用户排名(分数比其高的人数 + 1, 同分同名次), 不在榜单中时返回0"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return 0
+        return self._keys.bisect_left((-score,)) + 1
+
+
+class LeaderboardIndex:
+    """排行榜内存索引
+
+    每个 (分组类型, 分组ID, 榜单类型) 一个 RankedList, 首次访问时用一条查询加载该分组所有成员的分数;
+    答题提交后通过统计回调原地更新, 按 LRU 淘汰, 超过 ttl 后重建,
+    以兼顾多 worker 部署时其他进程写入的统计. 成员信息按所在的已加载榜单计数, 不在任何榜单中后一并释放;
+    单独查询过、但不在已加载榜单中的成员另按 LRU 缓存至多 max_members 个
+    """
+    def __init__(self, ttl: float, max_boards: int, max_members: int = 10000):
+        self._ttl = ttl
+        self._max_boards = max_boards
+        self._max_members = max_members
+        self._boards: OrderedDict[BoardKey, RankedList] = OrderedDict()
+        self._members: dict[int, LeaderboardMember] = {}
+        self._refs: dict[int, int] = {}  # 用户ID -> 所在的已加载榜单数
+        self._loose: OrderedDict[int, LeaderboardMember] = OrderedDict()
+
+    @property
+    def members(self) -> Mapping[int, LeaderboardMember]:
+        """已加载的榜单成员信息, 已加载榜单的所有成员都在其中"""
+        return self._members
+
+    def _is_fresh(self, board: RankedList) -> bool:
+        return time.monotonic() - board.built_at < self._ttl
+
+    def _retain(self, user_id: int) -> None:
+        self._refs[user_id] = self._refs.get(user_id, 0) + 1
+
+    def _release(self, board: RankedList) -> None:
+        for user_id in board:
+            refs = self._refs.get(user_id, 0) - 1
+            if refs > 0:
+                self._refs[user_id] = refs
+            else:
+                self._refs.pop(user_id, None)
+                self._members.pop(user_id, None)
+
+    def cached_member(self, user_id: int) -> LeaderboardMember | None:
+        """已缓存的榜单成员信息, 不访问数据库"""
+        member = self._members.get(user_id)
+        if member is not None:
+            return member
+        member = self._loose.get(user_id)
+        if member is not None:
+            self._loose.move_to_end(user_id)
+        return member
+
+    async def member(self, db: AsyncSession, user_id: int) -> LeaderboardMember | None:
+        """获取榜单成员信息, 未缓存时从主库加载"""
+        member = self.cached_member(user_id)
+        if member is not None:
+            return member
+        async with primary_session(db) as session:
+            result = await session.execute(
+                select(*MEMBER_COLUMNS)
+                .join(Company, Company.id == User.company_id)
+                .where(User.id == user_id)
+            )
+            row = result.first()
+        if not row:
+            return None
+        member = self._loose[user_id] = LeaderboardMember.from_row(*row)
+        while len(self._loose) > self._max_members:
+            self._loose.popitem(last=False)
+        return member
+
+    async def board(self, db: AsyncSession, group: GroupType, group_id: int, board_type: BoardType) -> RankedList:
+        """获取榜单索引, 不存在或已过期时从主库重建"""
+        key = (group, group_id, board_type)
+        board = self._boards.get(key)
+        if board is not None and self._is_fresh(board):
+            self._boards.move_to_end(key)
+            return board
+
+        stat_type = BOARD_STAT_TYPES[board_type]
+        loaded_at = time.time()
+        async with primary_session(db) as session:
+            result = await session.execute(
+                select(User.id, func.coalesce(StatInfo.total, 0), *MEMBER_COLUMNS)
+                .join(Company, Company.id == User.company_id)
+                .outerjoin(StatInfo, (StatInfo.source_id == User.id) & (StatInfo.type == stat_type))
+                .where(group_column(group) == group_id)
+            )
+            rows = result.all()
+        scores: dict[int, int] = {}
+        members: dict[int, LeaderboardMember] = {}
+        for user_id, total, *member in rows:
+            members[user_id] = LeaderboardMember.from_row(*member)
+            # 叠加写后缓冲中尚未刷写的增量
+            scores[user_id] = total + stat_buffer.pending(user_id).get((stat_type, user_id, None), 0)
+        return self.install(key, scores, members, loaded_at)
+
+    def install(
+        self,
+        key: BoardKey,
+        scores: dict[int, int],
+        members: dict[int, LeaderboardMember],
+        loaded_at: float | None = None
+    ) -> RankedList:
+        """用已加载的分数和成员信息替换榜单, 超出数量上限时淘汰最久未使用的榜单"""
+        board = RankedList(scores, loaded_at)
+        self._members.update(members)
+        for user_id in board:
+            self._retain(user_id)
+        old = self._boards.pop(key, None)
+        if old is not None:
+            self._release(old)
+        self._boards[key] = board
+        while len(self._boards) > self._max_boards:
+            _, evicted = self._boards.popitem(last=False)
+            self._release(evicted)
+        return board
+
+    def apply(self, deltas: dict[StatKey, int], committed_at: float | None = None) -> None:
+        """把已提交的统计增量应用到已加载的榜单
+
+        Args:
+            deltas: 统计增量
+            committed_at: 其他 worker 提交的时间(time.time()), 在此之后才读取分数的榜单已包含该增量, 跳过以免重复计入
+        """
+        for (type_, user_id, target_id), value in deltas.items():
+            board_type = STAT_BOARD_TYPES.get(type_)
+            if board_type is None or target_id is not None or user_id is None:
+                continue
+            member = self._members.get(user_id)
+            if member is None:
+                continue
+            for group in GroupType:
+                board = self._boards.get((group, member.group_id(group), board_type))
+                if board is not None and (committed_at is None or committed_at > board.loaded_at):
+                    if user_id not in board:
+                        self._retain(user_id)
+                    board.add(user_id, value)
+
+    def invalidate(self) -> None:
+        """使所有榜单和成员信息失效(组织架构或用户信息变化后调用)"""
+        self._boards.clear()
+        self._members.clear()
+        self._refs.clear()
+        self._loose.clear()
+
+
+class RankCache:
+    """用户排名短期缓存
+
+    以 (用户ID, 分组类型, 榜单类型) 为键缓存排名 ttl 秒, 首页反复加载时不再重复计算;
+    用户自己的统计变化后立即失效, 他人分数变化带来的名次变化最多延迟 ttl 秒;
+    按用户ID索引缓存键, 失效时只处理提交者自己的条目
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, GroupType, BoardType], tuple[int, float]] = OrderedDict()
+        self._user_keys: dict[int, set[tuple[int, GroupType, BoardType]]] = {}
+
+    def _discard(self, key: tuple[int, GroupType, BoardType]) -> None:
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def get(self, user_id: int, group: GroupType, board_type: BoardType) -> int | None:
+        """获取缓存的排名, 未缓存或已过期时返回None"""
+        key = (user_id, group, board_type)
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        rank, expires_at = item
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self._discard(key)
+            return None
+        return rank
+
+    def put(self, user_id: int, group: GroupType, board_type: BoardType, rank: int) -> None:
+        """缓存排名"""
+        key = (user_id, group, board_type)
+        self._entries[key] = (rank, time.monotonic() + self._ttl)
+        self._entries.move_to_end(key)
+        self._user_keys.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._discard(evicted)
+
+    def apply(self, deltas: dict[StatKey, int]) -> None:
+        """统计变化后使对应用户的排名失效"""
+        for user_id in {user_id for _, user_id, _ in deltas}:
+            for key in self._user_keys.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def invalidate(self) -> None:
+        """使所有排名失效"""
+        self._entries.clear()
+        self._user_keys.clear()
+
+
+class LeaderboardSnapshot:
+    """排行榜快照
+
+    某一时刻所有 (分组类型, 分组ID, 榜单类型) 的完整排名, 生成后不再修改;
+    读取方持有同一个快照对象, 同一响应中的数据始终来自同一版本
+    """
+    __slots__ = ("boards", "members", "taken_at", "version")
+
+    def __init__(
+        self,
+        boards: dict[BoardKey, RankedList],
+        members: dict[int, LeaderboardMember],
+        taken_at: datetime,
+        version: int
+    ):
+        self.boards = boards
+        self.members = members
+        self.taken_at = taken_at
+        self.version = version
+
+    @classmethod
+    def build(
+        cls,
+        members: dict[int, LeaderboardMember],
+        scores: dict[tuple[int, BoardType], int],
+        taken_at: datetime,
+        version: int
+    ) -> "LeaderboardSnapshot":
+        """由成员信息和 (用户ID, 榜单类型) -> 分数 构建快照, 没有统计的成员按0分计入"""
+        grouped: dict[BoardKey, dict[int, int]] = {}
+        for user_id, member in members.items():
+            for group in GroupType:
+                group_id = member.group_id(group)
+                for board_type in BOARD_STAT_TYPES:
+                    score = scores.get((user_id, board_type), 0)
+                    grouped.setdefault((group, group_id, board_type), {})[user_id] = score
+        boards = {key: RankedList(board_scores) for key, board_scores in grouped.items()}
+        return cls(boards, members, taken_at, version)
+
+    def board(self, group: GroupType, group_id: int, board_type: BoardType) -> RankedList:
+        """获取榜单, 分组在快照中不存在时返回空榜单"""
+        return self.boards.get((group, group_id, board_type)) or RankedList({})
+
+
+class LeaderboardSnapshotter:
+    """排行榜快照定时任务
+
+    每隔 interval 秒用两条查询读出所有用户和用户级统计, 在线程中构建新的快照后整体替换,
+    读请求只读取最新快照, 不再访问数据库
+    """
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._current: LeaderboardSnapshot | None = None
+        self._version = 0
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def current(self) -> LeaderboardSnapshot | None:
+        """最新快照, 尚未生成时返回None"""
+        return self._current
+
+    async def refresh(self) -> LeaderboardSnapshot:
+        """重新生成快照"""
+        taken_at = datetime.now(UTC)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            users = await db.execute(select(User.id, *MEMBER_COLUMNS).join(Company, Company.id == User.company_id))
+            members = {user_id: LeaderboardMember.from_row(*member) for user_id, *member in users.all()}
+            stats = await db.execute(
+                select(StatInfo.source_id, StatInfo.type, StatInfo.total).where(
+                    StatInfo.type.in_(list(BOARD_STAT_TYPES.values())),
+                    StatInfo.target_id.is_(None)
+                )
+            )
+            scores: dict[tuple[int, BoardType], int] = {
+                (source_id, STAT_BOARD_TYPES[type_]): total for source_id, type_, total in stats.all()
+            }
+        # 叠加写后缓冲中尚未刷写的增量
+        for user_id in members:
+            for (type_, _, target_id), value in stat_buffer.pending(user_id).items():
+                board_type = STAT_BOARD_TYPES.get(type_)
+                if board_type is not None and target_id is None:
+                    scores[(user_id, board_type)] = scores.get((user_id, board_type), 0) + value
+
+        self._version += 1
+        snapshot = await asyncio.to_thread(LeaderboardSnapshot.build, members, scores, taken_at, self._version)
+        self._current = snapshot
+        return snapshot
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.refresh()
+            except Exception:
+                # 生成失败时继续提供上一个快照, 下次重试
+                logger.exception("Failed to refresh leaderboard snapshot")
+
+    async def start(self) -> None:
+        """生成首个快照并启动定时任务"""
+        if self._task is not None:
+            return
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止定时任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+
+# 参与分组聚合榜的分组类型, 在所属集团内互相排名
+AGGREGATE_GROUPS = (GroupType.CLASS, GroupType.DEPARTMENT, GroupType.COMPANY)
+# 分组键, 依次为分组类型和分组ID
+GroupKey = tuple[GroupType, int]
+
+
+class GroupAggregate:
+    """单个分组的聚合统计"""
+    __slots__ = ("name", "corporation_id", "members", "totals")
+
+    def __init__(self, name: str, corporation_id: int):
+        self.name = name
+        self.corporation_id = corporation_id
+        self.members = 0
+        self.totals: dict[BoardType, int] = dict.fromkeys(BOARD_STAT_TYPES, 0)
+
+    def score(self, board_type: BoardType, metric: AggregateMetric) -> float:
+        """分组得分: 成员总分或人均分"""
+        total = self.totals[board_type]
+        if metric == AggregateMetric.AVERAGE:
+            return total / self.members if self.members else 0.0
+        return float(total)
+
+
+class GroupAggregates:
+    """班级/部门/公司聚合榜
+
+    加载时用几条查询汇总每个分组的成员数和各项总分, 之后通过统计回调把成员的增量累加到所在分组,
+    读取时只需对集团内的分组排序, 不再逐个汇总成员; 超过 ttl 后重新加载以同步人员变动和其他 worker 的写入
+    """
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+        self._groups: dict[GroupKey, GroupAggregate] = {}
+        self._user_groups: dict[int, tuple[GroupKey, ...]] = {}
+        self._loaded_at: float | None = None
+        # 读取分数时的 time.time(), 早于该时间提交的统计已包含在聚合中
+        self._read_at = 0.0
+
+    def is_fresh(self) -> bool:
+        """聚合是否仍然有效"""
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl
+
+    def invalidate(self) -> None:
+        """使聚合失效(组织架构或人员变动后调用)"""
+        self._loaded_at = None
+
+    def build(
+        self,
+        users: dict[int, tuple[int, int, int, int]],
+        scores: dict[tuple[int, BoardType], int],
+        names: dict[GroupKey, str],
+        read_at: float | None = None
+    ) -> None:
+        """由用户所属分组、用户分数和分组名称重建聚合
+
+        Args:
+            users: 用户ID -> (班级ID, 部门ID, 公司ID, 集团ID)
+            scores: (用户ID, 榜单类型) -> 分数
+            names: 分组键 -> 分组名称
+            read_at: 读取分数的时间(time.time()), 为空时取当前时间
+        """
+        groups: dict[GroupKey, GroupAggregate] = {}
+        user_groups: dict[int, tuple[GroupKey, ...]] = {}
+        for user_id, (class_id, department_id, company_id, corporation_id) in users.items():
+            keys = tuple(zip(AGGREGATE_GROUPS, (class_id, department_id, company_id), strict=True))
+            user_groups[user_id] = keys
+            for key in keys:
+                aggregate = groups.get(key)
+                if aggregate is None:
+                    aggregate = groups[key] = GroupAggregate(names.get(key, ""), corporation_id)
+                aggregate.members += 1
+                for board_type in BOARD_STAT_TYPES:
+                    aggregate.totals[board_type] += scores.get((user_id, board_type), 0)
+        self._groups = groups
+        self._user_groups = user_groups
+        self._loaded_at = time.monotonic()
+        self._read_at = time.time() if read_at is None else read_at
+
+    async def load(self, db: AsyncSession) -> None:
+        """必要时从主库重新加载聚合"""
+        if self.is_fresh():
+            return
+        read_at = time.time()
+        async with primary_session(db) as session:
+            result = await session.execute(
+                select(User.id, User.class_id, User.department_id, User.company_id, Company.corp_id)
+                .join(Company, Company.id == User.company_id)
+            )
+            users: dict[int, tuple[int, int, int, int]] = {
+                user_id: (class_id, department_id, company_id, corporation_id)
+                for user_id, class_id, department_id, company_id, corporation_id in result.tuples().all()
+            }
+            result = await session.execute(
+                select(StatInfo.source_id, StatInfo.type, StatInfo.total).where(
+                    StatInfo.type.in_(list(BOARD_STAT_TYPES.values())),
+                    StatInfo.target_id.is_(None)
+                )
+            )
+            scores: dict[tuple[int, BoardType], int] = {
+                (source_id, STAT_BOARD_TYPES[type_]): total for source_id, type_, total in result.all()
+            }
+            # 叠加写后缓冲中尚未刷写的增量
+            for user_id in users:
+                for (type_, _, target_id), value in stat_buffer.pending(user_id).items():
+                    board_type = STAT_BOARD_TYPES.get(type_)
+                    if board_type is not None and target_id is None:
+                        scores[(user_id, board_type)] = scores.get((user_id, board_type), 0) + value
+            names: dict[GroupKey, str] = {}
+            group_models = ((GroupType.CLASS, Class), (GroupType.DEPARTMENT, Department), (GroupType.COMPANY, Company))
+            for group, model in group_models:
+                result = await session.execute(select(model.id, model.name))
+                names.update(((group, group_id), name) for group_id, name in result.all())
+        self.build(users, scores, names, read_at)
+
+    def ranking(
+        self,
+        group: GroupType,
+        corporation_id: int,
+        board_type: BoardType,
+        metric: AggregateMetric
+    ) -> list[tuple[int, GroupAggregate, float]]:
+        """集团内某类分组的排名, 按得分降序、分组ID升序排列
+
+        Returns:
+            List[Tuple[int, GroupAggregate, float]]: (分组ID, 分组聚合, 得分) 列表
+        """
+        ranked = [
+            (group_id, aggregate, aggregate.score(board_type, metric))
+            for (group_type, group_id), aggregate in self._groups.items()
+            if group_type == group and aggregate.corporation_id == corporation_id
+        ]
+        ranked.sort(key=lambda item: (-item[2], item[0]))
+        return ranked
+
+    def apply(self, deltas: dict[StatKey, int], committed_at: float | None = None) -> None:
+        """把已提交的统计增量累加到成员所在的分组
+
+        Args:
+            deltas: 统计增量
+            committed_at: 其他 worker 提交的时间(time.time()), 在此之后才读取分数的聚合已包含该增量, 跳过以免重复计入
+        """
+        if committed_at is not None and committed_at <= self._read_at:
+            return
+        for (type_, user_id, target_id), value in deltas.items():
+            board_type = STAT_BOARD_TYPES.get(type_)
+            if board_type is None or target_id is not None or user_id is None:
+                continue
+            for key in self._user_groups.get(user_id, ()):
+                aggregate = self._groups.get(key)
+                if aggregate is not None:
+                    aggregate.totals[board_type] += value
+
+
+# 排行榜响应缓存键, 依次为分组类型、分组ID、榜单类型、时间窗口、窗口起始日期和数量
+ResponseKey = tuple[GroupType, int, BoardType, TimeWindow, date | None, int]
+
+
+def make_etag(body: bytes) -> str:
+    """由响应内容生成 ETag, 内容相同的响应在各个 worker 上得到相同的 ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 请求头是否与 ETag 匹配(弱比较)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+_ENTRIES_ADAPTER = TypeAdapter(list[LeaderboardEntry])
+_SNAPSHOT_AT_ADAPTER = TypeAdapter(datetime | None)
+
+
+class CachedLeaderboard:
+    """某个版本的排行榜响应
+
+    前 N 名所有人共用, 每个版本只序列化一次; me 因人而异, 按用户只保存序列化后的 me 和 ETag,
+    响应体由两部分拼接而成, 与 LeaderboardResponse.model_dump_json() 的结果一致
+    """
+    __slots__ = ("version", "expires_at", "_head", "_tail", "_digest", "_mes")
+
+    def __init__(
+        self,
+        version: tuple[int, ...],
+        expires_at: float,
+        leaderboard: list[LeaderboardEntry],
+        snapshot_at: datetime | None
+    ):
+        self.version = version
+        self.expires_at = expires_at
+        self._head = b'{"leaderboard":' + _ENTRIES_ADAPTER.dump_json(leaderboard) + b',"me":'
+        self._tail = b',"snapshot_at":' + _SNAPSHOT_AT_ADAPTER.dump_json(snapshot_at) + b"}"
+        # 共用部分的摘要, 与 me 的摘要组成 ETag, 内容相同的响应在各个 worker 上得到相同的 ETag
+        self._digest = hashlib.blake2b(self._head + self._tail, digest_size=8).hexdigest()
+        self._mes: dict[int, tuple[str, bytes]] = {}
+
+    def _body(self, me: bytes) -> bytes:
+        return self._head + me + self._tail
+
+    def get(self, user_id: int) -> tuple[str, bytes] | None:
+        """用户已渲染过的 (ETag, 响应体), 未渲染时返回None"""
+        item = self._mes.get(user_id)
+        if item is None:
+            return None
+        return item[0], self._body(item[1])
+
+    def render(self, user_id: int, me: LeaderboardEntry) -> tuple[str, bytes]:
+        """用共用的前 N 名和用户自己的 me 生成 (ETag, 响应体)"""
+        me_json = me.model_dump_json().encode()
+        etag = f'"{self._digest}-{hashlib.blake2b(me_json, digest_size=6).hexdigest()}"'
+        self._mes[user_id] = (etag, me_json)
+        return etag, self._body(me_json)
+
+
+class LeaderboardResponseCache:
+    """排行榜响应缓存
+
+    以 (分组, 榜单, 数量) 为键缓存前 N 名和各个用户的 me, 并记录生成时的版本号;
+    分组成员的统计提交后对应榜单的版本号递增, 缓存随之失效. 成员所属分组未知时递增该榜单类型的全局版本.
+    其他 worker 写入的统计经推送中心转发后同样递增版本号; 未启用转发时缓存最多保留 ttl 秒
+    """
+    def __init__(self, index: LeaderboardIndex, ttl: float, max_entries: int):
+        self._index = index
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._versions: dict[BoardKey, int] = {}
+        self._epochs: dict[BoardType, int] = {}
+        self._entries: OrderedDict[ResponseKey, CachedLeaderboard] = OrderedDict()
+
+    def version(self, group: GroupType, group_id: int, board_type: BoardType) -> tuple[int, int]:
+        """榜单当前的版本号"""
+        return self._epochs.get(board_type, 0), self._versions.get((group, group_id, board_type), 0)
+
+    def get(self, key: ResponseKey, version: tuple[int, ...]) -> CachedLeaderboard | None:
+        """获取缓存的榜单响应, 未缓存、已过期或版本变化时返回None"""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version or time.monotonic() >= entry.expires_at:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        key: ResponseKey,
+        version: tuple[int, ...],
+        user_id: int,
+        response: LeaderboardResponse
+    ) -> tuple[str, bytes]:
+        """缓存响应的前 N 名(同一版本已缓存时沿用)并渲染用户的 me, 返回 (ETag, 响应体)"""
+        entry = self.get(key, version)
+        if entry is None:
+            expires_at = time.monotonic() + self._ttl
+            entry = CachedLeaderboard(version, expires_at, response.leaderboard, response.snapshot_at)
+            self._entries[key] = entry
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry.render(user_id, response.me)
+
+    def invalidate(self) -> None:
+        """使所有缓存的响应失效"""
+        self._entries.clear()
+
+    def apply(self, deltas: dict[StatKey, int]) -> None:
+        """统计提交后递增成员所在榜单的版本号"""
+        for type_, user_id, target_id in deltas:
+            board_type = STAT_BOARD_TYPES.get(type_)
+            if board_type is None or target_id is not None or user_id is None:
+                continue
+            member = self._index.cached_member(user_id)
+            if member is None:
+                self._epochs[board_type] = self._epochs.get(board_type, 0) + 1
+                continue
+            for group in GroupType:
+                key = (group, member.group_id(group), board_type)
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+
+leaderboard_index = LeaderboardIndex(
+    ttl=settings.leaderboard.index_ttl,
+    max_boards=settings.leaderboard.index_max_boards,
+    max_members=settings.leaderboard.index_max_members,
+)
+on_stat_committed(leaderboard_index.apply)
+leaderboard_snapshots = LeaderboardSnapshotter(interval=settings.leaderboard.snapshot_interval)
+rank_cache = RankCache(
+    ttl=settings.leaderboard.rank_cache_ttl,
+    max_entries=settings.leaderboard.rank_cache_max_entries,
+)
+on_stat_committed(rank_cache.apply)
+group_aggregates = GroupAggregates(ttl=settings.leaderboard.index_ttl)
+on_stat_committed(group_aggregates.apply)
+leaderboard_responses = LeaderboardResponseCache(
+    leaderboard_index,
+    ttl=settings.leaderboard.response_cache_ttl,
+    max_entries=settings.leaderboard.response_cache_max_entries,
+)
+on_stat_committed(leaderboard_responses.apply)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+@event.listens_for(Class, "after_insert")
+@event.listens_for(Class, "after_update")
+@event.listens_for(Class, "after_delete")
+@event.listens_for(Department, "after_insert")
+@event.listens_for(Department, "after_update")
+@event.listens_for(Department, "after_delete")
+@event.listens_for(Company, "after_insert")
+@event.listens_for(Company, "after_update")
+@event.listens_for(Company, "after_delete")
+def _invalidate_groups(_mapper: Any, _connection: Any, _target: Any) -> None:
+    """用户或组织架构新增、编辑或删除后使榜单索引和分组聚合失效"""
+    leaderboard_index.invalidate()
+    group_aggregates.invalidate()
@@ -1,10 +1,109 @@
-from typing import Optional, Sequence, Any
+import asyncio
+import contextlib
+import logging
+from datetime import date, datetime, timedelta, UTC
+from functools import cache
+from typing import Any
+from collections.abc import Callable, Iterable, Sequence
+from zoneinfo import ZoneInfo
+from sqlalchemy import delete, event, func, literal_column, update
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.orm import Session
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from core.models.stats import StatInfo, StatInfoRecord
+from core.config import settings
+from core.database import engine
+from core.models.stats import StatInfo, StatInfoDaily, StatInfoRecord, StatType
 from .base import BaseService
 
+logger = logging.getLogger(__name__)
+
+_STAT_TIMEZONE = ZoneInfo(settings.stats.timezone)
+
+# 统计键, 依次为类型、源ID和目标ID
+StatKey = tuple[str, int | None, int | None]
+# 待刷写的统计记录, 依次为记录ID、统计键和增量
+PendingRecord = tuple[int, StatKey, int]
+
+# 按天汇总的统计键, 依次为类型、用户ID和日期
+DailyKey = tuple[str, int, date]
+# 统计增量提交后的回调
+StatListener = Callable[[dict[StatKey, int]], None]
+
+# 会话中已写入、等待事务提交后交给写后缓冲的统计记录
+_SESSION_PENDING_KEY = "pending_stat_records"
+# 会话中已写入、等待事务提交后通知回调的统计增量
+_SESSION_DELTAS_KEY = "pending_stat_deltas"
+
+_stat_listeners: list[StatListener] = []
+
+
+def stat_day(moment: datetime | None = None) -> date:
+    """统计所在的自然日(按 stats.timezone), 不带时区的时间按服务器本地时间处理"""
+    return (moment or datetime.now(UTC)).astimezone(_STAT_TIMEZONE).date()
+
+
+def daily_deltas(deltas: dict[StatKey, int], day: date) -> dict[DailyKey, int]:
+    """从统计增量中取出需要按天汇总的用户级统计"""
+    user_stats = StatType.user_stats()
+    return {
+        (type_, source_id, day): value
+        for (type_, source_id, target_id), value in deltas.items()
+        if type_ in user_stats and source_id is not None and target_id is None
+    }
+
+
+@cache
+def increment_stmt() -> Insert:
+    """累加 stat_info 的 upsert 语句, 只构造一次, 按行传参批量执行(executemany), SQL 不随行数变化"""
+    stmt = insert(StatInfo)
+    return stmt.on_conflict_do_update(
+        index_elements=[StatInfo.type, StatInfo.source_id, func.coalesce(StatInfo.target_id, literal_column("0"))],
+        set_={
+            "total": StatInfo.total + stmt.excluded.total,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+@cache
+def increment_daily_stmt() -> Insert:
+    """累加 stat_info_daily 的 upsert 语句, 只构造一次, 按行传参批量执行"""
+    stmt = insert(StatInfoDaily)
+    return stmt.on_conflict_do_update(
+        index_elements=[StatInfoDaily.type, StatInfoDaily.source_id, StatInfoDaily.day],
+        set_={
+            "total": StatInfoDaily.total + stmt.excluded.total,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+@cache
+def record_stmt() -> Insert:
+    """写入待累加统计记录的语句, 只构造一次, 按行传参批量执行
+
+    需要 RETURNING 取回记录ID, SQLAlchemy 对带 RETURNING 的 executemany 使用 insertmanyvalues,
+    把各行合并成多行 VALUES 按批发送, SQL 文本随每批行数变化, 不能像 stat_info 的 upsert 那样复用同一条预编译语句
+    """
+    return insert(StatInfoRecord).returning(
+        StatInfoRecord.id,
+        StatInfoRecord.type,
+        StatInfoRecord.source_id,
+        StatInfoRecord.target_id,
+        StatInfoRecord.value,
+    )
+
+
+def on_stat_committed(listener: StatListener) -> StatListener:
+    """注册统计增量回调, 每个包含统计增量的事务提交后以合并后的增量调用一次
+
+    回调在提交后的同一事件循环中同步执行, 应只做内存操作; 抛出的异常会被记录并忽略
+    """
+    _stat_listeners.append(listener)
+    return listener
+
 class StatInfoService(BaseService[StatInfo]):
     """统计信息服务"""
     def __init__(self):
@@ -14,8 +113,8 @@ class StatInfoService(BaseService[StatInfo]):
         self,
         db: AsyncSession,
         type_: str,
-        source_id: Optional[int] = None,
-        target_id: Optional[int] = None,
+        source_id: int | None = None,
+        target_id: int | None = None,
         *,
         skip: int = 0,
         limit: int = 100
@@ -38,8 +137,8 @@ class StatInfoService(BaseService[StatInfo]):
         type_: str,
         value: int,
         *,
-        source_id: Optional[int] = None,
-        target_id: Optional[int] = None,
+        source_id: int | None = None,
+        target_id: int | None = None,
         meta: dict[str, Any] | None = None
     ) -> tuple[StatInfo, StatInfoRecord]:
         """
@@ -81,4 +180,329 @@ class StatInfoService(BaseService[StatInfo]):
         await db.refresh(stat_info)
         await db.refresh(record)
         
-        return stat_info, record 
\ No newline at end of file
+        return stat_info, record 
+
+    @classmethod
+    async def increment_many(cls, db: AsyncSession, deltas: dict[StatKey, int]) -> None:
+        """批量累加统计值
+
+        所有统计用同一条 INSERT ... ON CONFLICT DO UPDATE 按行批量写入, 依赖 uq_stat_info_type_source_target 唯一索引;
+        不提交事务, 由调用方统一提交
+
+        Args:
+            db: 数据库会话
+            deltas: 统计键 -> 增量
+        """
+        # 固定写入顺序, 避免并发事务互相加锁导致死锁
+        rows = [
+            {"type": type_, "source_id": source_id, "target_id": target_id, "total": value}
+            for (type_, source_id, target_id), value in sorted(
+                deltas.items(), key=lambda item: (item[0][0], item[0][1] or 0, item[0][2] or 0)
+            )
+            if value
+        ]
+        if not rows:
+            return
+        await db.execute(increment_stmt(), rows)
+
+    @classmethod
+    async def increment_daily(cls, db: AsyncSession, deltas: dict[DailyKey, int]) -> None:
+        """批量累加按天汇总的统计, 用同一条 INSERT ... ON CONFLICT DO UPDATE 按行批量写入; 不提交事务
+
+        Args:
+            db: 数据库会话
+            deltas: (类型, 用户ID, 日期) -> 增量
+        """
+        rows = [
+            {"type": type_, "source_id": source_id, "day": day, "total": value}
+            for (type_, source_id, day), value in sorted(deltas.items(), key=lambda item: item[0])
+            if value
+        ]
+        if not rows:
+            return
+        await db.execute(increment_daily_stmt(), rows)
+
+    @classmethod
+    async def prune_daily(cls, db: AsyncSession, before: date) -> int:
+        """删除 before 之前的按天汇总统计, 返回删除的行数; 不提交事务"""
+        result = await db.execute(delete(StatInfoDaily).where(StatInfoDaily.day < before))
+        return result.rowcount
+
+    @classmethod
+    async def record_many(cls, db: AsyncSession, deltas: dict[StatKey, int]) -> None:
+        """批量写入待累加的统计记录(写后缓冲)
+
+        用一条带 RETURNING 的多行 INSERT 写入 applied = false 的 StatInfoRecord, 与答题记录同一事务提交,
+        进程崩溃也不会丢失增量; 事务提交后记录交给 stat_buffer, 由其合并后批量累加到 stat_info
+
+        Args:
+            db: 数据库会话
+            deltas: 统计键 -> 增量
+        """
+        rows = [
+            {"type": type_, "source_id": source_id, "target_id": target_id, "value": value, "applied": False}
+            for (type_, source_id, target_id), value in deltas.items()
+            if value
+        ]
+        if not rows:
+            return
+        result = await db.execute(record_stmt(), rows)
+        pending: list[PendingRecord] = db.sync_session.info.setdefault(_SESSION_PENDING_KEY, [])
+        pending.extend(
+            (record_id, (type_, source_id, target_id), value)
+            for record_id, type_, source_id, target_id, value in result.all()
+        )
+
+    @classmethod
+    async def apply_deltas(cls, db: AsyncSession, deltas: dict[StatKey, int]) -> None:
+        """写入统计增量, 根据配置直接累加或走写后缓冲; 不提交事务
+
+        事务提交后增量会通知给 on_stat_committed 注册的回调
+        """
+        if settings.stats.write_behind:
+            await cls.record_many(db, deltas)
+        else:
+            await cls.increment_many(db, deltas)
+            await cls.increment_daily(db, daily_deltas(deltas, stat_day()))
+        committed: list[dict[StatKey, int]] = db.sync_session.info.setdefault(_SESSION_DELTAS_KEY, [])
+        committed.append(deltas)
+
+
+class StatWriteBuffer:
+    """统计增量写后缓冲
+
+    答题时只写入 applied = false 的 StatInfoRecord, 提交后在内存中按 (类型, 源, 目标) 合并;
+    后台任务按时间间隔或缓冲大小批量刷写: 用 UPDATE ... RETURNING 认领记录并置为已累加,
+    再把合并后的增量 upsert 到 stat_info, 两步在同一事务内完成, 因此每条记录恰好累加一次.
+    进程崩溃后遗留的记录由任意进程在 recover_after 秒后补写.
+    读取时把未刷写的增量叠加到已持久化的总值上, 保证用户看到最新数据
+    """
+    def __init__(self, flush_interval: float, max_pending: int, recover_after: float):
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._recover_after = recover_after
+        self._records: dict[int, tuple[StatKey, int]] = {}
+        self._overlay: dict[int | None, dict[StatKey, int]] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def add(self, records: Iterable[PendingRecord]) -> None:
+        """加入已提交的待刷写记录"""
+        for record_id, key, value in records:
+            if record_id in self._records:
+                continue
+            self._records[record_id] = (key, value)
+            source = self._overlay.setdefault(key[1], {})
+            source[key] = source.get(key, 0) + value
+        if self._wakeup is not None and len(self._records) >= self._max_pending:
+            self._wakeup.set()
+
+    def _discard(self, records: dict[int, tuple[StatKey, int]]) -> None:
+        """从叠加层中减去已刷写的记录"""
+        for key, value in records.values():
+            source = self._overlay.get(key[1])
+            if source is None:
+                continue
+            remaining = source.get(key, 0) - value
+            if remaining:
+                source[key] = remaining
+            else:
+                source.pop(key, None)
+                if not source:
+                    self._overlay.pop(key[1], None)
+
+    def pending(self, source_id: int) -> dict[StatKey, int]:
+        """某个源(用户)尚未刷写的增量"""
+        return dict(self._overlay.get(source_id, {}))
+
+    @property
+    def size(self) -> int:
+        """待刷写记录数"""
+        return len(self._records)
+
+    async def _apply(self, db: AsyncSession, condition: Any) -> int:
+        """认领满足条件的未累加记录并累加到 stat_info, 返回认领的记录数"""
+        stmt = (
+            update(StatInfoRecord)
+            .where(StatInfoRecord.applied.is_(False), condition)
+            .values(applied=True)
+            .returning(
+                StatInfoRecord.type,
+                StatInfoRecord.source_id,
+                StatInfoRecord.target_id,
+                StatInfoRecord.value,
+                StatInfoRecord.created_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        deltas: dict[StatKey, int] = {}
+        by_day: dict[DailyKey, int] = {}
+        count = 0
+        for type_, source_id, target_id, value, created_at in result.all():
+            key = (type_, source_id, target_id)
+            deltas[key] = deltas.get(key, 0) + value
+            # 按答题时所在的日期汇总, 补写的遗留记录也计入当天
+            for daily_key, daily_value in daily_deltas({key: value}, stat_day(created_at)).items():
+                by_day[daily_key] = by_day.get(daily_key, 0) + daily_value
+            count += 1
+        await StatInfoService.increment_many(db, deltas)
+        await StatInfoService.increment_daily(db, by_day)
+        return count
+
+    async def flush(self) -> int:
+        """把当前缓冲的记录刷写到 stat_info, 返回刷写的记录数
+
+        先把待刷写的记录整体换出, 刷写期间新提交的记录进入新的缓冲; 提交返回后不经过 await 立即从叠加层减去这批记录,
+        读取方不会在提交之后、移除之前把已累加到 stat_info 的增量再叠加一次. 刷写失败时这批记录放回缓冲, 下次重试
+        """
+        if not self._records:
+            return 0
+        batch, self._records = self._records, {}
+        committed = False
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                count = await self._apply(db, StatInfoRecord.id.in_(list(batch)))
+                await db.commit()
+                committed = True
+                # 已被其他进程补写的记录同样从缓冲中移除
+                self._discard(batch)
+        finally:
+            if not committed:
+                self._records.update(batch)
+        return count
+
+    async def recover(self) -> int:
+        """补写遗留的未累加记录(如进程崩溃前未来得及刷写), 返回补写的记录数"""
+        stale = (
+            select(StatInfoRecord.id)
+            .where(
+                StatInfoRecord.applied.is_(False),
+                StatInfoRecord.created_at < func.now() - timedelta(seconds=self._recover_after)
+            )
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            count = await self._apply(db, StatInfoRecord.id.in_(stale))
+            await db.commit()
+        if count:
+            logger.warning("Recovered %d pending stat records", count)
+        return count
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        loop = asyncio.get_running_loop()
+        last_recover = loop.time()
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if loop.time() - last_recover >= self._recover_after:
+                    last_recover = loop.time()
+                    await self.recover()
+            except Exception:
+                # 刷写失败时记录仍在缓冲和数据库中, 下次重试
+                logger.exception("Failed to flush stat buffer")
+
+    async def start(self) -> None:
+        """启动后台刷写任务"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        await self.recover()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台刷写任务并刷写剩余记录"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self._wakeup = None
+        await self.flush()
+
+
+class StatDailyPruner:
+    """按天汇总统计的定期清理任务, 只保留最近 retention_days 天的分桶"""
+    def __init__(self, interval: float, retention_days: int):
+        self._interval = interval
+        self._retention_days = retention_days
+        self._task: asyncio.Task[None] | None = None
+
+    async def prune(self) -> int:
+        """删除过期分桶, 返回删除的行数"""
+        before = stat_day() - timedelta(days=self._retention_days)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            count = await StatInfoService.prune_daily(db, before)
+            await db.commit()
+        if count:
+            logger.info("Pruned %d daily stat rows before %s", count, before)
+        return count
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.prune()
+            except Exception:
+                logger.exception("Failed to prune daily stats")
+            await asyncio.sleep(self._interval)
+
+    async def start(self) -> None:
+        """启动后台清理任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台清理任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+
+stat_buffer = StatWriteBuffer(
+    flush_interval=settings.stats.flush_interval,
+    max_pending=settings.stats.flush_max_pending,
+    recover_after=settings.stats.recover_after,
+)
+stat_daily_pruner = StatDailyPruner(
+    interval=settings.stats.daily_prune_interval,
+    retention_days=settings.stats.daily_retention_days,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _hand_over_pending_records(session: Session) -> None:
+    """事务提交后把写入的统计记录交给写后缓冲, 并通知统计回调"""
+    pending: list[PendingRecord] | None = session.info.pop(_SESSION_PENDING_KEY, None)
+    if pending:
+        stat_buffer.add(pending)
+    committed: list[dict[StatKey, int]] | None = session.info.pop(_SESSION_DELTAS_KEY, None)
+    if not committed:
+        return
+    deltas: dict[StatKey, int] = {}
+    for item in committed:
+        for key, value in item.items():
+            deltas[key] = deltas.get(key, 0) + value
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    for listener in _stat_listeners:
+        try:
+            listener(deltas)
+        except Exception:
+            logger.exception("Stat listener %r failed", listener)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending_records(session: Session, _previous_transaction: Any) -> None:
+    """事务回滚后丢弃未提交的统计记录"""
+    session.info.pop(_SESSION_PENDING_KEY, None)
+    session.info.pop(_SESSION_DELTAS_KEY, None)
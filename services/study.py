@@ -1,7 +1,11 @@
-from typing import Optional, Sequence, Any
-from sqlmodel import select, func, SQLModel, Field
+from functools import cache
+from typing import Any
+from collections.abc import Sequence
+from fastapi import status
+from sqlmodel import select
+from sqlalchemy import Select, bindparam
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy import Integer, String
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -13,30 +17,35 @@ from schemas.study import StudyStatus, KnowledgeDetail
 from schemas.v1.question import (
     Question as QuestionSchema, SingleSelectionQuestion, MultiSelectionQuestion,
     JudgeQuestion, BlankFillQuestion, QAQuestion,Answer,AnswerHistory,
-     MultiSelectionAnswer,JudgeAnswer,SingleSelectionAnswer,BlankFillAnswer,QAAnswer,Option
+     MultiSelectionAnswer,JudgeAnswer,SingleSelectionAnswer,BlankFillAnswer,QAAnswer,Option,
+    BulkAnswerSubmission,BulkAnswerResult
 )
-from core.exceptions import ValidationError,NotFoundError
-from datetime import datetime,timezone
+from core.exceptions import APIError, ValidationError,NotFoundError
+from datetime import datetime,UTC
 from .base import BaseService
+from .grading import grading_engine
+from .question_pool import KnowledgeEntry, knowledge_catalog, question_pool
+from .stats import StatInfoService, StatKey, stat_buffer
 
 
-class UserStats(SQLModel):
-    """用户统计信息"""
-    total_duration: int = Field(sa_type=Integer)
-    practice_count: int = Field(sa_type=Integer)
-    correct_count: int = Field(sa_type=Integer)
+# 学习统计用到的统计类型
+STUDY_STAT_TYPES = (
+    StatType.DURATION,
+    StatType.PRACTICE,
+    StatType.CORRECT,
+    StatType.CORRECT_BY_KNOWLEDGE,
+)
+
 
-class KnowledgeStats(SQLModel):
-    """知识点统计信息"""
-    id: int = Field(sa_type=Integer)
-    name: str
-    is_important: str
-    total: int = Field(sa_type=Integer)
-    correct_count: int = Field(sa_type=Integer)
+def as_utc(moment: datetime) -> datetime:
+    """转换为 UTC 时间; 不带时区的时间视为 UTC, 带时区的时间按其偏移换算"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=UTC)
+    return moment.astimezone(UTC)
 
 class KnowledgeService:
     """知识点服务"""
-    async def get_by_id(self, db: AsyncSession, id: int) -> Optional[Knowledge]:
+    async def get_by_id(self, db: AsyncSession, id: int) -> Knowledge | None:
         result = await db.execute(select(Knowledge).where(Knowledge.id == id))
         return result.scalar_one_or_none()
 
@@ -60,7 +69,7 @@ class AnswerService:
 
 class QuestionService:
     """题目服务"""
-    async def get_by_id(self, db: AsyncSession, id: int) -> Optional[Question]:
+    async def get_by_id(self, db: AsyncSession, id: int) -> Question | None:
         raise NotImplementedError
     @classmethod
     async def make_answer_history(cls,submission_id:str, question: Question, answer: Answer) -> AnswerHistory:
@@ -68,54 +77,84 @@ class QuestionService:
         return AnswerHistory(
             id=submission_id,
             question=question, # type: ignore
-            answer=question.correct_answer,
+            answer=grading_engine.correct_answer(question),
             user_answer=answer
         )
-    @classmethod
-    async def judge_multi_answer(cls, answer: MultiSelectionAnswer,correct_answer: MultiSelectionAnswer) -> bool:
-        """判断多选题答案是否正确"""
-        user_answers = set([r.index for r in answer.result])
-        correct_answers = set([r.index for r in correct_answer.result])
-        return user_answers == correct_answers
 
     
 
-    async def select_questions(self, db: AsyncSession, user_id: int, knowledge_id: str | None = None) -> QuestionSchema:
+    async def select_questions(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        knowledge_id: str | None = None,
+        difficulty: float | None = None
+    ) -> QuestionSchema:
         """选取题目
+
+        从用户的未做题池中随机取题, 不再每次对答题记录做反连接
         
         Args:
             db: 数据库会话
             user_id: 用户ID
             knowledge_id: 知识点ID,如果指定则只选择该知识点下的题目
+            difficulty: 目标难度(0~1),如果指定则优先选择难度接近的题目
             
         Returns:
             QuestionSchema: 题目
         """
-        # 构建基础查询
-        stmt = (
-            select(Question)
-            .outerjoin(
-                UserQuestionSubmissionRecord,
-                (UserQuestionSubmissionRecord.question_id == Question.id) &
-                (UserQuestionSubmissionRecord.user_id == user_id)
-            )
-            .where(UserQuestionSubmissionRecord.id.is_(None))  # 筛选未做过的题目
+        questions = await self.select_questions_batch(
+            db,
+            user_id=user_id,
+            count=1,
+            knowledge_id=knowledge_id,
+            difficulty=difficulty
         )
-        
-        # 如果指定了knowledge_id,添加筛选条件
-        if knowledge_id:
-            stmt = stmt.where(Question.knowledge_id == int(knowledge_id))
-            
-        # 限制返回一条记录
-        stmt = stmt.limit(1)
-            
-        # 执行查询
-        db_result = await db.execute(stmt)
-        q = db_result.scalar_one_or_none()
-        if not q:
+        return questions[0]
+
+    async def select_questions_batch(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        count: int,
+        knowledge_id: str | None = None,
+        difficulty: float | None = None
+    ) -> list[QuestionSchema]:
+        """批量选取不重复的题目
+
+        从用户的未做题池中一次抽取多道题目, 用一条查询加载
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            count: 题目数量
+            knowledge_id: 知识点ID,如果指定则只选择该知识点下的题目
+            difficulty: 目标难度(0~1),如果指定则优先选择难度接近的题目
+
+        Returns:
+            List[QuestionSchema]: 题目列表, 未做题目不足时少于count道
+        """
+        pool = await question_pool.get(db, user_id)
+        kid = int(knowledge_id) if knowledge_id else None
+        question_ids = pool.sample(count, kid, difficulty)
+        if not question_ids:
             raise NotFoundError(message="Question not found")
-        # 转换为对应的schema
-                
+
+        result = await db.execute(select(Question).where(Question.id.in_(question_ids)))
+        questions = {q.id: q for q in result.scalars().all()}
+        if len(questions) < len(question_ids):
+            # 有题目已被删除, 题库目录需要重新加载
+            question_pool.catalog.invalidate()
+            for question_id in question_ids:
+                if question_id not in questions:
+                    pool.discard(question_id)
+            if not questions:
+                return await self.select_questions_batch(db, user_id, count, knowledge_id, difficulty)
+        return [self.to_question_schema(questions[qid]) for qid in question_ids if qid in questions]
+
+    @classmethod
+    def to_question_schema(cls, q: Question) -> QuestionSchema:
+        """将题目转换为对应的schema"""
         question_data = {
             "id": q.id,
             "description": q.description,
@@ -142,15 +181,56 @@ class UserQuestionSubmissionService(BaseService[UserQuestionSubmissionRecord]):
     def __init__(self):
         super().__init__(UserQuestionSubmissionRecord)
     @classmethod
+    def collect_stat_deltas(
+        cls,
+        user_id: int,
+        knowledge_id: int,
+        duration: int,
+        is_correct: bool,
+        answered_before: bool,
+        correct_before: bool
+    ) -> dict[StatKey, int]:
+        """计算一次答题带来的统计增量
+
+        做过的题目不再增加练习次数, 已经答对过的题目不再增加正确数
+
+        Args:
+            user_id: 用户ID
+            knowledge_id: 知识点ID
+            duration: 答题用时
+            is_correct: 是否正确
+            answered_before: 此前是否做过该题
+            correct_before: 此前是否答对过该题
+
+        Returns:
+            Dict[StatKey, int]: 统计键 -> 增量
+        """
+        deltas: dict[StatKey, int] = {(StatType.DURATION, user_id, None): duration}
+        if not answered_before:
+            deltas[(StatType.PRACTICE, user_id, None)] = 1
+            deltas[(StatType.PRACTICE_BY_KNOWLEDGE, user_id, knowledge_id)] = 1
+        if is_correct and not correct_before:
+            deltas[(StatType.CORRECT, user_id, None)] = 1
+            deltas[(StatType.CORRECT_BY_KNOWLEDGE, user_id, knowledge_id)] = 1
+        return deltas
+
+    @classmethod
     async def update_user_stats(
         cls,
         db: AsyncSession,
         user_id: int,
         duration: int,
         is_correct: bool,
-        question_id: int
+        question_id: int,
+        *,
+        knowledge_id: int | None = None,
+        answered_before: bool | None = None,
+        correct_before: bool | None = None
     ) -> None:
         """更新用户统计数据
+
+        一次查询取出题目知识点和此前的作答情况(调用方已知时可直接传入), 再用一条语句写入所有统计
+        (直接 upsert 或写后缓冲, 见 StatInfoService.apply_deltas)
         
         Args:
             db: 数据库会话
@@ -158,120 +238,50 @@ class UserQuestionSubmissionService(BaseService[UserQuestionSubmissionRecord]):
             duration: 答题用时
             is_correct: 是否正确
             question_id: 题目ID
+            knowledge_id: 题目的知识点ID
+            answered_before: 此前是否做过该题
+            correct_before: 此前是否答对过该题
         """
-        # 查询question_id 是否在 record 中，如果存在，计数不增加，如果已经正确，那正确也不增加
-        stmt = select(UserQuestionSubmissionRecord).where(
-            UserQuestionSubmissionRecord.question_id == question_id,
-            UserQuestionSubmissionRecord.user_id == user_id
+        if knowledge_id is None or answered_before is None or correct_before is None:
+            stmt = select(
+                Question.knowledge_id,
+                *cls.answer_state_columns(user_id)
+            ).where(Question.id == question_id)
+            row = (await db.execute(stmt)).first()
+            if not row:
+                return
+            knowledge_id, answered_before, correct_before = row
+
+        deltas = cls.collect_stat_deltas(
+            user_id,
+            knowledge_id=knowledge_id,
+            duration=duration,
+            is_correct=is_correct,
+            answered_before=answered_before,
+            correct_before=correct_before
         )
-        result = await db.execute(stmt)
-        record = None
-        for r, in result: # 如果有正确的就用正确的
-            record = r
-            if r.is_correct:
-                break
-
-        # 获取题目的知识点ID
-        question_stmt = select(Question).where(Question.id == question_id)
-        question_result = await db.execute(question_stmt)
-        question = question_result.scalar_one_or_none()
-        if not question:
-            return
-        
-        knowledge_id = question.knowledge_id
+        await StatInfoService.apply_deltas(db, deltas)
 
-        # 更新学习时长统计
-        duration_stat = await db.execute(
-            select(StatInfo).where(
-                StatInfo.type == StatType.DURATION,
-                StatInfo.source_id == user_id
+    @classmethod
+    def answer_state_columns(cls, user_id: Any) -> tuple[Any, Any]:
+        """用户此前是否做过/答对过 Question 对应题目的关联子查询列"""
+        answered = (
+            select(UserQuestionSubmissionRecord.id)
+            .where(
+                UserQuestionSubmissionRecord.question_id == Question.id,
+                UserQuestionSubmissionRecord.user_id == user_id
             )
         )
-        duration_info = duration_stat.scalar_one_or_none()
-        if not duration_info:
-            duration_info = StatInfo(
-                type=StatType.DURATION,
-                source_id=user_id,
-                total=0
-            )
-            db.add(duration_info)
-        duration_info.total += duration
-
-        if not record:
-            # 更新练习次数统计
-            practice_stat = await db.execute(
-                select(StatInfo).where(
-                    StatInfo.type == StatType.PRACTICE,
-                    StatInfo.source_id == user_id
-                )
-            )
-            practice_info = practice_stat.scalar_one_or_none()
-            if not practice_info:
-                practice_info = StatInfo(
-                    type=StatType.PRACTICE,
-                    source_id=user_id,
-                    total=0
-                )
-                db.add(practice_info)
-            practice_info.total += 1
-
-            # 更新知识点练习次数统计
-            knowledge_practice_stat = await db.execute(
-                select(StatInfo).where(
-                    StatInfo.type == StatType.PRACTICE_BY_KNOWLEDGE,
-                    StatInfo.source_id == user_id,
-                    StatInfo.target_id == knowledge_id
-                )
-            )
-            knowledge_practice_info = knowledge_practice_stat.scalar_one_or_none()
-            if not knowledge_practice_info:
-                knowledge_practice_info = StatInfo(
-                    type=StatType.PRACTICE_BY_KNOWLEDGE,
-                    source_id=user_id,
-                    target_id=knowledge_id,
-                    total=0
-                )
-                db.add(knowledge_practice_info)
-            knowledge_practice_info.total += 1
-        
-        # 更新正确数统计
-        if is_correct:
-            if not record or not record.is_correct:
-                correct_stat = await db.execute(
-                    select(StatInfo).where(
-                        StatInfo.type == StatType.CORRECT,
-                        StatInfo.source_id == user_id
-                    )
-                )
-                correct_info = correct_stat.scalar_one_or_none()
-                if not correct_info:
-                    correct_info = StatInfo(
-                        type=StatType.CORRECT,
-                        source_id=user_id,
-                        total=0
-                    )
-                    db.add(correct_info)
-                correct_info.total += 1
-
-                # 更新知识点正确数统计
-                knowledge_correct_stat = await db.execute(
-                    select(StatInfo).where(
-                        StatInfo.type == StatType.CORRECT_BY_KNOWLEDGE,
-                        StatInfo.source_id == user_id,
-                        StatInfo.target_id == knowledge_id
-                    )
-                )
-                knowledge_correct_info = knowledge_correct_stat.scalar_one_or_none()
-                if not knowledge_correct_info:
-                    knowledge_correct_info = StatInfo(
-                        type=StatType.CORRECT_BY_KNOWLEDGE,
-                        source_id=user_id,
-                        target_id=knowledge_id,
-                        total=0
-                    )
-                    db.add(knowledge_correct_info)
-                knowledge_correct_info.total += 1
-        await db.flush()
+        correct = answered.where(UserQuestionSubmissionRecord.is_correct)
+        return (
+            answered.exists().label("answered_before"),
+            correct.exists().label("correct_before"),
+        )
+
+    @classmethod
+    def answer_duration(cls, start_answer_time: datetime, answered_at: datetime) -> int:
+        """答题用时(秒), 最长按20分钟计"""
+        return int(min(max((answered_at - start_answer_time).total_seconds(), 0), 60*20))
 
     @classmethod
     async def validate_answer_format(cls, answer: Answer, question_type: str) -> None:
@@ -335,68 +345,185 @@ class UserQuestionSubmissionService(BaseService[UserQuestionSubmissionRecord]):
         Returns:
             AnswerHistory: 答题历史记录
         """
-        # 1. 获取题目信息
-        stmt = select(Question).where(Question.id == question_id)
-        result = await db.execute(stmt)
-        question = result.scalar_one_or_none()
-        submitted_at = datetime.now(timezone.utc).isoformat()
-        duration:int = int(min((datetime.now(timezone.utc) - start_answer_time).total_seconds(),60*20))
-        if not question:
+        # 1. 获取题目信息以及此前的作答情况
+        row = (await db.execute(answer_state_query(), {"user_id": user_id, "question_id": question_id})).first()
+        submitted_at = datetime.now(UTC)
+        duration = cls.answer_duration(start_answer_time, datetime.now(UTC))
+        if not row:
             raise ValidationError(message="题目不存在")
+        question, answered_before, correct_before = row
             
         # 2. 验证答案格式
         await cls.validate_answer_format(answer, question.question_type)
         
-        # 3. 验证答案正确性
-        is_correct = False
-        if question.question_type == "judge":
-            # 判断题
-            is_correct = answer.result == question.correct_answer.result
-        elif question.question_type == "single":
-            # 单选题
-            is_correct = answer.result.index == question.correct_answer.result.index # type: ignore
-        elif question.question_type == "multi":
-            # 多选题 - 需要答案完全匹配
-            is_correct = await QuestionService.judge_multi_answer(answer, question.correct_answer) # type: ignore
-        elif question.question_type in ["blank", "qa"]:
-            # 填空题和问答题 - 需要完全匹配
-            is_correct = answer.result == question.correct_answer.result
-        else:
-            raise ValidationError(message=f"Question type {question.question_type} is not supported")
+        # 3. 验证答案正确性(使用预编译的标准答案)
+        is_correct = grading_engine.grade(question, answer)
         
         await cls.update_user_stats(
             db,
             user_id=user_id,
             duration=duration,
             is_correct=is_correct,
-            question_id=question_id
+            question_id=question_id,
+            knowledge_id=question.knowledge_id,
+            answered_before=answered_before,
+            correct_before=correct_before
         )
        
          # 4. 创建答题记录
         submission = UserQuestionSubmissionRecord(
             question_id=question_id,
             user_id=user_id,
-            meta={
-                "answer": answer.model_dump(),
-                "is_correct": is_correct,
-                "duration": duration,
-                "submitted_at": submitted_at
-            }
+            is_correct=is_correct,
+            duration=duration,
+            submitted_at=submitted_at,
+            meta={"answer": answer.model_dump()}
         )
         
         db.add(submission)
+        await db.flush()  # 通过 RETURNING 取得记录ID, 无需提交后再 refresh
         await db.commit()
-        await db.refresh(submission)
+        question_pool.mark_answered(user_id, question_id)
         
         # 5. 返回答题历史
         return AnswerHistory(
             id=str(submission.id),
             question=question, # type: ignore
-            answer=question.correct_answer,
+            answer=grading_engine.correct_answer(question),
             user_answer=answer,
             is_correct=is_correct
         )
 
+    @classmethod
+    async def submit_answers(
+        cls,
+        db: AsyncSession,
+        user_id: int,
+        submissions: Sequence[BulkAnswerSubmission]
+    ) -> list[BulkAnswerResult]:
+        """批量提交答案(离线/考试模式)
+
+        一次查询加载所有题目和此前的作答情况, 批量判分后用一条多行 INSERT 写入答题记录,
+        合并所有新增记录的统计增量后只写入一次. 以 (user_id, submission_id) 去重,
+        重试时已处理过的提交不会重复计入, 直接返回原记录的结果
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            submissions: 答案列表
+
+        Returns:
+            List[BulkAnswerResult]: 每个提交ID对应的结果, 与首次出现的顺序一致
+
+        Raises:
+            ValidationError: 题目不存在或答案格式不正确, 整批都不会写入
+            APIError: 重复提交的原记录已不存在(409), 整批都不会写入
+        """
+        # 1. 同一请求中重复的提交ID只处理第一次
+        unique: dict[str, BulkAnswerSubmission] = {}
+        for item in submissions:
+            unique.setdefault(item.submission_id, item)
+        items = list(unique.values())
+        if not items:
+            return []
+
+        # 2. 获取题目信息以及此前的作答情况
+        question_ids = {item.question_id for item in items}
+        result = await db.execute(answer_state_batch_query(), {"user_id": user_id, "question_ids": list(question_ids)})
+        rows = {question.id: (question, answered, correct) for question, answered, correct in result.all()}
+        missing = question_ids - rows.keys()
+        if missing:
+            raise ValidationError(message=f"题目不存在: {sorted(missing)}")
+        for item in items:
+            await cls.validate_answer_format(item.answer, rows[item.question_id][0].question_type)
+
+        # 3. 批量判分
+        graded = grading_engine.grade_many((rows[item.question_id][0], item.answer) for item in items)
+
+        # 4. 一条多行 INSERT 写入答题记录, 已处理过的提交ID跳过
+        now = datetime.now(UTC)
+        values = []
+        for item, is_correct in zip(items, graded, strict=True):
+            answered_at = as_utc(item.answered_at) if item.answered_at else now
+            values.append({
+                "question_id": item.question_id,
+                "user_id": user_id,
+                "client_submission_id": item.submission_id,
+                "is_correct": is_correct,
+                "duration": cls.answer_duration(as_utc(item.time), answered_at),
+                "submitted_at": answered_at,
+                "meta": {"answer": item.answer.model_dump()}
+            })
+        model = UserQuestionSubmissionRecord
+        insert_stmt = (
+            insert(model)
+            .values(values)
+            .on_conflict_do_nothing(
+                index_elements=[model.user_id, model.client_submission_id],
+                index_where=model.client_submission_id.isnot(None)
+            )
+            .returning(model.client_submission_id, model.id)
+        )
+        inserted: dict[str, int] = dict((await db.execute(insert_stmt)).tuples().all())
+
+        # 5. 重复提交取回原记录
+        existing: dict[str, tuple[int, bool]] = {}
+        duplicated_ids = [item.submission_id for item in items if item.submission_id not in inserted]
+        if duplicated_ids:
+            result = await db.execute(
+                select(model.client_submission_id, model.id, model.is_correct)
+                .where(model.user_id == user_id, model.client_submission_id.in_(duplicated_ids))
+            )
+            existing = {cid: (record_id, bool(is_correct)) for cid, record_id, is_correct in result.all()}
+            lost = set(duplicated_ids) - existing.keys()
+            if lost:
+                # 插入因冲突被跳过, 但原记录已不存在, 例如被并发删除, 整批回滚由客户端重试
+                raise APIError(status.HTTP_409_CONFLICT, message=f"提交记录冲突, 请重试: {sorted(lost)}")
+
+        # 6. 按提交顺序合并新增记录的统计增量, 只写入一次
+        state = {question_id: (answered, correct) for question_id, (_, answered, correct) in rows.items()}
+        deltas: dict[StatKey, int] = {}
+        for item, value in zip(values, graded, strict=True):
+            if item["client_submission_id"] not in inserted:
+                continue
+            question = rows[item["question_id"]][0]
+            answered_before, correct_before = state[question.id]
+            item_deltas = cls.collect_stat_deltas(
+                user_id,
+                knowledge_id=question.knowledge_id,
+                duration=item["duration"],
+                is_correct=value,
+                answered_before=answered_before,
+                correct_before=correct_before
+            )
+            for key, delta in item_deltas.items():
+                deltas[key] = deltas.get(key, 0) + delta
+            state[question.id] = (True, correct_before or value)
+        await StatInfoService.apply_deltas(db, deltas)
+        await db.commit()
+        for question_id in question_ids:
+            question_pool.mark_answered(user_id, question_id)
+
+        # 7. 返回结果
+        results: list[BulkAnswerResult] = []
+        for item, is_correct in zip(items, graded, strict=True):
+            question = rows[item.question_id][0]
+            duplicated = item.submission_id not in inserted
+            if duplicated:
+                record_id, is_correct = existing[item.submission_id]
+            else:
+                record_id = inserted[item.submission_id]
+            results.append(BulkAnswerResult(
+                id=str(record_id),
+                submission_id=item.submission_id,
+                question=question, # type: ignore
+                answer=grading_engine.correct_answer(question),
+                user_answer=item.answer,
+                is_correct=is_correct,
+                duplicated=duplicated
+            ))
+        return results
+
     async def get_user_history(
         self,
         db: AsyncSession,
@@ -424,92 +551,101 @@ class UserQuestionSubmissionService(BaseService[UserQuestionSubmissionRecord]):
         db: AsyncSession,
         user_id: int,
     ) -> StudyStatus:
-        """获取用户学习统计信息"""
-        # 查询用户统计信息
-        stats_stmt = (
-            select(
-                StatInfo.total
-            ).where(
-                StatInfo.source_id == user_id
-            )
-        )
-        
-        # 获取学习时长
-        duration_result = await db.execute(
-            stats_stmt.where(StatInfo.type == StatType.DURATION)
-        )
-        total_duration = duration_result.scalar_one_or_none() or 0
-        
-        # 获取练习次数
-        practice_result = await db.execute(
-            stats_stmt.where(StatInfo.type == StatType.PRACTICE)
-        )
-        practice_count = practice_result.scalar_one_or_none() or 0
-        
-        # 获取正确数
-        correct_result = await db.execute(
-            stats_stmt.where(StatInfo.type == StatType.CORRECT)
-        )
-        correct_count = correct_result.scalar_one_or_none() or 0
-        
-        user_stats = UserStats(
-            total_duration=total_duration,
-            practice_count=practice_count,
-            correct_count=correct_count
-        )
+        """获取用户学习统计信息
 
-        # 查询知识点统计信息
-        knowledge_stmt = (
-            select(
-                Knowledge.id.label("id"),
-                Knowledge.name.label("name"),
-                func.coalesce(func.cast(Knowledge.meta["is_important"], String), "false").label("is_important"),
-                func.count(Question.id).label("total")  # 统计每个知识点的总题目数
-            )
-            .select_from(Knowledge)
-            .outerjoin(Question, Question.knowledge_id == Knowledge.id)  # 关联题目表
-            .outerjoin(  # 关联统计信息表获取做题记录
-                StatInfo,
-                (StatInfo.target_id == Knowledge.id) &
-                (StatInfo.source_id == user_id) &
-                (StatInfo.type == StatType.PRACTICE_BY_KNOWLEDGE)
-            )
-            .group_by(Knowledge.id)  # 按知识点分组
-        )
-        
-        correct_subq = (
-            select(StatInfo.total)
-            .where(
-                (StatInfo.target_id == Knowledge.id) &
-                (StatInfo.source_id == user_id) &
-                (StatInfo.type == StatType.CORRECT_BY_KNOWLEDGE)
-            )
-            .correlate(Knowledge)
-            .scalar_subquery()
-        )
-        
-        knowledge_stmt = knowledge_stmt.add_columns(
-            func.coalesce(correct_subq, 0).label("correct_count")
-        )
-        
-        knowledge_result = await db.execute(knowledge_stmt)
-        knowledge_stats = [KnowledgeStats.model_validate(row) for row in knowledge_result]
+        一条查询取出用户所有相关的 stat_info 行(总量和各知识点), 在内存中与缓存的知识点目录合并
+        """
+        stats = await self.get_study_stats_many(db, [user_id])
+        return stats[user_id]
+
+    async def get_study_stats_many(
+        self,
+        db: AsyncSession,
+        user_ids: Sequence[int],
+    ) -> dict[int, StudyStatus]:
+        """批量获取用户学习统计信息
+
+        用一条 source_id IN (...) 查询取出所有用户的 stat_info 行, 在内存中逐个构造学习统计
+
+        Args:
+            db: 数据库会话
+            user_ids: 用户ID列表
+
+        Returns:
+            Dict[int, StudyStatus]: 用户ID -> 学习统计, 每个传入的用户都有一项
+        """
+        unique_ids = set(user_ids)
+        if not unique_ids:
+            return {}
+        knowledge_entries = await knowledge_catalog.load(db)
+        result = await db.execute(study_stats_query(), {"user_ids": list(unique_ids)})
+        totals: dict[int, dict[StatKey, int]] = {user_id: {} for user_id in unique_ids}
+        for type_, source_id, target_id, total in result.tuples().all():
+            totals[source_id][(type_, source_id, target_id)] = total
+        return {
+            user_id: self.make_study_status(user_id, user_totals, knowledge_entries)
+            for user_id, user_totals in totals.items()
+        }
+
+    @classmethod
+    def make_study_status(
+        cls,
+        user_id: int,
+        totals: dict[StatKey, int],
+        knowledge_entries: Sequence[KnowledgeEntry]
+    ) -> StudyStatus:
+        """由用户的统计值和知识点目录构造学习统计, 并叠加写后缓冲中尚未刷写的增量
+
+        Args:
+            user_id: 用户ID
+            totals: 统计键 -> 已持久化的总值
+            knowledge_entries: 知识点目录
+
+        Returns:
+            StudyStatus: 学习统计
+        """
+        totals = dict(totals)
+        for key, value in stat_buffer.pending(user_id).items():
+            totals[key] = totals.get(key, 0) + value
 
-        # 构造知识点详情
         knowledge_detail = [
             KnowledgeDetail(
-                name=stats.name,
-                knowledge_id=str(stats.id),
-                total=stats.total,
-                correct_count=stats.correct_count,
-                is_important=stats.is_important == "true"  # 将字符串转换为布尔值
+                name=entry.name,
+                knowledge_id=str(entry.id),
+                total=entry.total,
+                correct_count=totals.get((StatType.CORRECT_BY_KNOWLEDGE, user_id, entry.id), 0),
+                is_important=entry.is_important
             )
-            for stats in knowledge_stats
+            for entry in knowledge_entries
         ]
-
         return StudyStatus(
-            total_duration=user_stats.total_duration,
-            practice_count=user_stats.practice_count,
-            correct_count=user_stats.correct_count,
+            total_duration=totals.get((StatType.DURATION, user_id, None), 0),
+            practice_count=totals.get((StatType.PRACTICE, user_id, None), 0),
+            correct_count=totals.get((StatType.CORRECT, user_id, None), 0),
             knowledge_detail=knowledge_detail
         )
+
+
+@cache
+def answer_state_query() -> Select[Any]:
+    """提交答案时查询题目及此前作答情况的语句, 只构造一次, 参数为 user_id, question_id"""
+    return select(
+        Question, *UserQuestionSubmissionService.answer_state_columns(bindparam("user_id"))
+    ).where(Question.id == bindparam("question_id"))
+
+
+@cache
+def answer_state_batch_query() -> Select[Any]:
+    """批量提交答案时查询题目及此前作答情况的语句, 只构造一次, 参数为 user_id, question_ids"""
+    return select(
+        Question, *UserQuestionSubmissionService.answer_state_columns(bindparam("user_id"))
+    ).where(Question.id.in_(bindparam("question_ids", expanding=True)))
+
+
+@cache
+def study_stats_query() -> Select[Any]:
+    """批量查询用户学习统计的语句, 只构造一次, 参数为 user_ids"""
+    return select(StatInfo.type, StatInfo.source_id, StatInfo.target_id, StatInfo.total).where(
+        StatInfo.source_id.in_(bindparam("user_ids", expanding=True)),
+        StatInfo.type.in_(STUDY_STAT_TYPES)
+    )
@@ -1,23 +1,130 @@
-from typing import Optional, Sequence
-from sqlalchemy import select
+import time
+from collections import OrderedDict
+from functools import cache
+from typing import Any, NamedTuple
+from collections.abc import Sequence
+from sqlalchemy import Select, bindparam, event, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from passlib.context import CryptContext
+from core.config import settings
 from core.models.user import (
     User
 )
 from core.models.auth import JWTAuth
-from core.models.organization import Department
+from core.models.organization import Class, Department
 from .base import BaseService
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+
+class CurrentUser(NamedTuple):
+    """当前登录用户
+
+    认证时只查询接口需要的字段, 不加载积分/在线天数等关联; 不可变, 可以在请求间缓存共享
+    """
+    id: int
+    employee_id: str
+    name: str
+    avatar: str
+    job_title: str
+    class_id: int
+    department_id: int
+    company_id: int
+    class_name: str
+    department_name: str
+
+
+class CurrentUserCache:
+    """工号到当前登录用户的短期缓存
+
+    已登录用户的每个请求都要解析一次当前用户, 命中缓存时不再访问数据库;
+    用户、班级或部门修改后立即失效, 其他 worker 的修改最多延迟 ttl 秒生效
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[CurrentUser, float]] = OrderedDict()
+
+    def get(self, employee_id: str) -> CurrentUser | None:
+        """获取缓存的用户, 未缓存或已过期时返回None"""
+        item = self._entries.get(employee_id)
+        if item is None:
+            return None
+        user, expires_at = item
+        if time.monotonic() >= expires_at:
+            del self._entries[employee_id]
+            return None
+        self._entries.move_to_end(employee_id)
+        return user
+
+    def put(self, employee_id: str, user: CurrentUser) -> None:
+        """缓存用户"""
+        self._entries[employee_id] = (user, time.monotonic() + self._ttl)
+        self._entries.move_to_end(employee_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """使指定用户(为空时为所有用户)的缓存失效"""
+        if user_id is None:
+            self._entries.clear()
+            return
+        for key in [key for key, (user, _) in self._entries.items() if user.id == user_id]:
+            del self._entries[key]
+
+
+@cache
+def current_user_query() -> Select[Any]:
+    """按工号查询当前登录用户的语句, 只构造一次, 每次执行只传入 employee_id 参数"""
+    return select(
+        User.id,
+        User.name,
+        User.meta,
+        User.class_id,
+        User.department_id,
+        User.company_id,
+        Class.name,
+        Department.name
+    ).select_from(JWTAuth).join(
+        User, User.id == JWTAuth.user_id
+    ).outerjoin(
+        Class, Class.id == User.class_id
+    ).outerjoin(
+        Department, Department.id == User.department_id
+    ).where(
+        JWTAuth.id == bindparam("employee_id")
+    )
+
+
+current_user_cache = CurrentUserCache(
+    ttl=settings.cache.current_user_ttl,
+    max_entries=settings.cache.current_user_max_entries,
+)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_current_user(_mapper: Any, _connection: Any, target: User) -> None:
+    """用户编辑或删除后使其当前登录用户缓存失效"""
+    current_user_cache.invalidate(target.id)
+
+
+@event.listens_for(Class, "after_update")
+@event.listens_for(Class, "after_delete")
+@event.listens_for(Department, "after_update")
+@event.listens_for(Department, "after_delete")
+def _invalidate_current_users(_mapper: Any, _connection: Any, _target: Any) -> None:
+    """班级或部门改名、删除后使所有当前登录用户缓存失效, 缓存中保存了班级和部门名称"""
+    current_user_cache.invalidate()
+
+
 class UserService(BaseService[User]):
     """用户服务"""
     def __init__(self):
         super().__init__(User)
     
-    async def get_by_id(self, db: AsyncSession, id: int) -> Optional[User]:
+    async def get_by_id(self, db: AsyncSession, id: int) -> User | None:
         """通过 ID 获取用户"""
         stmt = select(self.model).where(
             self.model.id == id
@@ -35,7 +142,7 @@ class UserService(BaseService[User]):
         self,
         db: AsyncSession,
         employee_id: str
-    ) -> Optional[User]:
+    ) -> User | None:
         """通过工号获取用户"""
         stmt = select(JWTAuth).where(
             JWTAuth.id == employee_id
@@ -53,14 +160,43 @@ class UserService(BaseService[User]):
         if not auth:
             return None
         return auth.user
-    
+
+    async def get_current_user(
+        self,
+        db: AsyncSession,
+        employee_id: str
+    ) -> CurrentUser | None:
+        """通过工号获取当前登录用户, 优先读缓存, 未命中时一次查询取回所需字段"""
+        user = current_user_cache.get(employee_id)
+        if user is not None:
+            return user
+        row = (await db.execute(current_user_query(), {"employee_id": employee_id})).one_or_none()
+        if row is None:
+            return None
+        user_id, name, meta, class_id, department_id, company_id, class_name, department_name = row
+        meta = meta or {}
+        user = CurrentUser(
+            id=user_id,
+            employee_id=meta.get("employee_id", ""),
+            name=name,
+            avatar=meta.get("avatar", ""),
+            job_title=meta.get("job_title", ""),
+            class_id=class_id,
+            department_id=department_id,
+            company_id=company_id,
+            class_name=class_name or "",
+            department_name=department_name or ""
+        )
+        current_user_cache.put(employee_id, user)
+        return user
+
     async def authenticate(
         self,
         db: AsyncSession,
         *,
         employee_id: str,
         password: str
-    ) -> Optional[User]:
+    ) -> User | None:
         """验证用户"""
         stmt = select(JWTAuth).where(
             JWTAuth.id == employee_id
@@ -77,7 +213,7 @@ class UserService(BaseService[User]):
         self,
         db: AsyncSession,
         *,
-        department_name: Optional[str] = None,
+        department_name: str | None = None,
         skip: int = 0,
         limit: int = 100
     ) -> Sequence[User]:
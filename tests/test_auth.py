@@ -0,0 +1,26 @@
+import time
+
+from services.auth import VerifiedTokenCache
+
+
+def test_verified_token_cache_hits_until_expiry():
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.put("token-a", "E1", time.time() + 60)
+    cache.put("token-b", "E2", time.time() - 1)
+
+    assert cache.get("token-a") == "E1"
+    assert cache.get("token-b") is None
+    assert cache.get("token-c") is None
+
+
+def test_verified_token_cache_is_bounded():
+    cache = VerifiedTokenCache(max_entries=2)
+    expires_at = time.time() + 60
+    cache.put("token-a", "E1", expires_at)
+    cache.put("token-b", "E2", expires_at)
+    cache.get("token-a")
+    cache.put("token-c", "E3", expires_at)
+
+    assert cache.get("token-b") is None
+    assert cache.get("token-a") == "E1"
+    assert cache.get("token-c") == "E3"
@@ -0,0 +1,65 @@
+import pytest
+from fastapi import Request, Response
+
+from core.database import RecentWriters, SessionMetrics, SessionUsage
+from core.dependencies import READ_PRIMARY_COOKIE, mark_recent_write
+
+
+def test_recent_writers_expire_after_window():
+    writers = RecentWriters(window=60)
+    writers.apply({("duration", 1, None): 5, ("practice_by_knowledge", 2, 7): 1})
+
+    assert 1 in writers
+    assert 2 in writers
+    assert 3 not in writers
+
+    writers = RecentWriters(window=0)
+    writers.mark(1)
+    assert 1 not in writers
+
+
+def test_recent_writers_is_bounded():
+    writers = RecentWriters(window=60, max_entries=2)
+    writers.mark(1)
+    writers.mark(2)
+    writers.mark(3)
+
+    assert 1 not in writers
+    assert 2 in writers
+    assert 3 in writers
+
+
+def test_session_metrics_count_sessions_without_connection():
+    metrics = SessionMetrics()
+    metrics.add(SessionUsage())
+
+    usage = SessionUsage()
+    usage.connected()
+    usage.statements += 2
+    usage.released()
+    usage.released()
+    metrics.add(usage)
+
+    result = metrics.to_dict()
+    assert result["sessions"] == 2
+    assert result["sessions_without_connection"] == 1
+    assert result["statements"] == 2
+    assert usage.connections == 1
+    assert result["held_max_ms"] == round(usage.held * 1000, 3)
+
+
+@pytest.mark.asyncio()
+async def test_successful_writes_set_read_primary_cookie():
+    async def ok(_request: Request) -> Response:
+        return Response(status_code=200)
+
+    async def failed(_request: Request) -> Response:
+        return Response(status_code=422)
+
+    def request(method: str) -> Request:
+        return Request({"type": "http", "method": method, "path": "/", "headers": []})
+
+    response = await mark_recent_write(request("POST"), ok)
+    assert response.headers["set-cookie"].startswith(f"{READ_PRIMARY_COOKIE}=1")
+    assert "set-cookie" not in (await mark_recent_write(request("GET"), ok)).headers
+    assert "set-cookie" not in (await mark_recent_write(request("POST"), failed)).headers
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import Session
+
+from core.models.study import Question
+from schemas.v1.question import BlankFillAnswer, JudgeAnswer, MultiSelectionAnswer, Option, SingleSelectionAnswer
+from services.grading import GradingEngine
+
+
+def make_question(question_id: int, question_type: str, correct_answer: dict, updated_at: datetime) -> Question:
+    return Question(
+        id=question_id,
+        difficulty=0.5,
+        knowledge_id=1,
+        question_type=question_type,
+        correct_answer_json=correct_answer,
+        updated_at=updated_at,
+    )
+
+
+def option(index: int) -> Option:
+    return Option(index=index, option_name=chr(ord("A") + index))
+
+
+def test_grade_many_by_type():
+    stamp = datetime(2024, 1, 1)
+    judge = make_question(1, "judge", {"result": True}, stamp)
+    single = make_question(2, "single", {"result": {"index": 1, "option_name": "B"}}, stamp)
+    multi_answer = [{"index": 0, "option_name": "A"}, {"index": 2, "option_name": "C"}]
+    multi = make_question(3, "multi", {"result": multi_answer}, stamp)
+    blank = make_question(4, "blank", {"result": ["甲", "乙"]}, stamp)
+
+    engine = GradingEngine()
+    assert engine.grade_many([
+        (judge, JudgeAnswer(result=True)),
+        (judge, JudgeAnswer(result=False)),
+        (single, SingleSelectionAnswer(result=option(1))),
+        (multi, MultiSelectionAnswer(result=[option(2), option(0)])),
+        (multi, MultiSelectionAnswer(result=[option(0)])),
+        (blank, BlankFillAnswer(result=[" 甲", "乙 "])),
+        (blank, BlankFillAnswer(result=["乙", "甲"])),
+    ]) == [True, False, True, True, False, True, False]
+    assert engine.size == 4
+
+
+def test_key_recompiled_when_question_changes():
+    question = make_question(1, "judge", {"result": True}, datetime(2024, 1, 1))
+    engine = GradingEngine()
+    assert engine.grade(question, JudgeAnswer(result=True))
+
+    question.correct_answer_json = {"result": False}
+    assert engine.grade(question, JudgeAnswer(result=True))  # 未修改 updated_at 时沿用缓存
+
+    question.updated_at = datetime(2024, 1, 2)
+    assert engine.grade(question, JudgeAnswer(result=False))
+
+
+def test_key_recompiled_after_question_edited():
+    engine = create_engine("sqlite://")
+    Question.__table__.create(engine)
+    grading = GradingEngine()
+    with Session(engine) as session:
+        question = make_question(1, "judge", {"result": True}, datetime(2024, 1, 1))
+        session.add(question)
+        session.commit()
+        assert grading.grade(question, JudgeAnswer(result=True))
+
+        # 绕过 ORM 事件直接更新(相当于其他进程修改), 依靠 updated_at 的 onupdate 识别
+        session.execute(update(Question).where(Question.id == 1).values(correct_answer_json={"result": False}))
+        session.commit()
+        session.refresh(question)
+        assert question.updated_at != datetime(2024, 1, 1)
+        assert grading.grade(question, JudgeAnswer(result=False))
+        assert not grading.grade(question, JudgeAnswer(result=True))
+
+
+def test_key_expires_after_ttl_and_is_bounded():
+    question = make_question(1, "judge", {"result": True}, datetime(2024, 1, 1))
+    engine = GradingEngine(ttl=0)
+    assert engine.grade(question, JudgeAnswer(result=True))
+
+    question.correct_answer_json = {"result": False}
+    assert engine.grade(question, JudgeAnswer(result=False))  # 缓存过期后重新编译
+
+    engine = GradingEngine(max_keys=2)
+    for question_id in range(1, 4):
+        question = make_question(question_id, "judge", {"result": True}, datetime(2024, 1, 1))
+        engine.grade(question, JudgeAnswer(result=True))
+    assert engine.size == 2
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from schemas.v1.leaderboard import AggregateMetric, BoardType, GroupType
+from services.leaderboard_hub import LeaderboardHub, LocalBroker, PostgresBroker
+from services.ranking import (
+    GroupAggregates,
+    LeaderboardIndex,
+    LeaderboardMember,
+    LeaderboardResponseCache,
+    RankCache,
+)
+
+KEY = (GroupType.CLASS, 10, BoardType.DURATION)
+
+
+def make_hub(queue_size: int = 10) -> LeaderboardHub:
+    index = LeaderboardIndex(ttl=60, max_boards=10)
+    members = {user_id: LeaderboardMember(f"u{user_id}", "", 10, 20, 30, 40) for user_id in (1, 2, 3)}
+    index.install(KEY, {1: 5, 2: 3, 3: 1}, members, loaded_at=time.time())
+    return LeaderboardHub(index, LocalBroker(), interval=0, top=10, queue_size=queue_size)
+
+
+@pytest.mark.asyncio()
+async def test_push_sends_changed_entries_to_every_subscriber():
+    hub = make_hub()
+    first, current = await hub.subscribe(None, *KEY)  # type: ignore[arg-type]
+    second, _ = await hub.subscribe(None, *KEY)  # type: ignore[arg-type]
+    assert [entry.score for entry in current.entries] == [5, 3, 1]
+
+    hub.on_message("other", {("duration", 3, None): 1}, time.time() + 1)
+    assert await hub.push() == 2
+
+    delta = first.get_nowait()
+    assert delta is second.get_nowait()
+    assert delta.version == 1
+    assert delta.size == 3
+    assert [(entry.index, entry.name, entry.score) for entry in delta.entries] == [(3, "u3", 2)]
+
+
+@pytest.mark.asyncio()
+async def test_own_and_already_loaded_messages_are_ignored():
+    hub = make_hub()
+    queue, _ = await hub.subscribe(None, *KEY)  # type: ignore[arg-type]
+
+    hub.on_message(hub.origin, {("duration", 3, None): 10}, time.time() + 1)
+    # 提交早于榜单读取时间, 分数中已包含该增量
+    hub.on_message("other", {("duration", 3, None): 10}, time.time() - 60)
+    assert await hub.push() == 0
+    assert queue.empty()
+
+
+@pytest.mark.asyncio()
+async def test_slow_subscriber_is_disconnected():
+    hub = make_hub(queue_size=1)
+    slow, _ = await hub.subscribe(None, *KEY)  # type: ignore[arg-type]
+
+    hub.on_message("other", {("duration", 3, None): 1}, time.time() + 1)
+    assert await hub.push() == 1
+    hub.on_message("other", {("duration", 3, None): 1}, time.time() + 1)
+    assert await hub.push() == 0
+
+    assert slow.get_nowait() is None
+    hub.on_message("other", {("duration", 3, None): 1}, time.time() + 1)
+    assert await hub.push() == 0
+
+
+def test_remote_message_updates_every_cache():
+    index = LeaderboardIndex(ttl=60, max_boards=10)
+    members = {user_id: LeaderboardMember(f"u{user_id}", "", 10, 20, 30, 40) for user_id in (1, 2)}
+    index.install(KEY, {1: 5, 2: 3}, members, loaded_at=time.time())
+    ranks = RankCache(ttl=60, max_entries=10)
+    responses = LeaderboardResponseCache(index, ttl=60, max_entries=10)
+    aggregates = GroupAggregates(ttl=60)
+    read_at = time.time()
+    aggregates.build({1: (10, 20, 30, 40), 2: (10, 20, 30, 40)}, {(1, BoardType.DURATION): 5}, {}, read_at)
+    hub = LeaderboardHub(
+        index, LocalBroker(), interval=0, top=10, queue_size=10,
+        ranks=ranks, responses=responses, aggregates=aggregates,
+    )
+    ranks.put(2, GroupType.CLASS, BoardType.DURATION, 2)
+    version = responses.version(*KEY)
+
+    hub.on_message("other", {("duration", 2, None): 4}, read_at + 1)
+    assert ranks.get(2, GroupType.CLASS, BoardType.DURATION) is None
+    assert responses.version(*KEY) != version
+    assert aggregates.ranking(GroupType.CLASS, 40, BoardType.DURATION, AggregateMetric.TOTAL)[0][2] == 9.0
+
+    # 提交早于聚合读取时间, 聚合中已包含该增量
+    hub.on_message("other", {("duration", 2, None): 4}, read_at - 1)
+    assert aggregates.ranking(GroupType.CLASS, 40, BoardType.DURATION, AggregateMetric.TOTAL)[0][2] == 9.0
+
+    hub.on_reset()
+    assert not aggregates.is_fresh()
+
+
+def test_postgres_broker_splits_payloads():
+    batches = [(1000.0 + i, {("duration", i, None): 3}) for i in range(300)]
+    messages = PostgresBroker.encode("origin", batches)
+
+    assert len(messages) > 1
+    assert all(len(payload) <= PostgresBroker.MAX_PAYLOAD for payload, _ in messages)
+    decoded = [batch for payload, _ in messages for batch in PostgresBroker.decode(payload)[1]]
+    assert decoded == batches
@@ -0,0 +1,56 @@
+import random
+
+from services.question_pool import UserQuestionPool, WeightTree, difficulty_bucket
+
+
+def test_peek_skips_answered_questions():
+    pool = UserQuestionPool.build({(1, 0): [1, 2, 3], (2, 0): [4, 5]}, answered={1}, rng=random.Random(0))
+
+    seen = set()
+    while (question_id := pool.peek()) is not None:
+        seen.add(question_id)
+        pool.discard(question_id)
+    assert seen == {2, 3, 4, 5}
+
+
+def test_peek_by_knowledge():
+    pool = UserQuestionPool.build({(1, 0): [1, 2], (2, 0): [3], (2, 9): [4]}, answered=set())
+
+    assert pool.peek(1) in {1, 2}
+    assert pool.peek(3) is None
+    assert pool.remaining(2) == 2
+
+    pool.discard(3)
+    pool.discard(4)
+    assert pool.peek(2) is None
+
+
+def test_peek_prefers_target_difficulty():
+    catalog = {(1, difficulty_bucket(0.05)): list(range(1, 101)), (1, difficulty_bucket(0.95)): list(range(101, 201))}
+    pool = UserQuestionPool.build(catalog, answered=set(), rng=random.Random(0))
+
+    picks = [pool.peek(difficulty=0.9) for _ in range(200)]
+    assert sum(q > 100 for q in picks) > 150
+
+
+def test_sample_returns_distinct_questions():
+    pool = UserQuestionPool.build({(1, 0): [1, 2, 3], (2, 5): [4, 5, 6]}, answered={2}, rng=random.Random(0))
+
+    picked = pool.sample(10)
+    assert sorted(picked) == [1, 3, 4, 5, 6]
+    assert len(pool.sample(3, knowledge_id=2)) == 3
+
+
+def test_weight_tree_samples_by_weight():
+    tree = WeightTree([1.0, 0.0, 3.0])
+
+    assert tree.total == 4.0
+    assert tree.find(0.5) == 0
+    assert tree.find(1.5) == 2
+
+    tree.set(2, 0.0)
+    rng = random.Random(0)
+    assert {tree.sample(rng) for _ in range(20)} == {0}
+
+    tree.set(0, 0.0)
+    assert not tree
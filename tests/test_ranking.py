@@ -0,0 +1,232 @@
+from datetime import date, datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from core.models.base import Base
+from core.models.organization import Class, Company, Corporation, Department
+from core.models.stats import StatInfo
+from core.models.user import User
+from schemas.v1.leaderboard import (
+    AggregateMetric,
+    BoardType,
+    GroupType,
+    LeaderboardEntry,
+    LeaderboardResponse,
+    TimeWindow,
+)
+from services.leaderboard import user_ranks_query
+from services.ranking import (
+    GroupAggregates,
+    LeaderboardIndex,
+    LeaderboardMember,
+    LeaderboardResponseCache,
+    LeaderboardSnapshot,
+    RankCache,
+    RankedList,
+    etag_matches,
+    make_etag,
+    window_start,
+)
+
+
+def test_top_orders_by_score_then_user_id():
+    board = RankedList({1: 10, 2: 30, 3: 10, 4: 0})
+
+    assert board.top(3) == [(2, 30), (1, 10), (3, 10)]
+    assert board.position(3) == 3
+    assert board.rank(3) == 2
+    assert board.rank(4) == 4
+    assert board.rank(5) == 0
+
+
+def test_add_moves_user():
+    board = RankedList({1: 10, 2: 30})
+
+    board.add(1, 25)
+    board.add(3, 5)
+    assert board.top(5) == [(1, 35), (2, 30), (3, 5)]
+    assert board.score(1) == 35
+    assert len(board) == 3
+
+    board.remove(2)
+    assert board.top(5) == [(1, 35), (3, 5)]
+    assert board.position(3) == 2
+
+
+def test_index_releases_members_with_evicted_boards():
+    index = LeaderboardIndex(ttl=60, max_boards=2)
+    alice = LeaderboardMember("a", "", 10, 20, 30, 40)
+    bob = LeaderboardMember("b", "", 11, 20, 30, 40)
+
+    index.install((GroupType.CLASS, 10, BoardType.DURATION), {1: 5}, {1: alice})
+    index.install((GroupType.DEPARTMENT, 20, BoardType.DURATION), {1: 5, 2: 3}, {1: alice, 2: bob})
+    index.apply({("duration", 2, None): 4})
+    assert index.members.keys() == {1, 2}
+
+    # 淘汰班级10的榜单后 alice 仍在部门榜单中
+    index.install((GroupType.CLASS, 11, BoardType.DURATION), {2: 7}, {2: bob})
+    assert index.members.keys() == {1, 2}
+
+    # 部门榜单也被淘汰后 alice 不再被任何榜单引用
+    index.install((GroupType.CLASS, 12, BoardType.DURATION), {}, {})
+    assert index.members.keys() == {2}
+
+
+def test_rank_cache_expires_and_invalidates():
+    cache = RankCache(ttl=60, max_entries=2)
+
+    cache.put(1, GroupType.COMPANY, BoardType.DURATION, 3)
+    cache.put(2, GroupType.COMPANY, BoardType.DURATION, 5)
+    assert cache.get(1, GroupType.COMPANY, BoardType.DURATION) == 3
+
+    cache.apply({("duration", 1, None): 10})
+    assert cache.get(1, GroupType.COMPANY, BoardType.DURATION) is None
+    assert cache.get(2, GroupType.COMPANY, BoardType.DURATION) == 5
+
+    cache.put(3, GroupType.CLASS, BoardType.CORRECT, 1)
+    cache.put(4, GroupType.CLASS, BoardType.CORRECT, 2)
+    assert cache.get(2, GroupType.COMPANY, BoardType.DURATION) is None
+
+    expired = RankCache(ttl=0, max_entries=10)
+    expired.put(1, GroupType.CLASS, BoardType.DURATION, 1)
+    assert expired.get(1, GroupType.CLASS, BoardType.DURATION) is None
+
+    cache = RankCache(ttl=60, max_entries=10)
+    cache.put(1, GroupType.CLASS, BoardType.DURATION, 1)
+    cache.put(1, GroupType.COMPANY, BoardType.CORRECT, 4)
+    cache.put(2, GroupType.CLASS, BoardType.DURATION, 2)
+    cache.apply({("duration", 1, None): 10, ("correct", 1, None): 1})
+    assert cache.get(1, GroupType.CLASS, BoardType.DURATION) is None
+    assert cache.get(1, GroupType.COMPANY, BoardType.CORRECT) is None
+    assert cache.get(2, GroupType.CLASS, BoardType.DURATION) == 2
+
+
+def test_snapshot_builds_every_group_board():
+    members = {
+        1: LeaderboardMember("甲", "", 10, 20, 30, 1),
+        2: LeaderboardMember("乙", "", 11, 20, 30, 1),
+        3: LeaderboardMember("丙", "", 11, 21, 30, 1),
+    }
+    scores = {(1, BoardType.DURATION): 5, (2, BoardType.DURATION): 9, (3, BoardType.CORRECT): 2}
+    snapshot = LeaderboardSnapshot.build(members, scores, datetime(2024, 1, 1), version=1)
+
+    assert snapshot.board(GroupType.COMPANY, 30, BoardType.DURATION).top(3) == [(2, 9), (1, 5), (3, 0)]
+    assert snapshot.board(GroupType.DEPARTMENT, 20, BoardType.DURATION).rank(1) == 2
+    assert snapshot.board(GroupType.CLASS, 11, BoardType.CORRECT).rank(3) == 1
+    assert len(snapshot.board(GroupType.CLASS, 99, BoardType.CORRECT)) == 0
+
+
+def test_window_start():
+    today = date(2024, 5, 16)  # 周四
+
+    assert window_start(TimeWindow.DAY, today) == today
+    assert window_start(TimeWindow.WEEK, today) == date(2024, 5, 13)
+    assert window_start(TimeWindow.MONTH, today) == date(2024, 5, 1)
+    assert window_start(TimeWindow.ALL, today) is None
+
+
+def test_group_aggregates_rank_by_total_and_average():
+    aggregates = GroupAggregates(ttl=60)
+    users = {1: (10, 20, 30, 1), 2: (10, 20, 30, 1), 3: (11, 21, 30, 1), 4: (12, 22, 31, 2)}
+    scores = {(1, BoardType.DURATION): 10, (2, BoardType.DURATION): 20, (3, BoardType.DURATION): 25}
+    aggregates.build(users, scores, {(GroupType.DEPARTMENT, 20): "一部", (GroupType.DEPARTMENT, 21): "二部"})
+
+    by_total = aggregates.ranking(GroupType.DEPARTMENT, 1, BoardType.DURATION, AggregateMetric.TOTAL)
+    assert [(group_id, aggregate.name, score) for group_id, aggregate, score in by_total] == [
+        (20, "一部", 30.0),
+        (21, "二部", 25.0),
+    ]
+    by_average = aggregates.ranking(GroupType.DEPARTMENT, 1, BoardType.DURATION, AggregateMetric.AVERAGE)
+    assert [(group_id, score) for group_id, _, score in by_average] == [(21, 25.0), (20, 15.0)]
+
+    aggregates.apply({("duration", 3, None): 10, ("correct_by_knowledge", 3, 5): 1})
+    assert aggregates.ranking(GroupType.DEPARTMENT, 1, BoardType.DURATION, AggregateMetric.TOTAL)[0][0] == 21
+    assert aggregates.ranking(GroupType.COMPANY, 1, BoardType.DURATION, AggregateMetric.TOTAL)[0][2] == 65.0
+
+
+def test_etag_matches():
+    etag = make_etag(b"{}")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+def test_response_cache_invalidated_by_stat_change():
+    cache = LeaderboardResponseCache(LeaderboardIndex(ttl=60, max_boards=10), ttl=60, max_entries=10)
+    key = (GroupType.CLASS, 10, BoardType.DURATION, TimeWindow.ALL, None, 20)
+    response = LeaderboardResponse(leaderboard=[], me=LeaderboardEntry(index=0, name="", avatar="", score=0))
+
+    version = cache.version(GroupType.CLASS, 10, BoardType.DURATION)
+    etag, body = cache.put(key, version, 1, response)
+    assert body == response.model_dump_json().encode()
+    entry = cache.get(key, version)
+    assert entry is not None
+    assert entry.get(1) == (etag, body)
+    assert entry.get(2) is None
+
+    cache.apply({("correct", 1, None): 1})
+    assert cache.version(GroupType.CLASS, 10, BoardType.DURATION) == version
+    cache.apply({("duration", 1, None): 30})
+    assert cache.version(GroupType.CLASS, 10, BoardType.DURATION) != version
+
+
+def test_response_cache_shares_top_and_renders_me_per_user():
+    cache = LeaderboardResponseCache(LeaderboardIndex(ttl=60, max_boards=10), ttl=60, max_entries=10)
+    key = (GroupType.CLASS, 10, BoardType.DURATION, TimeWindow.ALL, None, 20)
+    version = cache.version(GroupType.CLASS, 10, BoardType.DURATION)
+    top = [LeaderboardEntry(index=1, name="甲", avatar="", score=9)]
+    mine = LeaderboardEntry(index=1, name="甲", avatar="", score=9)
+    theirs = LeaderboardEntry(index=2, name="乙", avatar="", score=3)
+
+    etag_mine, _ = cache.put(key, version, 1, LeaderboardResponse(leaderboard=top, me=mine))
+    # 同一版本再次写入时沿用已缓存的前 N 名, 只渲染 me
+    ignored = [LeaderboardEntry(index=1, name="丙", avatar="", score=1)]
+    etag_theirs, body = cache.put(key, version, 2, LeaderboardResponse(leaderboard=ignored, me=theirs))
+    assert body == LeaderboardResponse(leaderboard=top, me=theirs).model_dump_json().encode()
+    assert etag_mine != etag_theirs
+
+    entry = cache.get(key, version)
+    assert entry is not None
+    assert entry.render(3, theirs) == (etag_theirs, body)
+
+
+
+def test_user_ranks_query_ranks_real_rows():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    boards = (
+        (GroupType.CLASS, BoardType.DURATION),
+        (GroupType.COMPANY, BoardType.DURATION),
+        (GroupType.CORPORATION, BoardType.DURATION),
+    )
+    with Session(engine) as session:
+        session.add_all([
+            Corporation(id=1, name="集团"),
+            Company(id=1, name="一公司", corp_id=1),
+            Company(id=2, name="二公司", corp_id=1),
+            Department(id=1, name="部门", company_id=1),
+            Class(id=1, name="一班", department_id=1),
+            Class(id=2, name="二班", department_id=1),
+        ])
+        session.flush()
+        session.add_all([
+            User(id=1, name="甲", class_id=1, department_id=1, company_id=1),
+            User(id=2, name="乙", class_id=1, department_id=1, company_id=1),
+            User(id=3, name="丙", class_id=2, department_id=1, company_id=2),
+        ])
+        session.flush()
+        session.add_all([
+            StatInfo(type="duration", source_id=user_id, total=total)
+            for user_id, total in ((1, 10), (2, 50), (3, 30))
+        ])
+        session.commit()
+
+        ranks = {
+            user_id: tuple(session.execute(user_ranks_query(boards), {"user_id": user_id}).one())
+            for user_id in (1, 2, 3)
+        }
+    assert ranks == {1: (2, 2, 3), 2: (1, 1, 1), 3: (1, 1, 2)}
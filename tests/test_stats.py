@@ -0,0 +1,37 @@
+import pytest
+
+from services.stats import StatWriteBuffer
+
+
+@pytest.mark.asyncio()
+async def test_flush_discards_batch_only_after_commit(monkeypatch):
+    buffer = StatWriteBuffer(flush_interval=1, max_pending=100, recover_after=60)
+    buffer.add([(1, ("duration", 7, None), 30), (2, ("duration", 7, None), 10)])
+    seen = []
+
+    async def apply(_db, _condition):
+        # 刷写期间新提交的记录进入新的缓冲, 叠加层仍包含正在刷写的记录
+        buffer.add([(3, ("duration", 7, None), 5)])
+        seen.append(buffer.pending(7))
+        return 2
+
+    monkeypatch.setattr(buffer, "_apply", apply)
+    assert await buffer.flush() == 2
+    assert seen == [{("duration", 7, None): 45}]
+    assert buffer.pending(7) == {("duration", 7, None): 5}
+    assert buffer.size == 1
+
+
+@pytest.mark.asyncio()
+async def test_failed_flush_keeps_records(monkeypatch):
+    buffer = StatWriteBuffer(flush_interval=1, max_pending=100, recover_after=60)
+    buffer.add([(1, ("duration", 7, None), 30)])
+
+    async def fail(_db, _condition):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(buffer, "_apply", fail)
+    with pytest.raises(RuntimeError):
+        await buffer.flush()
+    assert buffer.size == 1
+    assert buffer.pending(7) == {("duration", 7, None): 30}
@@ -0,0 +1,77 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from core.models.base import Base
+from core.models.organization import Class, Company, Corporation, Department
+from core.models.user import User
+from services.user import CurrentUser, CurrentUserCache, current_user_cache
+
+
+def make_user(user_id: int) -> CurrentUser:
+    return CurrentUser(
+        id=user_id,
+        employee_id=f"E{user_id}",
+        name=f"user{user_id}",
+        avatar="",
+        job_title="",
+        class_id=1,
+        department_id=1,
+        company_id=1,
+        class_name="",
+        department_name=""
+    )
+
+
+def test_current_user_cache_evicts_least_recently_used():
+    cache = CurrentUserCache(ttl=60, max_entries=2)
+    cache.put("E1", make_user(1))
+    cache.put("E2", make_user(2))
+    assert cache.get("E1") == make_user(1)
+
+    cache.put("E3", make_user(3))
+
+    assert cache.get("E2") is None
+    assert cache.get("E1") == make_user(1)
+    assert cache.get("E3") == make_user(3)
+
+
+def test_current_user_cache_expires_and_invalidates():
+    cache = CurrentUserCache(ttl=0, max_entries=10)
+    cache.put("E1", make_user(1))
+    assert cache.get("E1") is None
+
+    cache = CurrentUserCache(ttl=60, max_entries=10)
+    cache.put("E1", make_user(1))
+    cache.put("E2", make_user(2))
+    cache.invalidate(1)
+
+    assert cache.get("E1") is None
+    assert cache.get("E2") == make_user(2)
+
+
+def test_current_user_cache_invalidated_by_orm_changes():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            Corporation(id=1, name="集团"),
+            Company(id=1, name="公司", corp_id=1),
+            Department(id=1, name="部门", company_id=1),
+            Class(id=1, name="一班", department_id=1),
+        ])
+        session.flush()
+        user = User(id=1, name="甲", class_id=1, department_id=1, company_id=1)
+        session.add(user)
+        session.commit()
+
+        current_user_cache.put("E1", make_user(1))
+        current_user_cache.put("E2", make_user(2))
+        user.name = "乙"
+        session.commit()
+        assert current_user_cache.get("E1") is None
+        assert current_user_cache.get("E2") == make_user(2)
+
+        # 班级改名后缓存中的班级名称过期, 全部失效
+        session.get(Class, 1).name = "二班"
+        session.commit()
+        assert current_user_cache.get("E2") is None